@@ -1,19 +1,38 @@
-from langchain.agents import Tool, AgentExecutor, create_openai_functions_agent
+from langchain.agents import Tool, AgentExecutor, create_openai_functions_agent, create_openai_tools_agent
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain.schema import SystemMessage
 from langchain.tools import BaseTool
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, AsyncIterator, Iterator, Optional, Tuple, Union
+import asyncio
+import hashlib
 import json
+import queue
 import re
-from database import OrderDatabase
+import threading
+from database import OrderDatabase, DEFAULT_TENANT
 from rag_system import MenuRAG
+from tenant_indexes import TenantIndexManager, TenantMenuIndex
+from intent_router import IntentRouter, INTENT_PATTERNS
+from resources import registry
+from chat_history import ChatHistoryManager, LLMSummarizer, count_tokens
+from response_cache import SemanticResponseCache, is_transactional_action
+from telemetry import telemetry
+from telemetry_callbacks import TelemetryCallbackHandler
+from parallel_executor import ParallelAgentExecutor
+from llm_scheduler import LLMScheduler, ScheduledChatModel, llm_priority, PRIORITY_ORDER, PRIORITY_DEFAULT, PRIORITY_BACKGROUND
 from pydantic import Field
 from typing import Any
 from pydantic import PrivateAttr
-from langchain_groq import ChatGroq
+
+# Requests that add to an order get the scheduler's order priority
+ORDER_PATTERNS = [re.compile(pattern, re.IGNORECASE) for pattern in INTENT_PATTERNS['order']]
 
 class DatabaseTool(BaseTool):
-    """Custom tool for database interactions"""
+    """Custom tool for database interactions.
+
+    Like the other tools it keeps no per-call state, so one instance serves
+    concurrent calls (the database hands each its own pooled connection).
+    """
     name = "database_tool"
     description = "Tool for interacting with the restaurant database to get menu items, create orders, and retrieve analytics"
     db: Any = Field(default=None, exclude=True)  # Using Any type for flexibility
@@ -24,32 +43,14 @@ class DatabaseTool(BaseTool):
     
     def _run(self, action: str, **kwargs) -> str:
         """Execute database operations"""
-        print(action,77777777777777777777777)
         try:
             if action == "get_menu":
-                menu_items = self.db.get_menu()
-                if not menu_items:
+                snapshot = self.db.get_menu_snapshot()
+                if not snapshot.items:
                     return "Our menu is currently empty. Please check back later."
                 
-                # Group items by category
-                menu_by_category = {}
-                for item in menu_items:
-                    if item['category'] not in menu_by_category:
-                        menu_by_category[item['category']] = []
-                    menu_by_category[item['category']].append(item)
-                
-                # Build formatted menu string
-                menu_str = "Here's our complete menu:\n\n"
-                for category, items in menu_by_category.items():
-                    menu_str += f"=== {category.upper()} ===\n"
-                    for item in items:
-                        menu_str += f"- {item['name']}: ${item['price']:.2f}"
-                        if 'description' in item:
-                            menu_str += f" - {item['description']}"
-                        menu_str += "\n"
-                    menu_str += "\n"
-                
-                return menu_str
+                # Grouping and formatting are cached per menu version
+                return snapshot.formatted_menu
             
             elif action == "create_order":
                 customer_name = kwargs.get('customer_name')
@@ -72,17 +73,16 @@ class DatabaseTool(BaseTool):
 class MenuSearchTool(BaseTool):
     """Tool for searching menu using RAG"""
     name = "menu_search"
-    description = "Search menu items using natural language queries. Use this when users ask about specific foods, categories, or want recommendations."
+    description = "Search menu items using natural language queries. Use this when users ask about specific foods, categories, or want recommendations. Optionally filter by category and max_price."
     rag_system: Any = Field(default=None, exclude=True)
-    def __init__(self, rag_system: MenuRAG):
+    def __init__(self, rag_system: Union[MenuRAG, TenantMenuIndex]):
         super().__init__()
         self.rag_system = rag_system
     
-    def _run(self, query: str) -> str:
+    def _run(self, query: str, category: Optional[str] = None, max_price: Optional[float] = None) -> str:
         """Search menu using RAG"""
         try:
-            print(query,555555555555555555)
-            results = self.rag_system.search_menu(query)
+            results = self.rag_system.search_menu(query, category=category, max_price=max_price)
             if not results:
                 return "No menu items found for your query."
             
@@ -107,58 +107,35 @@ class OrderParsingTool(BaseTool):
     def _run(self, user_message: str) -> str:
         """Parse order from user message"""
         try:
-            menu_items = self.db.get_menu()
-            menu_dict = {item['name'].lower(): item for item in menu_items}
+            # The matcher is compiled once per menu version
+            matcher = self.db.get_menu_snapshot().order_matcher
+            parsed = matcher.parse(user_message)
             
-            # Simple parsing logic - can be enhanced with NLP
             parsed_items = []
             total_amount = 0
-            
-            # Look for patterns like "2 pizza", "one burger", etc.
-            words = user_message.lower().split()
-            
-            for i, word in enumerate(words):
-                # Check for quantities
-                quantity = 1
-                if word.isdigit():
-                    quantity = int(word)
-                    if i + 1 < len(words):
-                        item_word = words[i + 1]
-                    else:
-                        continue
-                elif word in ['one', 'a', 'an']:
-                    quantity = 1
-                    if i + 1 < len(words):
-                        item_word = words[i + 1]
-                    else:
-                        continue
-                else:
-                    item_word = word
-                
-                # Find matching menu items
-                for menu_name, menu_item in menu_dict.items():
-                    if item_word in menu_name or any(item_word in part for part in menu_name.split()):
-                        parsed_items.append({
-                            'name': menu_item['name'],
-                            'quantity': quantity,
-                            'price': menu_item['price'],
-                            'total': quantity * menu_item['price']
-                        })
-                        total_amount += quantity * menu_item['price']
-                        break
+            for menu_item, quantity in parsed['items']:
+                parsed_items.append({
+                    'name': menu_item['name'],
+                    'quantity': quantity,
+                    'price': menu_item['price'],
+                    'total': quantity * menu_item['price']
+                })
+                total_amount += quantity * menu_item['price']
             
             if parsed_items:
                 return json.dumps({
                     'items': parsed_items,
                     'total_amount': total_amount,
-                    'success': True
+                    'success': True,
+                    'ambiguous': parsed['ambiguous']
                 })
             else:
                 return json.dumps({
                     'items': [],
                     'total_amount': 0,
                     'success': False,
-                    'message': 'No valid menu items found in your order.'
+                    'message': 'No valid menu items found in your order.',
+                    'ambiguous': parsed['ambiguous']
                 })
         
         except Exception as e:
@@ -167,29 +144,50 @@ class OrderParsingTool(BaseTool):
                 'error': str(e)
             })
 
-class FoodOrderAgent:
-    """Main agent for handling food orders"""
-    db: Any = Field(default=None, exclude=True)  # Using Any type for flexibility
+class AgentResources:
+    """Components shared by every conversation with one restaurant (tenant).
 
-    def __init__(self, groq_api_key: str):
-        self.db = OrderDatabase()
+    The database view, LLM client, compiled tools and intent router are built
+    once per tenant and reused; a FoodOrderAgent only adds lightweight
+    per-conversation state on top. The embedding model and the menu indexes
+    live in a TenantIndexManager shared by all tenants, which keeps only the
+    busiest tenants' indexes in memory.
+    """
+
+    def __init__(self, groq_api_key: str, db_path: str = "orders.db",
+                 persist_directory: str = "./data/menu_embeddings",
+                 embeddings: Optional[Any] = None, llm: Optional[Any] = None,
+                 tenant_id: str = DEFAULT_TENANT, indexes: Optional[TenantIndexManager] = None):
+        if indexes is None:
+            indexes = TenantIndexManager(OrderDatabase(db_path), persist_directory, embeddings=embeddings)
+        self.indexes = indexes
+        self.tenant_id = tenant_id
+        self.db = indexes.database(tenant_id)
         
-        # Initialize RAG system
-        menu_items = self.db.get_menu()
-        self.rag_system = MenuRAG(menu_items)
+        # The tenant's menu index loads on first search and re-syncs when its menu version changes
+        self.rag_system = indexes.index(tenant_id)
         
         # Initialize tools
         self.database_tool = DatabaseTool(self.db)
         self.menu_search_tool = MenuSearchTool(self.rag_system)
         self.order_parsing_tool = OrderParsingTool(self.db)
         
-        # Initialize LLM
-        self.llm = ChatGroq(
-            temperature=0.7,
-            groq_api_key=groq_api_key,
-            model="llama3-70b-8192",  # Fallback to older version
-            max_tokens=8192
-        )
+        # Initialize LLM (any LangChain chat model can be injected, e.g. a fake one for tests)
+        if llm is None:
+            # Only the real client needs the Groq SDK
+            from langchain_groq import ChatGroq
+            # Every tenant's client shares one scheduler, which owns the rate limits and retries
+            llm = ScheduledChatModel(
+                llm=ChatGroq(
+                    temperature=0.7,
+                    groq_api_key=groq_api_key,
+                    model="llama3-70b-8192",  # Fallback to older version
+                    max_tokens=8192,
+                    max_retries=0
+                ),
+                scheduler=LLMScheduler.shared()
+            )
+        self.llm = llm
         
         # Create tools list
         self.tools = [
@@ -198,7 +196,98 @@ class FoodOrderAgent:
             self.order_parsing_tool
         ]
         
-        # Create agent
+        # Obvious menu / popular / simple-order requests skip the LLM entirely;
+        # the router reuses the RAG embedder (and its query cache) for its check
+        self.router = IntentRouter(
+            self.database_tool,
+            self.order_parsing_tool,
+            embeddings=self.rag_system.embeddings
+        )
+        
+        # LLM calls and tool runs of every agent turn are recorded as telemetry spans
+        self.telemetry_handler = TelemetryCallbackHandler(telemetry)
+        
+        # Opt-in answers for near-duplicate questions, keyed by the database menu version;
+        # stale versions are dropped on change
+        self.response_cache = SemanticResponseCache(self.rag_system.embeddings)
+        self._menu_listener = lambda snapshot: self.response_cache.invalidate(snapshot.version)
+        self.db.subscribe_menu_changes(self._menu_listener)
+        
+        # Identifies the API key these resources were built for without keeping it as a registry key
+        self.key_digest = self.api_key_digest(groq_api_key)
+    
+    def warm_up(self):
+        """Load the embedding model, the vector index and the compiled parsers ahead of the first request"""
+        with telemetry.span("agent.warm_up"):
+            self.rag_system.search_menu("menu")
+            self.db.get_menu_snapshot().order_matcher
+            self.router.warm_up()
+    
+    @staticmethod
+    def api_key_digest(groq_api_key: str) -> str:
+        return hashlib.sha256((groq_api_key or "").encode("utf-8")).hexdigest()
+    
+    def close(self):
+        """Detach from the tenant's database view; the view and menu index stay shared"""
+        self.db.unsubscribe_menu_changes(self._menu_listener)
+    
+    @classmethod
+    def shared(cls, groq_api_key: str, db_path: str = "orders.db",
+               persist_directory: str = "./data/menu_embeddings",
+               tenant_id: str = DEFAULT_TENANT) -> "AgentResources":
+        """Process-wide instance for this configuration and tenant, built on first use.
+        
+        A different API key (e.g. after rotation) rebuilds the instance and closes the old one.
+        """
+        key_digest = cls.api_key_digest(groq_api_key)
+        return registry.get_or_create(
+            (cls.__name__, db_path, persist_directory, tenant_id),
+            lambda: cls(groq_api_key, db_path, persist_directory, tenant_id=tenant_id,
+                        indexes=TenantIndexManager.shared(db_path, persist_directory)),
+            valid=lambda resources: resources.key_digest == key_digest
+        )
+
+class FoodOrderAgent:
+    """Main agent for handling food orders"""
+    db: Any = Field(default=None, exclude=True)  # Using Any type for flexibility
+
+    def __init__(self, groq_api_key: str, fast_path: bool = True, llm: Optional[Any] = None,
+                 resources: Optional[AgentResources] = None, history_tokens: int = 2000,
+                 semantic_cache: bool = False, tenant_id: str = DEFAULT_TENANT, menu_context: bool = False,
+                 context_tokens: int = 300, parallel_tools: bool = False, tool_workers: int = 16,
+                 tool_timeout: Optional[float] = 30.0, verbose: bool = False):
+        if resources is None:
+            # An injected LLM gets private resources so it never leaks into other sessions
+            resources = AgentResources(groq_api_key, llm=llm, tenant_id=tenant_id) if llm is not None \
+                else AgentResources.shared(groq_api_key, tenant_id=tenant_id)
+        self.resources = resources
+        self.tenant_id = resources.tenant_id
+        
+        self.db = resources.db
+        self.rag_system = resources.rag_system
+        self.database_tool = resources.database_tool
+        self.menu_search_tool = resources.menu_search_tool
+        self.order_parsing_tool = resources.order_parsing_tool
+        self.llm = resources.llm
+        self.tools = resources.tools
+        self.router = resources.router if fast_path else None
+        self.response_cache = resources.response_cache if semantic_cache else None
+        # Retrieve relevant menu items locally and put them in the prompt, so
+        # most questions are answered in one LLM call instead of a tool round trip
+        self.menu_context = menu_context
+        self.context_tokens = context_tokens
+        # Tool-calling agent that can request several tools per step and runs them concurrently
+        self.parallel_tools = parallel_tools
+        # Size of the process-wide tool pool, shared by every session that asks for the same size
+        self.tool_workers = tool_workers
+        self.tool_timeout = tool_timeout
+        # Print the executor's chain trace to stdout (telemetry records the same steps as spans)
+        self.verbose = verbose
+        
+        # Per-conversation state: bounded history with a running summary and pinned order facts
+        self.history = ChatHistoryManager(max_tokens=history_tokens, summarizer=LLMSummarizer(self.llm))
+        
+        # Create agent (cheap: the prompt and executor only reference shared parts)
         self.setup_agent()
     
     def setup_agent(self):
@@ -225,13 +314,40 @@ Available tools:
 
 Remember to always confirm order details before processing!"""
 
-        prompt = ChatPromptTemplate.from_messages([
-            SystemMessage(content=system_message),
+        messages = [SystemMessage(content=system_message)]
+        if self.menu_context:
+            messages.append(SystemMessage(content=(
+                "The menu items most relevant to the customer's request are listed in the next message. "
+                "Answer questions about them directly from that list. Only call a tool when the list "
+                "does not cover the request, to show the full menu or analytics, or to parse and place an order."
+            )))
+            messages.append(("system", "{menu_context}"))
+        prompt = ChatPromptTemplate.from_messages(messages + [
             MessagesPlaceholder(variable_name="chat_history"),
             ("human", "{input}"),
             MessagesPlaceholder(variable_name="agent_scratchpad")
         ])
         
+        # The agent invokes the LLM without streaming in process_message / aprocess_message;
+        # under astream_events (astream_message) LangChain streams each LLM call for tokens
+        if self.parallel_tools:
+            self.agent = create_openai_tools_agent(
+                llm=self.llm,
+                tools=self.tools,
+                prompt=prompt
+            )
+            self.agent_executor = ParallelAgentExecutor(
+                agent=self.agent,
+                tools=self.tools,
+                stream_runnable=False,
+                max_workers=self.tool_workers,
+                tool_timeout=self.tool_timeout,
+                verbose=self.verbose,
+                return_intermediate_steps=True,
+                handle_parsing_errors=True
+            )
+            return
+        
         self.agent = create_openai_functions_agent(
             llm=self.llm,
             tools=self.tools,
@@ -241,21 +357,293 @@ Remember to always confirm order details before processing!"""
         self.agent_executor = AgentExecutor(
             agent=self.agent,
             tools=self.tools,
-            verbose=True,
+            stream_runnable=False,
+            verbose=self.verbose,
             return_intermediate_steps=True,
             handle_parsing_errors=True
         )
     
-    def process_message(self, message: str, chat_history: List = None) -> str:
-        """Process user message and return response"""
-        if chat_history is None:
-            chat_history = []
+    def _record_turn(self, message: str, answer: str, intermediate_steps: List = (),
+                     routed: Optional[Dict[str, Any]] = None):
+        """Add a finished turn to the managed history and pin confirmed order facts"""
+        customer_name, request = IntentRouter.split_request(message)
+        if customer_name:
+            self.history.pin('customer_name', customer_name)
         
-        try:
-            response = self.agent_executor.invoke({
-                "input": message,
-                "chat_history": chat_history
+        if routed is not None and routed['intent'] == 'order' and routed['data']:
+            self._pin_cart(routed['data'])
+        for action, observation in intermediate_steps:
+            if action.tool == 'order_parser':
+                try:
+                    self._pin_cart(json.loads(observation))
+                except (TypeError, ValueError):
+                    pass
+            elif action.tool == 'database_tool':
+                placed = re.search(r"Order created successfully with ID: (\d+)", str(observation))
+                if placed:
+                    orders = self.history.pinned.get('placed_orders', [])
+                    self.history.pin('placed_orders', (orders + [int(placed.group(1))])[-5:])
+                    self.history.pin('cart', None)
+        
+        # A summary the window needs is never more urgent than a customer's turn
+        with llm_priority(PRIORITY_BACKGROUND):
+            self.history.add_turn(request, answer)
+    
+    def _pin_cart(self, parsed: Dict[str, Any]):
+        if parsed.get('success'):
+            self.history.pin('cart', {
+                'items': [{'name': item['name'], 'quantity': item['quantity']} for item in parsed['items']],
+                'total_amount': round(parsed['total_amount'], 2)
             })
-            return response["output"]
-        except Exception as e:
-            return f"I apologize, but I encountered an error: {str(e)}. Please try again."
\ No newline at end of file
+    
+    def _priority(self, message: str) -> int:
+        """Scheduler priority of a turn: ahead of browsing while an order is being placed"""
+        _, request = IntentRouter.split_request(message)
+        if self.history.pinned.get('cart') or any(pattern.search(request) for pattern in ORDER_PATTERNS):
+            return PRIORITY_ORDER
+        return PRIORITY_DEFAULT
+    
+    def _agent_input(self, message: str, chat_history: List) -> Dict[str, Any]:
+        """Executor input, with the pre-retrieved menu block in retrieval-augmented mode"""
+        agent_input = {"input": message, "chat_history": chat_history}
+        if self.menu_context:
+            _, request = IntentRouter.split_request(message)
+            with telemetry.span("agent.menu_context") as span:
+                context = self.rag_system.get_menu_context(request, max_tokens=self.context_tokens)
+                span['tokens'] = count_tokens(context) if context else 0
+            agent_input["menu_context"] = context or "No menu items matched this request."
+        return agent_input
+    
+    def _callbacks(self, callbacks: Optional[List] = None) -> List:
+        return [self.resources.telemetry_handler] + list(callbacks or [])
+    
+    def _cached_answer(self, message: str) -> Tuple[Optional[str], Optional[int]]:
+        """A cached answer (or None) and the menu version the turn runs against.
+        
+        The version is read through the database snapshot, so a price or
+        availability change in SQLite moves it (within MENU_VERSION_TTL_S)
+        even when nothing else has reloaded the menu.
+        """
+        if self.response_cache is None:
+            return None, None
+        menu_version = self.db.get_menu_snapshot().version
+        _, request = IntentRouter.split_request(message)
+        return self.response_cache.lookup(request, menu_version), menu_version
+    
+    def _cache_answer(self, message: str, answer: str, intermediate_steps: List = (),
+                      menu_version: Optional[int] = None):
+        """Store an agent answer unless the turn touched an order or addressed the customer"""
+        if self.response_cache is None or not answer or menu_version is None:
+            return
+        for action, _ in intermediate_steps:
+            if is_transactional_action(action):
+                return
+        customer_name, request = IntentRouter.split_request(message)
+        if customer_name and customer_name.lower() in answer.lower():
+            return
+        self.response_cache.store(request, answer, menu_version)
+    
+    def process_message(self, message: str, chat_history: List = None,
+                        callbacks: Optional[List] = None) -> str:
+        """Process user message and return response.
+        
+        Without an explicit ``chat_history`` the agent's own token-budgeted
+        history is used and updated. ``callbacks`` are attached to the agent run.
+        """
+        managed = chat_history is None
+        if managed:
+            chat_history = self.history.build()
+        
+        with telemetry.span("agent.turn", mode='sync') as span:
+            try:
+                if self.router is not None:
+                    routed = self.router.route_detailed(message)
+                    if routed['answer'] is not None:
+                        span['path'] = 'fast_path'
+                        if managed:
+                            self._record_turn(message, routed['answer'], routed=routed)
+                        return routed['answer']
+                
+                cached, menu_version = self._cached_answer(message)
+                if cached is not None:
+                    span['path'] = 'cache'
+                    if managed:
+                        self._record_turn(message, cached)
+                    return cached
+                
+                span['path'] = 'agent'
+                with llm_priority(self._priority(message)):
+                    response = self.agent_executor.invoke(
+                        self._agent_input(message, chat_history),
+                        config={"callbacks": self._callbacks(callbacks)}
+                    )
+                steps = response.get("intermediate_steps", [])
+                self._cache_answer(message, response["output"], steps, menu_version)
+                if managed:
+                    self._record_turn(message, response["output"], steps)
+                return response["output"]
+            except Exception as e:
+                span['error'] = str(e)
+                return f"I apologize, but I encountered an error: {str(e)}. Please try again."
+    
+    async def aprocess_message(self, message: str, chat_history: List = None,
+                               callbacks: Optional[List] = None) -> str:
+        """Async version of process_message built on ainvoke.
+        
+        Recording the turn can summarize the history with a (background
+        priority) LLM call, so it runs in a worker thread, off the event loop.
+        """
+        managed = chat_history is None
+        if managed:
+            chat_history = self.history.build()
+        
+        with telemetry.span("agent.turn", mode='async') as span:
+            try:
+                if self.router is not None:
+                    loop = asyncio.get_running_loop()
+                    routed = await loop.run_in_executor(None, self.router.route_detailed, message)
+                    if routed['answer'] is not None:
+                        span['path'] = 'fast_path'
+                        if managed:
+                            await asyncio.to_thread(self._record_turn, message, routed['answer'], routed=routed)
+                        return routed['answer']
+                
+                cached, menu_version = await asyncio.get_running_loop().run_in_executor(
+                    None, self._cached_answer, message
+                )
+                if cached is not None:
+                    span['path'] = 'cache'
+                    if managed:
+                        await asyncio.to_thread(self._record_turn, message, cached)
+                    return cached
+                
+                span['path'] = 'agent'
+                agent_input = await asyncio.get_running_loop().run_in_executor(
+                    None, self._agent_input, message, chat_history
+                )
+                with llm_priority(self._priority(message)):
+                    response = await self.agent_executor.ainvoke(
+                        agent_input, config={"callbacks": self._callbacks(callbacks)}
+                    )
+                steps = response.get("intermediate_steps", [])
+                self._cache_answer(message, response["output"], steps, menu_version)
+                if managed:
+                    await asyncio.to_thread(self._record_turn, message, response["output"], steps)
+                return response["output"]
+            except Exception as e:
+                span['error'] = str(e)
+                return f"I apologize, but I encountered an error: {str(e)}. Please try again."
+    
+    async def astream_message(self, message: str, chat_history: List = None) -> AsyncIterator[Dict[str, Any]]:
+        """Stream a turn as events while it runs.
+
+        Yields dicts with a ``type`` of ``token`` (LLM text chunk), ``tool_start``,
+        ``tool_end`` or ``error``, and always finishes with one ``final`` event
+        carrying the complete answer. As in aprocess_message, the turn is
+        recorded in a worker thread.
+        """
+        managed = chat_history is None
+        if managed:
+            chat_history = self.history.build()
+        
+        with telemetry.span("agent.turn", mode='stream') as span:
+            try:
+                if self.router is not None:
+                    loop = asyncio.get_running_loop()
+                    routed = await loop.run_in_executor(None, self.router.route_detailed, message)
+                    if routed['answer'] is not None:
+                        span['path'] = 'fast_path'
+                        yield {'type': 'token', 'content': routed['answer']}
+                        yield {'type': 'final', 'content': routed['answer']}
+                        if managed:
+                            await asyncio.to_thread(self._record_turn, message, routed['answer'], routed=routed)
+                        return
+                
+                cached, menu_version = await asyncio.get_running_loop().run_in_executor(
+                    None, self._cached_answer, message
+                )
+                if cached is not None:
+                    span['path'] = 'cache'
+                    yield {'type': 'token', 'content': cached}
+                    yield {'type': 'final', 'content': cached}
+                    if managed:
+                        await asyncio.to_thread(self._record_turn, message, cached)
+                    return
+                
+                span['path'] = 'agent'
+                output = None
+                intermediate_steps = []
+                agent_input = await asyncio.get_running_loop().run_in_executor(
+                    None, self._agent_input, message, chat_history
+                )
+                with llm_priority(self._priority(message)):
+                    async for event in self.agent_executor.astream_events(
+                        agent_input,
+                        config={"callbacks": self._callbacks()},
+                        version="v1"
+                    ):
+                        kind = event['event']
+                        if kind == 'on_chat_model_stream':
+                            content = event['data']['chunk'].content
+                            if content:
+                                yield {'type': 'token', 'content': content}
+                        elif kind == 'on_tool_start':
+                            yield {'type': 'tool_start', 'tool': event['name'], 'input': event['data'].get('input')}
+                        elif kind == 'on_tool_end':
+                            yield {'type': 'tool_end', 'tool': event['name'], 'output': event['data'].get('output')}
+                        elif kind == 'on_chain_end' and event['name'] == 'AgentExecutor':
+                            result = event['data'].get('output', {})
+                            output = result.get('output')
+                            intermediate_steps = result.get('intermediate_steps', [])
+                
+                yield {'type': 'final', 'content': output or ""}
+                # Caching and summarizing (if the window overflowed) happen after the answer is out
+                self._cache_answer(message, output, intermediate_steps, menu_version)
+                if managed and output:
+                    await asyncio.to_thread(self._record_turn, message, output, intermediate_steps)
+            except Exception as e:
+                span['error'] = str(e)
+                yield {'type': 'error', 'error': str(e)}
+                yield {'type': 'final',
+                       'content': f"I apologize, but I encountered an error: {str(e)}. Please try again."}
+    
+    def stream_message(self, message: str, chat_history: List = None) -> Iterator[Dict[str, Any]]:
+        """Synchronous wrapper around astream_message for callers such as Streamlit"""
+        events = queue.Queue()
+        done = object()
+        
+        async def pump():
+            try:
+                async for event in self.astream_message(message, chat_history):
+                    events.put(event)
+            finally:
+                events.put(done)
+        
+        # Run the async stream on its own event loop so the caller's thread just iterates
+        loop = asyncio.new_event_loop()
+        task = loop.create_task(pump())
+        
+        def run():
+            try:
+                loop.run_until_complete(task)
+            except asyncio.CancelledError:
+                pass
+            finally:
+                loop.run_until_complete(loop.shutdown_asyncgens())
+                loop.run_until_complete(loop.shutdown_default_executor())
+                loop.close()
+        
+        threading.Thread(target=run, daemon=True).start()
+        try:
+            while True:
+                event = events.get()
+                if event is done:
+                    return
+                yield event
+        finally:
+            # A consumer that stops early (or errors) cancels the turn and its in-flight LLM stream
+            try:
+                loop.call_soon_threadsafe(task.cancel)
+            except RuntimeError:
+                # The loop already finished and closed
+                pass
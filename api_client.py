@@ -0,0 +1,104 @@
+from typing import Any, Dict, Iterator, List, Optional
+import requests
+
+
+class ApiClient:
+    """Thin synchronous client for server.py"""
+
+    def __init__(self, base_url: str, tenant_id: Optional[str] = None, timeout: float = 90.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.http = requests.Session()
+        if tenant_id:
+            self.http.headers['X-Tenant-ID'] = tenant_id
+
+    def _request(self, method: str, path: str, **kwargs) -> Dict[str, Any]:
+        response = self.http.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    def create_session(self, customer_name: Optional[str] = None) -> str:
+        return self._request("POST", "/sessions", json={'customer_name': customer_name})['session_id']
+
+    def end_session(self, session_id: str):
+        self._request("DELETE", f"/sessions/{session_id}")
+
+    def chat(self, session_id: str, message: str) -> str:
+        return self._request("POST", "/chat", json={'session_id': session_id, 'message': message})['answer']
+
+    def menu(self) -> List[Dict[str, Any]]:
+        return self._request("GET", "/menu")['items']
+
+    def search_menu(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
+        return self._request("GET", "/menu/search", params={'q': query, 'k': k})['items']
+
+    def place_order(self, customer_name: str, items: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return self._request("POST", "/orders", json={'customer_name': customer_name, 'items': items})
+
+    def orders(self, **filters: Any) -> Dict[str, Any]:
+        return self._request("GET", "/orders", params=filters)
+
+    def analytics(self) -> Dict[str, Any]:
+        return self._request("GET", "/analytics")
+
+
+class RemoteHistory:
+    """The parts of ChatHistoryManager the Streamlit app uses, mapped onto the server session"""
+
+    def __init__(self, agent: "RemoteAgent"):
+        self.agent = agent
+
+    def pin(self, key: str, value: Any):
+        if key == 'customer_name':
+            self.agent.customer_name = value
+
+    def add_turn(self, user_message: str, assistant_message: str):
+        # The server records its own turns
+        pass
+
+    def clear(self):
+        self.agent.end_session()
+
+
+class RemoteAgent:
+    """Drop-in for FoodOrderAgent in app.py that sends each turn to the API server"""
+
+    def __init__(self, client: ApiClient):
+        self.client = client
+        self.customer_name: Optional[str] = None
+        self.session_id: Optional[str] = None
+        self.history = RemoteHistory(self)
+
+    def _session(self) -> str:
+        if self.session_id is None:
+            self.session_id = self.client.create_session(self.customer_name)
+        return self.session_id
+
+    def end_session(self):
+        if self.session_id is not None:
+            try:
+                self.client.end_session(self.session_id)
+            except requests.RequestException:
+                # Already expired on the server
+                pass
+        self.session_id = None
+        self.customer_name = None
+
+    def process_message(self, message: str) -> str:
+        try:
+            return self.client.chat(self._session(), message)
+        except requests.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                # The session expired; start a new one and try once more
+                self.session_id = None
+                return self.client.chat(self._session(), message)
+            raise
+
+    def stream_message(self, message: str) -> Iterator[Dict[str, Any]]:
+        """Same events as FoodOrderAgent.stream_message; the answer arrives in one piece"""
+        try:
+            answer = self.process_message(message)
+        except requests.RequestException as e:
+            yield {'type': 'error', 'error': str(e)}
+            answer = f"I apologize, but I encountered an error: {str(e)}. Please try again."
+        yield {'type': 'final', 'content': answer}
@@ -1,14 +1,22 @@
 import streamlit as st
 import plotly.express as px
 import pandas as pd
-from agents import FoodOrderAgent
-from database import OrderDatabase
+from database import OrderDatabase, DEFAULT_TENANT
+from telemetry import telemetry
 import os
+import threading
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+# Restaurant this deployment serves; each tenant has its own menu, orders and menu index
+TENANT_ID = os.getenv('TENANT_ID', DEFAULT_TENANT)
+
+# With API_URL set, chat turns go to the headless API server (server.py) instead of an in-process agent
+API_URL = os.getenv('API_URL')
+
 # Page configuration
 st.set_page_config(
     page_title="Restaurant Order Bot",
@@ -16,16 +24,60 @@ st.set_page_config(
     layout="wide"
 )
 
+@st.cache_resource
+def get_database() -> OrderDatabase:
+    """Process-wide database handle, so its menu snapshot cache survives reruns"""
+    return OrderDatabase(tenant_id=TENANT_ID)
+
+def get_groq_api_key() -> str:
+    groq_api_key = os.getenv('GROQ_API_KEY')
+    if not groq_api_key:
+        st.error("Please set your OpenAI API key in the .env file")
+        st.stop()
+    return groq_api_key
+
+@st.cache_resource
+def start_warm_up(groq_api_key: str) -> threading.Thread:
+    """Build the shared agent resources in the background while the customer types their name"""
+    def warm_up():
+        try:
+            # Imported here so pages that never chat do not load LangChain, Chroma or the embedder
+            from agents import AgentResources
+            AgentResources.shared(groq_api_key, tenant_id=TENANT_ID).warm_up()
+        except Exception as e:
+            print(f"Warm-up failed: {str(e)}")
+    
+    thread = threading.Thread(target=warm_up, daemon=True)
+    thread.start()
+    return thread
+
+def get_agent():
+    """This session's agent, created on first use; waits for a warm-up still in progress"""
+    if 'agent' not in st.session_state and API_URL:
+        from api_client import ApiClient, RemoteAgent
+        st.session_state.agent = RemoteAgent(ApiClient(API_URL, tenant_id=TENANT_ID))
+    if 'agent' not in st.session_state:
+        from agents import FoodOrderAgent
+        # Set SEMANTIC_CACHE=1 to reuse answers for near-duplicate questions,
+        # MENU_CONTEXT=1 to put retrieved menu items in the prompt instead of a search round trip,
+        # PARALLEL_TOOLS=1 for a tool-calling agent that runs several tools per step concurrently
+        # (on TOOL_WORKERS threads shared by every session),
+        # AGENT_VERBOSE=1 to print the agent's chain trace to the console
+        st.session_state.agent = FoodOrderAgent(
+            get_groq_api_key(),
+            semantic_cache=os.getenv('SEMANTIC_CACHE') == '1',
+            tenant_id=TENANT_ID,
+            menu_context=os.getenv('MENU_CONTEXT') == '1',
+            parallel_tools=os.getenv('PARALLEL_TOOLS') == '1',
+            tool_workers=int(os.getenv('TOOL_WORKERS', "16")),
+            verbose=os.getenv('AGENT_VERBOSE') == '1'
+        )
+    return st.session_state.agent
+
 def initialize_session_state():
     """Initialize session state variables"""
     if 'messages' not in st.session_state:
         st.session_state.messages = []
-    if 'agent' not in st.session_state:
-        groq_api_key = os.getenv('GROQ_API_KEY')
-        if not groq_api_key:
-            st.error("Please set your OpenAI API key in the .env file")
-            st.stop()
-        st.session_state.agent = FoodOrderAgent(groq_api_key)
     if 'customer_name' not in st.session_state:
         st.session_state.customer_name = ""
 
@@ -38,18 +90,22 @@ def main():
     
     # Sidebar for navigation
     st.sidebar.title("Navigation")
-    page = st.sidebar.selectbox("Choose a page", ["Order Chat", "Dashboard"])
+    page = st.sidebar.selectbox("Choose a page", ["Order Chat", "Dashboard", "Performance"])
     
     if page == "Order Chat":
         chat_interface()
     elif page == "Dashboard":
         dashboard()
+    elif page == "Performance":
+        performance()
 
 def chat_interface():
     """Chat interface for ordering"""
     
     # Customer name input
     if not st.session_state.customer_name:
+        if not API_URL:
+            start_warm_up(get_groq_api_key())
         with st.form("customer_form"):
             st.write("Please enter your name to start ordering:")
             name = st.text_input("Your Name")
@@ -57,6 +113,7 @@ def chat_interface():
             
             if submitted and name:
                 st.session_state.customer_name = name
+                get_agent().history.pin('customer_name', name)
                 st.session_state.messages.append({
                     "role": "assistant",
                     "content": f"Hello {name}! Welcome to our restaurant. How can I help you today? You can ask to see our menu or place an order."
@@ -64,6 +121,8 @@ def chat_interface():
                 st.rerun()
     
     else:
+        get_agent()
+        
         # Display chat messages
         for message in st.session_state.messages:
             with st.chat_message(message["role"]):
@@ -78,30 +137,41 @@ def chat_interface():
                 st.markdown(prompt)
             
             with st.chat_message("assistant"):
-                with st.spinner("Thinking..."):
-                    try:
-                        # Convert message history to agent format
-                        chat_history = [
-                            ("human" if msg["role"] == "user" else "assistant", msg["content"])
-                            for msg in st.session_state.messages[:-1]
-                        ]
-                        
-                        response = st.session_state.agent.process_message(
-                            f"Customer: {st.session_state.customer_name}. Request: {prompt}",
-                            chat_history
-                        )
-                        
-                        # Ensure we have a valid response
-                        if not response:
-                            response = "I didn't understand that. Could you please rephrase?"
-                        
-                        st.markdown(response)
-                        st.session_state.messages.append({"role": "assistant", "content": response})
+                try:
+                    # The agent keeps its own token-budgeted history, so only the new message is sent
+                    # Render tokens and tool steps as they arrive instead of waiting for the full answer
+                    status = st.empty()
+                    placeholder = st.empty()
+                    status.caption("Thinking...")
+                    streamed = ""
+                    response = ""
+                    for event in st.session_state.agent.stream_message(
+                        f"Customer: {st.session_state.customer_name}. Request: {prompt}"
+                    ):
+                        if event["type"] == "token":
+                            streamed += event["content"]
+                            placeholder.markdown(streamed + "▌")
+                        elif event["type"] == "tool_start":
+                            status.caption(f"Using {event['tool']}...")
+                        elif event["type"] == "tool_end":
+                            # The next LLM call writes the answer from scratch
+                            streamed = ""
+                            status.caption("Thinking...")
+                        elif event["type"] == "final":
+                            response = event["content"]
+                    status.empty()
+                    
+                    # Ensure we have a valid response
+                    if not response:
+                        response = "I didn't understand that. Could you please rephrase?"
                     
-                    except Exception as e:
-                        error_msg = f"System error: {str(e)}"
-                        st.error("Sorry, something went wrong. Please try again.")
-                        print(error_msg)
+                    placeholder.markdown(response)
+                    st.session_state.messages.append({"role": "assistant", "content": response})
+                
+                except Exception as e:
+                    error_msg = f"System error: {str(e)}"
+                    st.error("Sorry, something went wrong. Please try again.")
+                    print(error_msg)
         # Quick action buttons
         st.markdown("---")
         col1, col2, col3 = st.columns(3)
@@ -130,14 +200,14 @@ def chat_interface():
                         response = st.session_state.agent.process_message(
                             f"Customer: {st.session_state.customer_name}. Request: {menu_prompt}"
                         )
-                    print(response,555555555555555555555555)
                     if not response:
-                        print(3333333333333333333333333333)
                         response = "Here's our menu:\n" + "\n".join(
                             f"- {item['name']}: ${item['price']:.2f}" 
                             for item in st.session_state.agent.db.get_menu()
                         )
                     
+                    if hasattr(st.session_state.agent, 'database_tool'):
+                        st.session_state.agent.history.add_turn(menu_prompt, response)
                     st.session_state.messages.append({
                         "role": "assistant", 
                         "content": response
@@ -163,14 +233,36 @@ def chat_interface():
             if st.button("🆕 New Chat"):
                 st.session_state.messages = []
                 st.session_state.customer_name = ""
+                st.session_state.agent.history.clear()
                 st.rerun()
+        
+        # Requests answered locally by the intent router instead of the LLM
+        router = getattr(st.session_state.agent, 'router', None)
+        if router is not None:
+            with st.sidebar.expander("Fast-path routing"):
+                st.json(router.stats())
+        
+        response_cache = getattr(st.session_state.agent, 'response_cache', None)
+        if response_cache is not None:
+            with st.sidebar.expander("Semantic response cache"):
+                st.json(response_cache.stats())
+        
+        resources = getattr(st.session_state.agent, 'resources', None)
+        if resources is not None:
+            with st.sidebar.expander("Menu indexes"):
+                st.json(resources.indexes.stats())
+            # Queue depth, waits and throttling of the process-wide LLM scheduler
+            scheduler = getattr(resources.llm, 'scheduler', None)
+            if scheduler is not None:
+                with st.sidebar.expander("LLM scheduler"):
+                    st.json(scheduler.stats())
 
 def dashboard():
     """Dashboard showing order analytics"""
     st.header("📊 Restaurant Dashboard")
     
     # Get analytics data
-    db = OrderDatabase()
+    db = get_database()
     analytics = db.get_order_analytics()
     
     # Metrics
@@ -186,6 +278,26 @@ def dashboard():
         avg_order = analytics['total_revenue'] / max(analytics['total_orders'], 1)
         st.metric("Average Order Value", f"${avg_order:.2f}")
     
+    # Order trends, read from the incrementally maintained rollups
+    st.subheader("Order Trends")
+    granularity = st.radio("Granularity", ["day", "hour"], horizontal=True)
+    window = timedelta(days=30) if granularity == "day" else timedelta(hours=48)
+    series = db.get_order_series(granularity, since=datetime.now(timezone.utc) - window)
+    
+    if series:
+        trend_df = pd.DataFrame(series)
+        trend_col1, trend_col2 = st.columns(2)
+        
+        with trend_col1:
+            fig = px.bar(trend_df, x='bucket', y='order_count', title="Orders")
+            st.plotly_chart(fig, use_container_width=True)
+        
+        with trend_col2:
+            fig = px.line(trend_df, x='bucket', y='revenue', title="Revenue", markers=True)
+            st.plotly_chart(fig, use_container_width=True)
+    else:
+        st.info("No orders in this period yet.")
+    
     # Popular items chart
     if analytics['popular_items']:
         st.subheader("Most Popular Items")
@@ -202,6 +314,18 @@ def dashboard():
         fig.update_layout(height=400)
         st.plotly_chart(fig, use_container_width=True)
     
+    # Latest orders, one indexed page rather than the whole table
+    st.subheader("Recent Orders")
+    recent_orders, _ = db.get_orders_page(newest_first=True, limit=20)
+    if recent_orders:
+        recent_df = pd.DataFrame(recent_orders)
+        recent_df['items'] = recent_df['items'].apply(
+            lambda items: ", ".join(f"{item.get('quantity', 1)} x {item['name']}" for item in items)
+        )
+        st.dataframe(recent_df.set_index('id'), use_container_width=True)
+    else:
+        st.info("No orders yet.")
+    
     # Menu overview
     st.subheader("Current Menu")
     menu_items = db.get_menu()
@@ -218,5 +342,62 @@ def dashboard():
         category_summary.columns = ['Items Count', 'Min Price', 'Max Price', 'Avg Price']
         st.dataframe(category_summary)
 
+def performance():
+    """Latency, error and token metrics collected by the telemetry layer"""
+    st.header("⏱️ Performance")
+    
+    snapshot = telemetry.snapshot()
+    spans = snapshot['spans']
+    if not spans:
+        st.info("No requests recorded yet. Metrics appear once customers start chatting.")
+        return
+    
+    # Headline numbers for complete chat turns
+    turns = spans.get('agent.turn', {})
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.metric("Turns", turns.get('count', 0))
+    
+    with col2:
+        st.metric("Turn p50", f"{turns.get('p50_ms', 0):.0f} ms")
+    
+    with col3:
+        st.metric("Turn p95", f"{turns.get('p95_ms', 0):.0f} ms")
+    
+    with col4:
+        st.metric("Turn error rate", f"{turns.get('error_rate', 0):.1%}")
+    
+    # Per-stage latency histograms
+    st.subheader("Latency by Stage")
+    spans_df = pd.DataFrame([{'Stage': name, **summary} for name, summary in spans.items()])
+    
+    latency_df = spans_df.melt(
+        id_vars='Stage',
+        value_vars=['p50_ms', 'p95_ms', 'p99_ms'],
+        var_name='Percentile',
+        value_name='Latency (ms)'
+    )
+    fig = px.bar(latency_df, x='Stage', y='Latency (ms)', color='Percentile', barmode='group')
+    st.plotly_chart(fig, use_container_width=True)
+    
+    st.dataframe(
+        spans_df.rename(columns={'count': 'Calls', 'errors': 'Errors', 'error_rate': 'Error Rate',
+                                 'mean_ms': 'Mean (ms)', 'p50_ms': 'p50 (ms)', 'p95_ms': 'p95 (ms)',
+                                 'p99_ms': 'p99 (ms)'}).set_index('Stage').round(3)
+    )
+    
+    # Token usage per model
+    if snapshot['tokens']:
+        st.subheader("Token Usage")
+        tokens_df = pd.DataFrame([
+            {'Model': model, **counts} for model, counts in snapshot['tokens'].items()
+        ]).set_index('Model')
+        st.dataframe(tokens_df)
+    
+    if st.button("Reset metrics"):
+        telemetry.reset()
+        st.rerun()
+
 if __name__ == "__main__":
     main()
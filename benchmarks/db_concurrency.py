@@ -0,0 +1,98 @@
+"""Concurrency stress test for OrderDatabase.
+
+Runs many reader threads (get_menu / get_order_analytics) against a steady
+stream of create_order writers on a fresh database file and fails if any
+operation errors (e.g. ``database is locked``) or if orders go missing.
+
+    python -m benchmarks.db_concurrency --readers 32 --writers 8 --seconds 10
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from database import OrderDatabase
+
+
+def run(readers: int, writers: int, seconds: float) -> dict:
+    db_path = os.path.join(tempfile.mkdtemp(), "stress.db")
+    db = OrderDatabase(db_path)
+    menu = db.get_menu()
+    item = {'name': menu[0]['name'], 'quantity': 1, 'price': menu[0]['price'], 'total': menu[0]['price']}
+
+    stop = threading.Event()
+    counts = {'reads': 0, 'writes': 0}
+    errors = []
+    order_ids = []
+    lock = threading.Lock()
+
+    def reader(n: int):
+        done = 0
+        while not stop.is_set():
+            try:
+                if n % 2:
+                    db.get_menu()
+                else:
+                    db.get_order_analytics()
+                done += 1
+            except Exception as e:
+                errors.append(f"reader: {e}")
+        with lock:
+            counts['reads'] += done
+
+    def writer(n: int):
+        done = []
+        while not stop.is_set():
+            try:
+                done.append(db.create_order(f"customer-{n}", [item], item['total']))
+            except Exception as e:
+                errors.append(f"writer: {e}")
+        with lock:
+            counts['writes'] += len(done)
+            order_ids.extend(done)
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    stored = db.get_order_analytics()['total_orders']
+    return {
+        'readers': readers,
+        'writers': writers,
+        'seconds': round(elapsed, 3),
+        'reads_per_sec': round(counts['reads'] / elapsed, 1),
+        'writes_per_sec': round(counts['writes'] / elapsed, 1),
+        'orders_written': counts['writes'],
+        'orders_stored': stored,
+        'unique_order_ids': len(set(order_ids)),
+        'errors': len(errors),
+        'first_errors': errors[:5]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    result = run(args.readers, args.writers, args.seconds)
+    print(json.dumps(result, indent=2))
+    ok = (not result['errors']
+          and result['orders_stored'] == result['orders_written'] == result['unique_order_ids'])
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,410 @@
+"""Compare LLM calls with and without the shared scheduler against a local rate-limited endpoint.
+
+Starts a fake Groq-compatible chat completions endpoint in-process. It
+enforces a concurrency cap and per-minute request and token budgets like
+the real provider, answering 429 with Retry-After when one is exceeded.
+Real ChatGroq clients (no SDK retries) then send a burst of concurrent
+requests, first directly and then through ScheduledChatModel. Part of the
+burst repeats a shared prompt (coalescing) and part is marked as order
+turns (priority). Reports failures, 429s, latency and, for the scheduled
+run, queue waits per priority and coalesced calls. ``--async`` sends the
+burst from one event loop (ainvoke / astream) instead of threads.
+
+``--agent`` instead runs FoodOrderAgent sessions in parallel-tools mode,
+built by AgentResources exactly as the app builds them, against the same
+endpoint. The endpoint answers with tool calls and, like Groq, rejects a
+streamed request that carries tools, so client settings that break the
+agent show up as errors.
+
+    python -m benchmarks.llm_scheduler
+    python -m benchmarks.llm_scheduler --requests 200 --clients 64 --provider-rpm 120
+    python -m benchmarks.llm_scheduler --streaming --async
+    python -m benchmarks.llm_scheduler --agent --sessions 16
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_groq import ChatGroq
+
+from benchmarks.micro import EMBEDDING_SIZE, percentiles
+from benchmarks.server_load import free_port
+from chat_history import count_tokens
+from llm_scheduler import (LLMScheduler, ScheduledChatModel, TokenBucket, error_status, llm_priority,
+                           PRIORITY_DEFAULT, PRIORITY_ORDER)
+
+SHARED_PROMPT = "What vegetarian dishes do you have?"
+
+
+class FakeProvider:
+    """Limits of the fake endpoint; each run gets a fresh one"""
+
+    def __init__(self, max_concurrency: int, rpm: float, tpm: float, latency_ms: float, jitter_ms: float):
+        self.max_concurrency = max_concurrency
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.active = 0
+        self.served = 0
+        self.throttled = 0
+        self.bad_requests = 0
+        self.lock = threading.Lock()
+
+    def admit(self, tokens: int) -> Optional[float]:
+        """None if the request may run, else the Retry-After in seconds"""
+        with self.lock:
+            wait = max(self.requests.delay(1), self.tokens.delay(tokens))
+            if self.active >= self.max_concurrency:
+                wait = max(wait, self.latency / 2)
+            if wait > 0:
+                self.throttled += 1
+                return wait
+            self.active += 1
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            return None
+
+    def release(self):
+        with self.lock:
+            self.active -= 1
+            self.served += 1
+
+
+async def stream_completion(provider: FakeProvider, completion_id: str, model: str, completion_tokens: int):
+    """Server-sent events in the chat.completion.chunk format, one word per chunk"""
+    try:
+        for n in range(completion_tokens + 1):
+            await asyncio.sleep((provider.latency + random.uniform(0, provider.jitter)) / (completion_tokens + 1))
+            done = n == completion_tokens
+            chunk = {
+                'id': completion_id,
+                'object': "chat.completion.chunk",
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{
+                    'index': 0,
+                    'delta': {} if done else {'role': "assistant", 'content': "word "},
+                    'finish_reason': "stop" if done else None
+                }]
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+        yield "data: [DONE]\n\n"
+    finally:
+        provider.release()
+
+
+def reply_message(body: Dict[str, Any], completion_tokens: int) -> Dict[str, Any]:
+    """A menu_search call for a new customer request when tools are offered, else plain text"""
+    last = body['messages'][-1]
+    if last['role'] == "user" and (body.get('tools') or body.get('functions')):
+        call = {'name': "menu_search", 'arguments': json.dumps({'query': str(last['content'])[-80:]})}
+        if body.get('tools'):
+            return {'role': "assistant", 'content': None,
+                    'tool_calls': [{'id': f"call_{random.getrandbits(32):x}", 'type': "function", 'function': call}]}
+        return {'role': "assistant", 'content': None, 'function_call': call}
+    return {'role': "assistant", 'content': "word " * completion_tokens}
+
+
+def create_fake_app(state: Dict[str, FakeProvider]) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/openai/v1/chat/completions")
+    async def chat_completions(request: Request):
+        provider = state['provider']
+        body = await request.json()
+        if body.get('stream') and (body.get('tools') or body.get('functions')):
+            provider.bad_requests += 1
+            return JSONResponse(
+                {'error': {'message': "stream is not supported with tools", 'type': "invalid_request_error"}},
+                status_code=400
+            )
+        prompt = " ".join(str(message.get('content', "")) for message in body['messages'])
+        prompt_tokens = count_tokens(prompt)
+        completion_tokens = random.randint(20, 80)
+        wait = provider.admit(prompt_tokens + completion_tokens)
+        if wait is not None:
+            return JSONResponse(
+                {'error': {'message': "Rate limit reached", 'type': "rate_limit_exceeded"}},
+                status_code=429, headers={'retry-after': f"{wait:.2f}"}
+            )
+        completion_id = f"chatcmpl-{random.getrandbits(32):x}"
+        if body.get('stream'):
+            return StreamingResponse(stream_completion(provider, completion_id, body.get('model', "fake"),
+                                                       completion_tokens), media_type="text/event-stream")
+        try:
+            await asyncio.sleep(provider.latency + random.uniform(0, provider.jitter))
+        finally:
+            provider.release()
+        return {
+            'id': completion_id,
+            'object': "chat.completion",
+            'created': int(time.time()),
+            'model': body.get('model', "fake"),
+            'choices': [{
+                'index': 0,
+                'message': reply_message(body, completion_tokens),
+                'finish_reason': "stop"
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens
+            }
+        }
+
+    return app
+
+
+def build_requests(count: int, shared_ratio: float, order_ratio: float, seed: int) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    batch = []
+    for n in range(count):
+        prompt = SHARED_PROMPT if rng.random() < shared_ratio else f"Customer {n}: tell me about item {rng.randint(1, 40)}"
+        batch.append({
+            'prompt': prompt,
+            'priority': PRIORITY_ORDER if rng.random() < order_ratio else PRIORITY_DEFAULT
+        })
+    return batch
+
+
+def summarize(samples: List[Dict[str, Any]], wall: float) -> Dict[str, Any]:
+    ok = [sample for sample in samples if sample['status'] == 200]
+    statuses: Dict[str, int] = {}
+    for sample in samples:
+        statuses[str(sample['status'])] = statuses.get(str(sample['status']), 0) + 1
+    return {
+        'requests': len(samples),
+        'ok': len(ok),
+        'failed': len(samples) - len(ok),
+        'statuses': statuses,
+        'wall_s': round(wall, 3),
+        'ok_per_sec': round(len(ok) / wall, 2) if wall else None,
+        'latency': percentiles([sample['seconds'] for sample in ok]),
+        'latency_order': percentiles([sample['seconds'] for sample in ok if sample['priority'] == PRIORITY_ORDER]),
+        'latency_default': percentiles([sample['seconds'] for sample in ok if sample['priority'] == PRIORITY_DEFAULT])
+    }
+
+
+def messages_for(request: Dict[str, Any]) -> List[Any]:
+    return [SystemMessage(content="You are a restaurant assistant."), HumanMessage(content=request['prompt'])]
+
+
+def run(llm: Any, batch: List[Dict[str, Any]], clients: int, streaming: bool = False) -> Dict[str, Any]:
+    samples: List[Dict[str, Any]] = []
+
+    def send(request: Dict[str, Any]):
+        start = time.perf_counter()
+        status = 200
+        try:
+            with llm_priority(request['priority']):
+                if streaming:
+                    for _ in llm.stream(messages_for(request)):
+                        pass
+                else:
+                    llm.invoke(messages_for(request))
+        except Exception as e:
+            status = error_status(e) or type(e).__name__
+        samples.append({'status': status, 'seconds': time.perf_counter() - start, 'priority': request['priority']})
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(send, batch))
+    return summarize(samples, time.perf_counter() - start)
+
+
+async def arun(llm: Any, batch: List[Dict[str, Any]], clients: int, streaming: bool = False) -> Dict[str, Any]:
+    """``run`` from one event loop: ``clients`` coroutines at a time and no worker threads"""
+    samples: List[Dict[str, Any]] = []
+    gate = asyncio.Semaphore(clients)
+
+    async def send(request: Dict[str, Any]):
+        async with gate:
+            start = time.perf_counter()
+            status = 200
+            try:
+                with llm_priority(request['priority']):
+                    if streaming:
+                        async for _ in llm.astream(messages_for(request)):
+                            pass
+                    else:
+                        await llm.ainvoke(messages_for(request))
+            except Exception as e:
+                status = error_status(e) or type(e).__name__
+            samples.append({'status': status, 'seconds': time.perf_counter() - start,
+                            'priority': request['priority']})
+
+    start = time.perf_counter()
+    await asyncio.gather(*(send(request) for request in batch))
+    return summarize(samples, time.perf_counter() - start)
+
+
+def run_agent(sessions: int, turns: int) -> Dict[str, Any]:
+    """Parallel-tools agent sessions, a third each through process_message, aprocess_message
+    and astream_message; a turn fails if it ends in the agent's error answer or event"""
+    from agents import AgentResources, FoodOrderAgent
+
+    workdir = tempfile.mkdtemp()
+    resources = AgentResources(
+        "fake-key",
+        os.path.join(workdir, "orders.db"),
+        os.path.join(workdir, "menu_embeddings"),
+        embeddings=DeterministicFakeEmbedding(size=EMBEDDING_SIZE)
+    )
+    requests = ["Do you have anything vegetarian?", "What desserts are there?", "Anything spicy under $15?"]
+    samples: List[Dict[str, Any]] = []
+
+    def record(mode: str, start: float, failed: bool):
+        samples.append({'mode': mode, 'seconds': time.perf_counter() - start, 'failed': failed})
+
+    def agent() -> FoodOrderAgent:
+        return FoodOrderAgent("fake-key", fast_path=False, resources=resources, parallel_tools=True)
+
+    def sync_session(_):
+        session = agent()
+        for n in range(turns):
+            start = time.perf_counter()
+            answer = session.process_message(requests[n % len(requests)])
+            record('sync', start, answer.startswith("I apologize, but I encountered an error"))
+
+    async def async_session(streamed: bool):
+        session = agent()
+        for n in range(turns):
+            start = time.perf_counter()
+            if streamed:
+                events = [event async for event in session.astream_message(requests[n % len(requests)])]
+                record('stream', start, any(event['type'] == "error" for event in events))
+            else:
+                answer = await session.aprocess_message(requests[n % len(requests)])
+                record('async', start, answer.startswith("I apologize, but I encountered an error"))
+
+    async def async_sessions():
+        await asyncio.gather(*(async_session(n % 2 == 1) for n in range(sessions - sessions // 3)))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(sessions // 3, 1)) as pool:
+        sync_run = pool.map(sync_session, range(sessions // 3))
+        asyncio.run(async_sessions())
+        list(sync_run)
+    wall = time.perf_counter() - start
+
+    result: Dict[str, Any] = {'sessions': sessions, 'turns_per_session': turns, 'wall_s': round(wall, 3)}
+    for mode in ('sync', 'async', 'stream'):
+        chosen = [sample for sample in samples if sample['mode'] == mode]
+        result[mode] = {
+            'turns': len(chosen),
+            'failed': sum(sample['failed'] for sample in chosen),
+            'latency': percentiles([sample['seconds'] for sample in chosen if not sample['failed']])
+        }
+    result['scheduler'] = resources.llm.scheduler.stats()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=160)
+    parser.add_argument("--clients", type=int, default=48, help="Concurrent callers")
+    parser.add_argument("--shared-ratio", type=float, default=0.25, help="Share of requests repeating one prompt")
+    parser.add_argument("--order-ratio", type=float, default=0.2, help="Share of requests at order priority")
+    parser.add_argument("--provider-concurrency", type=int, default=8)
+    parser.add_argument("--provider-rpm", type=float, default=240)
+    parser.add_argument("--provider-tpm", type=float, default=12000)
+    parser.add_argument("--latency-ms", type=float, default=250.0)
+    parser.add_argument("--jitter-ms", type=float, default=100.0)
+    parser.add_argument("--completion-tokens", type=int, default=80,
+                        help="Completion size the scheduler charges up front")
+    parser.add_argument("--streaming", action="store_true", help="Stream responses (no coalescing)")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="Send from one event loop")
+    parser.add_argument("--agent", action="store_true", help="Run parallel-tools agent sessions instead")
+    parser.add_argument("--sessions", type=int, default=12, help="Agent sessions (--agent)")
+    parser.add_argument("--turns", type=int, default=3, help="Turns per agent session (--agent)")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    def provider() -> FakeProvider:
+        return FakeProvider(args.provider_concurrency, args.provider_rpm, args.provider_tpm,
+                            args.latency_ms, args.jitter_ms)
+
+    state = {'provider': provider()}
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(create_fake_app(state), host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    def client() -> ChatGroq:
+        return ChatGroq(groq_api_key="fake-key", groq_api_base=f"http://127.0.0.1:{port}",
+                        model="llama3-70b-8192", max_retries=0, streaming=args.streaming)
+
+    # The SDK builds its response serializers on first use, which is not thread-safe; do it once up front
+    client().invoke("warm up")
+    state['provider'] = provider()
+
+    config = {
+        'concurrency': args.provider_concurrency,
+        'rpm': args.provider_rpm,
+        'tpm': args.provider_tpm,
+        'latency_ms': args.latency_ms
+    }
+    if args.agent:
+        # AgentResources builds its ChatGroq and the shared scheduler from the environment
+        os.environ['GROQ_API_BASE'] = f"http://127.0.0.1:{port}"
+        os.environ['LLM_MAX_CONCURRENCY'] = str(args.provider_concurrency)
+        os.environ['LLM_REQUESTS_PER_MINUTE'] = str(args.provider_rpm)
+        os.environ['LLM_TOKENS_PER_MINUTE'] = str(args.provider_tpm)
+        result = run_agent(args.sessions, args.turns)
+        result['provider_400'] = state['provider'].bad_requests
+        result['provider_429'] = state['provider'].throttled
+        result['provider_calls'] = state['provider'].served
+        server.should_exit = True
+        print(json.dumps({'benchmark': 'llm_scheduler_agent', 'provider': config, 'run': result}, indent=2))
+        return
+
+    def burst(llm: Any) -> Dict[str, Any]:
+        if args.use_async:
+            return asyncio.run(arun(llm, batch, args.clients, args.streaming))
+        return run(llm, batch, args.clients, args.streaming)
+
+    random.seed(args.seed)
+    batch = build_requests(args.requests, args.shared_ratio, args.order_ratio, args.seed)
+    results = {}
+    results['direct'] = burst(client())
+    results['direct']['provider_429'] = state['provider'].throttled
+
+    # Fresh provider budgets, and a scheduler configured with the same limits
+    state['provider'] = provider()
+    scheduler = LLMScheduler(max_concurrency=args.provider_concurrency, requests_per_minute=args.provider_rpm,
+                             tokens_per_minute=args.provider_tpm, seed=args.seed)
+    scheduled = ScheduledChatModel(llm=client(), scheduler=scheduler, completion_tokens=args.completion_tokens)
+    results['scheduled'] = burst(scheduled)
+    results['scheduled']['provider_429'] = state['provider'].throttled
+    results['scheduled']['provider_calls'] = state['provider'].served
+    results['scheduled']['scheduler'] = scheduler.stats()
+    server.should_exit = True
+
+    print(json.dumps({
+        'benchmark': 'llm_scheduler',
+        'seed': args.seed,
+        'requests': args.requests,
+        'clients': args.clients,
+        'streaming': args.streaming,
+        'async': args.use_async,
+        'provider': config,
+        'runs': results
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
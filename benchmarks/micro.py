@@ -0,0 +1,216 @@
+"""Microbenchmarks for the hot paths on synthetic menus and order histories.
+
+Times MenuRAG.search_menu (cold and cached), OrderParsingTool._run and
+OrderDatabase.get_order_analytics as the menu and order history grow. Uses
+fake embeddings and fixed seeds, so results can be diffed between versions.
+
+    python -m benchmarks.micro --menu-sizes 10 100 1000 --order-counts 1000 10000 100000
+    python -m benchmarks.micro --output micro.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+from langchain_community.embeddings import DeterministicFakeEmbedding
+
+from agents import OrderParsingTool
+from benchmarks.order_parser import generate_messages
+from database import OrderDatabase
+from rag_system import MenuRAG
+
+ADJECTIVES = ["Classic", "Spicy", "Smoky", "Garden", "Truffle", "Crispy", "Grilled", "Sweet", "Double", "Mini"]
+DISHES = {
+    "Pizza": ["Pizza", "Calzone", "Flatbread"],
+    "Burger": ["Burger", "Slider", "Melt"],
+    "Salad": ["Salad", "Bowl", "Wrap"],
+    "Pasta": ["Pasta", "Lasagna", "Gnocchi"],
+    "Beverage": ["Lemonade", "Smoothie", "Iced Tea"],
+    "Dessert": ["Cake", "Sundae", "Brownie"]
+}
+FLAVOURS = ["mushroom", "basil", "chicken", "beef", "tofu", "pepper", "cheese", "mango", "chocolate", "garlic",
+            "onion", "bacon", "spinach", "lemon", "honey", "chili", "berry", "caramel", "olive", "pesto"]
+EMBEDDING_SIZE = 384
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """p50/p95/p99/mean of samples given in seconds, reported in milliseconds"""
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+
+    def at(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    return {
+        'p50_ms': round(at(0.50) * 1000, 3),
+        'p95_ms': round(at(0.95) * 1000, 3),
+        'p99_ms': round(at(0.99) * 1000, 3),
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 3)
+    }
+
+
+def timed(func: Callable[[Any], Any], inputs: List[Any]) -> List[float]:
+    samples = []
+    for value in inputs:
+        start = time.perf_counter()
+        func(value)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def synthetic_menu(size: int, rng: random.Random) -> List[tuple]:
+    """(name, category, price, description) rows with unique names"""
+    rows, seen = [], set()
+    while len(rows) < size:
+        category = rng.choice(list(DISHES))
+        flavour = rng.choice(FLAVOURS)
+        name = f"{rng.choice(ADJECTIVES)} {flavour.title()} {rng.choice(DISHES[category])}"
+        if name in seen:
+            name = f"{name} {len(rows)}"
+        seen.add(name)
+        description = f"{category} with {flavour}, {rng.choice(FLAVOURS)} and {rng.choice(FLAVOURS)}"
+        rows.append((name, category, round(rng.uniform(2, 30), 2), description))
+    return rows
+
+
+def menu_database(workdir: str, size: int, seed: int) -> OrderDatabase:
+    """Database whose menu is replaced by `size` synthetic items"""
+    db = OrderDatabase(os.path.join(workdir, f"menu-{size}.db"))
+    with db.pool.transaction() as conn:
+        conn.execute("DELETE FROM menu")
+        conn.executemany(
+            "INSERT INTO menu (name, category, price, description) VALUES (?, ?, ?, ?)",
+            synthetic_menu(size, random.Random(seed))
+        )
+    return db
+
+
+def seed_orders(db: OrderDatabase, count: int, seed: int, days: int = 90):
+    """Insert `count` orders spread over the last `days` days in one transaction"""
+    rng = random.Random(seed)
+    menu = db.get_menu()
+    now = datetime.utcnow()
+    with db.pool.transaction() as conn:
+        start_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM orders").fetchone()[0] + 1
+        orders, lines = [], []
+        for order_id in range(start_id, start_id + count):
+            picked = [(item, rng.randint(1, 3)) for item in rng.sample(menu, rng.randint(1, min(4, len(menu))))]
+            items = [{'name': item['name'], 'quantity': qty, 'price': item['price']} for item, qty in picked]
+            order_time = now - timedelta(seconds=rng.randint(0, days * 86400))
+            orders.append((order_id, f"customer-{rng.randint(1, 5000)}", json.dumps(items),
+                           round(sum(item['price'] * qty for item, qty in picked), 2),
+                           order_time.strftime('%Y-%m-%d %H:%M:%S')))
+            lines.extend((order_id, item['id'], item['name'], qty, item['price']) for item, qty in picked)
+        conn.executemany(
+            "INSERT INTO orders (id, customer_name, items, total_amount, order_time) VALUES (?, ?, ?, ?, ?)",
+            orders
+        )
+        conn.executemany(
+            "INSERT INTO order_items (order_id, menu_id, name, quantity, unit_price) VALUES (?, ?, ?, ?, ?)",
+            lines
+        )
+
+
+def search_queries(count: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    templates = ["something with {0}", "{0} and {1}", "do you have a {0} {2}", "cheap {2} with {1}", "{2}"]
+    dishes = [dish.lower() for names in DISHES.values() for dish in names]
+    return [
+        rng.choice(templates).format(rng.choice(FLAVOURS), rng.choice(FLAVOURS), rng.choice(dishes))
+        for _ in range(count)
+    ]
+
+
+def bench_search(workdir: str, size: int, queries: int, seed: int, backend: str) -> Dict[str, Any]:
+    db = menu_database(workdir, size, seed)
+    start = time.perf_counter()
+    rag = MenuRAG(db.get_menu(), os.path.join(workdir, f"index-{size}-{backend}"),
+                  embeddings=DeterministicFakeEmbedding(size=EMBEDDING_SIZE), backend=backend)
+    build = time.perf_counter() - start
+
+    texts = list(dict.fromkeys(search_queries(queries * 2, seed)))[:queries]
+    cold = timed(lambda query: rag.search_menu(query), texts)
+    warm = timed(lambda query: rag.search_menu(query), texts)
+    filtered = timed(lambda query: rag.search_menu(query, category="Pizza", max_price=15), texts)
+    return {
+        'menu_items': size,
+        'backend': backend,
+        'index_build_s': round(build, 3),
+        'cold': percentiles(cold),
+        'cached': percentiles(warm),
+        'filtered_cold': percentiles(filtered)
+    }
+
+
+def bench_parser(workdir: str, size: int, messages: int, seed: int) -> Dict[str, Any]:
+    db = menu_database(workdir, size, seed)
+    tool = OrderParsingTool(db)
+    texts = [message for message, _ in generate_messages(db.get_menu(), messages, seed)]
+    tool._run(texts[0])  # Compile the matcher outside the timed loop
+    samples = timed(tool._run, texts)
+    return {
+        'menu_items': size,
+        'messages': len(texts),
+        'messages_per_sec': round(len(texts) / sum(samples), 1),
+        **percentiles(samples)
+    }
+
+
+def bench_analytics(workdir: str, count: int, calls: int, seed: int) -> Dict[str, Any]:
+    db = OrderDatabase(os.path.join(workdir, f"orders-{count}.db"))
+    start = time.perf_counter()
+    seed_orders(db, count, seed)
+    load = time.perf_counter() - start
+    samples = timed(lambda _: db.get_order_analytics(), range(calls))
+    return {
+        'orders': count,
+        'load_s': round(load, 3),
+        **percentiles(samples)
+    }
+
+
+def run(menu_sizes: List[int], order_counts: List[int], queries: int, messages: int, calls: int,
+        seed: int, backends: List[str]) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp()
+    return {
+        'benchmark': 'micro',
+        'seed': seed,
+        'python': platform.python_version(),
+        'search_menu': [
+            bench_search(workdir, size, queries, seed, backend) for size in menu_sizes for backend in backends
+        ],
+        'order_parser': [bench_parser(workdir, size, messages, seed) for size in menu_sizes],
+        'order_analytics': [bench_analytics(workdir, count, calls, seed) for count in order_counts]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--menu-sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--order-counts", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--backends", nargs="+", default=["chroma", "numpy"], choices=["chroma", "numpy"])
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args()
+
+    results = run(args.menu_sizes, args.order_counts, args.queries, args.messages, args.calls,
+                  args.seed, args.backends)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
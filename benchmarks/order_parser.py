@@ -0,0 +1,147 @@
+"""Order parser benchmark: compiled OrderMatcher vs the original nested-scan parser.
+
+Throughput (messages/sec) is measured on long, messy order messages generated
+from the default menu. Accuracy is measured on hand-written messages with
+their expected items (benchmarks/data/order_messages.json), written
+independently of the matcher's rules so they can show where it falls short.
+
+    python -m benchmarks.order_parser --messages 2000 --seed 7
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from typing import List, Dict, Any, Tuple
+
+from database import OrderDatabase
+from order_matcher import OrderMatcher
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "data", "order_messages.json")
+
+NUMBER_NAMES = {1: 'one', 2: 'two', 3: 'three', 4: 'four', 5: 'five', 6: 'six'}
+OPENERS = ["hi, can i get", "umm so I'd like", "please add", "ok let me have", "hey!! i want", "", "yo"]
+JOINERS = [", ", " and ", " plus ", ", also ", " & ", " ... and then "]
+CLOSERS = ["", " please", " thanks!", " asap", " and that's it", ", nothing else"]
+
+
+def legacy_parse(message: str, menu_dict: Dict[str, Dict[str, Any]]) -> Dict[str, int]:
+    """The original OrderParsingTool._run matching loop, kept as the baseline"""
+    quantities: Dict[str, int] = {}
+    words = message.lower().split()
+    for i, word in enumerate(words):
+        quantity = 1
+        if word.isdigit():
+            quantity = int(word)
+            if i + 1 < len(words):
+                item_word = words[i + 1]
+            else:
+                continue
+        elif word in ['one', 'a', 'an']:
+            quantity = 1
+            if i + 1 < len(words):
+                item_word = words[i + 1]
+            else:
+                continue
+        else:
+            item_word = word
+
+        for menu_name, menu_item in menu_dict.items():
+            if item_word in menu_name or any(item_word in part for part in menu_name.split()):
+                quantities[menu_item['name']] = quantities.get(menu_item['name'], 0) + quantity
+                break
+    return quantities
+
+
+def surface_form(name: str, quantity: int, rng: random.Random) -> str:
+    """Render one ordered item the way a customer might type it"""
+    text = name if rng.random() < 0.5 else name.lower()
+    if quantity > 1 and rng.random() < 0.6:
+        text += "s"
+    style = rng.random()
+    if quantity == 1 and style < 0.3:
+        return f"a {text}"
+    if style < 0.6:
+        return f"{quantity} {text}"
+    if style < 0.8 and quantity in NUMBER_NAMES:
+        return f"{NUMBER_NAMES[quantity]} {text}"
+    return f"{quantity}x {text}"
+
+
+def generate_messages(menu: List[Dict[str, Any]], count: int, seed: int) -> List[str]:
+    """Synthetic order messages for the throughput measurement"""
+    rng = random.Random(seed)
+    messages = []
+    for _ in range(count):
+        parts = [
+            surface_form(item['name'], rng.choice([1, 1, 1, 2, 2, 3, 4, 6]), rng)
+            for item in rng.sample(menu, rng.randint(2, min(6, len(menu))))
+        ]
+        body = parts[0]
+        for part in parts[1:]:
+            body += rng.choice(JOINERS) + part
+        messages.append(f"{rng.choice(OPENERS)} {body}{rng.choice(CLOSERS)}".strip())
+    return messages
+
+
+def load_fixtures(path: str = FIXTURES) -> List[Tuple[str, Dict[str, int]]]:
+    """Hand-written messages paired with the {item name: quantity} they should parse to"""
+    with open(path) as f:
+        return [(fixture['message'], fixture['items']) for fixture in json.load(f)]
+
+
+def score(parse, messages: List[str], fixtures: List[Tuple[str, Dict[str, int]]]) -> Dict[str, Any]:
+    start = time.perf_counter()
+    for message in messages:
+        parse(message)
+    elapsed = time.perf_counter() - start
+
+    exact = correct_items = predicted_items = expected_items = 0
+    for message, truth in fixtures:
+        prediction = parse(message)
+        exact += prediction == truth
+        correct_items += sum(1 for name, qty in prediction.items() if truth.get(name) == qty)
+        predicted_items += len(prediction)
+        expected_items += len(truth)
+
+    return {
+        'messages_per_sec': round(len(messages) / elapsed, 1),
+        'exact_match_accuracy': round(exact / len(fixtures), 4),
+        'item_precision': round(correct_items / max(predicted_items, 1), 4),
+        'item_recall': round(correct_items / max(expected_items, 1), 4)
+    }
+
+
+def run(count: int, seed: int) -> Dict[str, Any]:
+    db = OrderDatabase(os.path.join(tempfile.mkdtemp(), "bench.db"))
+    menu = db.get_menu()
+    messages = generate_messages(menu, count, seed)
+    fixtures = load_fixtures()
+
+    menu_dict = {item['name'].lower(): item for item in menu}
+    matcher = OrderMatcher(menu)
+
+    def compiled_parse(message: str) -> Dict[str, int]:
+        return {item['name']: quantity for item, quantity in matcher.parse(message)['items']}
+
+    return {
+        'messages': count,
+        'seed': seed,
+        'avg_message_chars': round(sum(len(m) for m in messages) / count, 1),
+        'accuracy_fixtures': len(fixtures),
+        'legacy': score(lambda message: legacy_parse(message, menu_dict), messages, fixtures),
+        'compiled': score(compiled_parse, messages, fixtures)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    print(json.dumps(run(args.messages, args.seed), indent=2))
+
+
+if __name__ == "__main__":
+    main()
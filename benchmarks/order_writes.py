@@ -0,0 +1,123 @@
+"""Order write throughput: one transaction per order vs batches vs group commit.
+
+- single: N threads calling create_order (one commit per order, the original path)
+- group:  the same N threads with the write-behind group-commit queue enabled
+- batch:  one thread importing orders through create_orders_batch (POS bulk import)
+
+Each mode runs per durability setting on a fresh database file, and the stored
+order count is checked against what was submitted.
+
+    python -m benchmarks.order_writes --orders 5000 --threads 16 --durability normal full
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List
+
+from benchmarks.micro import percentiles
+from database import OrderDatabase
+
+
+def make_orders(menu: List[Dict[str, Any]], count: int, seed: int) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    orders = []
+    for n in range(count):
+        picked = rng.sample(menu, rng.randint(1, 3))
+        items = [{'name': item['name'], 'quantity': 1, 'price': item['price'], 'total': item['price']}
+                 for item in picked]
+        orders.append({'customer_name': f"customer-{n}", 'items': items,
+                       'total_amount': round(sum(item['price'] for item in picked), 2)})
+    return orders
+
+
+def stored_orders(db: OrderDatabase) -> int:
+    with db.pool.connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+
+
+def run_threads(db: OrderDatabase, orders: List[Dict[str, Any]], threads: int) -> List[float]:
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    def worker(share: List[Dict[str, Any]]):
+        samples = []
+        for order in share:
+            start = time.perf_counter()
+            db.create_order(order['customer_name'], order['items'], order['total_amount'])
+            samples.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(samples)
+
+    workers = [threading.Thread(target=worker, args=(orders[n::threads],)) for n in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return latencies
+
+
+def run_mode(mode: str, durability: str, orders: List[Dict[str, Any]], threads: int, batch_size: int,
+             group_commit_ms: float) -> Dict[str, Any]:
+    db = OrderDatabase(os.path.join(tempfile.mkdtemp(), f"{mode}-{durability}.db"), durability=durability,
+                       group_commit_ms=group_commit_ms if mode == "group" else None)
+    latencies: List[float] = []
+
+    start = time.perf_counter()
+    if mode == "batch":
+        for offset in range(0, len(orders), batch_size):
+            batch_start = time.perf_counter()
+            db.create_orders_batch(orders[offset:offset + batch_size])
+            latencies.append(time.perf_counter() - batch_start)
+    else:
+        latencies = run_threads(db, orders, threads)
+    db.close()
+    elapsed = time.perf_counter() - start
+
+    result = {
+        'mode': mode,
+        'durability': durability,
+        'orders': len(orders),
+        'orders_per_sec': round(len(orders) / elapsed, 1),
+        'latency': percentiles(latencies),
+        'stored': stored_orders(db)
+    }
+    if mode == "group":
+        result['queue'] = db.write_queue.stats()
+    if mode == "batch":
+        result['batch_size'] = batch_size
+    else:
+        result['threads'] = threads
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--group-commit-ms", type=float, default=0.0,
+                        help="Extra linger per batch; 0 batches whatever queued during the last commit")
+    parser.add_argument("--modes", nargs="+", default=["single", "group", "batch"],
+                        choices=["single", "group", "batch"])
+    parser.add_argument("--durability", nargs="+", default=["normal", "full"],
+                        choices=sorted(OrderDatabase.DURABILITY_MODES))
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    menu = OrderDatabase(os.path.join(tempfile.mkdtemp(), "menu.db")).get_menu()
+    orders = make_orders(menu, args.orders, args.seed)
+    results = [
+        run_mode(mode, durability, orders, args.threads, args.batch_size, args.group_commit_ms)
+        for durability in args.durability for mode in args.modes
+    ]
+    print(json.dumps({'benchmark': 'order_writes', 'seed': args.seed, 'results': results}, indent=2))
+    if any(result['stored'] != result['orders'] for result in results):
+        raise SystemExit("Stored order count does not match submitted orders")
+
+
+if __name__ == "__main__":
+    main()
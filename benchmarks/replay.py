@@ -0,0 +1,213 @@
+"""Replay recorded conversations through FoodOrderAgent without network calls.
+
+ChatGroq is replaced by the deterministic ScriptedChatModel (stub_llm.py) and
+the embedder by a fake one, so runs are free and repeatable. Reports per-stage
+latency (LLM, RAG search, database, order parsing, fast path and the agent's
+own overhead), turn throughput at several session concurrencies and RSS.
+
+    python -m benchmarks.replay --sessions 1 8 64
+    python -m benchmarks.replay --llm-latency-ms 300 --jitter-ms 100 --output replay.json
+    python -m benchmarks.replay --no-fast-path --menu-context
+    python -m benchmarks.replay --no-fast-path --parallel-tools
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List
+from uuid import UUID
+
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from langchain_core.callbacks import BaseCallbackHandler
+
+from agents import AgentResources, FoodOrderAgent
+from benchmarks.micro import EMBEDDING_SIZE, percentiles
+from benchmarks.sessions import rss_mb
+from stub_llm import ScriptedChatModel
+
+CONVERSATIONS = os.path.join(os.path.dirname(__file__), "data", "conversations.json")
+
+# Tool name -> reported stage
+TOOL_STAGES = {'menu_search': 'rag_search', 'database_tool': 'db', 'order_parser': 'order_parsing'}
+
+
+class StageTimer(BaseCallbackHandler):
+    """Accumulates LLM and tool time for the turn it is attached to"""
+
+    def __init__(self):
+        self.started: Dict[UUID, tuple] = {}
+        self.totals: Dict[str, float] = {}
+        self.llm_calls = 0
+        # Parallel tool calls report from pool threads
+        self._lock = threading.Lock()
+
+    def _start(self, run_id: UUID, stage: str):
+        self.started[run_id] = (stage, time.perf_counter())
+
+    def _end(self, run_id: UUID):
+        stage, start = self.started.pop(run_id, (None, None))
+        if stage is not None:
+            with self._lock:
+                self.totals[stage] = self.totals.get(stage, 0.0) + time.perf_counter() - start
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs):
+        self.llm_calls += 1
+        self._start(run_id, 'llm')
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs):
+        self._end(run_id)
+
+    def on_llm_error(self, error, *, run_id: UUID, **kwargs):
+        self._end(run_id)
+
+    def on_tool_start(self, serialized, input_str, *, run_id: UUID, **kwargs):
+        self._start(run_id, TOOL_STAGES.get(serialized.get('name'), 'other_tools'))
+
+    def on_tool_end(self, output, *, run_id: UUID, **kwargs):
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id: UUID, **kwargs):
+        self._end(run_id)
+
+
+def load_conversations(path: str) -> List[Dict[str, Any]]:
+    with open(path) as handle:
+        return json.load(handle)
+
+
+def build_resources(workdir: str, latency_ms: float, jitter_ms: float, seed: int) -> AgentResources:
+    resources = AgentResources(
+        "replay-key",
+        os.path.join(workdir, "orders.db"),
+        os.path.join(workdir, "menu_embeddings"),
+        embeddings=DeterministicFakeEmbedding(size=EMBEDDING_SIZE),
+        llm=ScriptedChatModel(latency_ms=latency_ms, jitter_ms=jitter_ms, seed=seed)
+    )
+    # Fake vectors carry no meaning, so the router's centroid check would veto every rule match
+    resources.router.embeddings = None
+    return resources
+
+
+def replay_session(resources: AgentResources, conversation: Dict[str, Any], fast_path: bool,
+                   agent_options: Dict[str, Any], turns: List[Dict[str, Any]], lock: threading.Lock):
+    agent = FoodOrderAgent("replay-key", fast_path=fast_path, resources=resources, **agent_options)
+    records = []
+    for request in conversation['turns']:
+        timer = StageTimer()
+        start = time.perf_counter()
+        answer = agent.process_message(f"Customer: {conversation['customer']}. Request: {request}",
+                                       callbacks=[timer])
+        total = time.perf_counter() - start
+        stages = dict(timer.totals)
+        if not timer.llm_calls:
+            stages['fast_path'] = total
+        stages['agent_overhead'] = max(0.0, total - sum(stages.values()))
+        records.append({
+            'total': total,
+            'stages': stages,
+            'llm_calls': timer.llm_calls,
+            'error': answer.startswith("I apologize, but I encountered an error")
+        })
+    with lock:
+        turns.extend(records)
+
+
+def run_level(resources: AgentResources, conversations: List[Dict[str, Any]], sessions: int,
+              fast_path: bool, agent_options: Dict[str, Any], seed: int) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    assigned = [rng.choice(conversations) for _ in range(sessions)]
+    turns: List[Dict[str, Any]] = []
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=replay_session, args=(resources, conversation, fast_path, agent_options, turns, lock))
+        for conversation in assigned
+    ]
+
+    rss_before = rss_mb()
+    orders_before = resources.db.get_order_analytics()['total_orders']
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    stage_names = sorted({stage for turn in turns for stage in turn['stages']})
+    return {
+        'sessions': sessions,
+        'turns': len(turns),
+        'wall_s': round(wall, 3),
+        'turns_per_sec': round(len(turns) / wall, 2) if wall else None,
+        'errors': sum(turn['error'] for turn in turns),
+        'orders_created': resources.db.get_order_analytics()['total_orders'] - orders_before,
+        'llm_calls_per_turn': round(sum(turn['llm_calls'] for turn in turns) / max(len(turns), 1), 3),
+        'turn_latency': percentiles([turn['total'] for turn in turns]),
+        # Per-stage time per turn, over the turns that used the stage
+        'stages': {
+            stage: percentiles([turn['stages'][stage] for turn in turns if stage in turn['stages']])
+            for stage in stage_names
+        },
+        'rss_before_mb': round(rss_before, 1),
+        'rss_after_mb': round(rss_mb(), 1)
+    }
+
+
+def run(session_levels: List[int], latency_ms: float, jitter_ms: float, seed: int, fast_path: bool,
+        agent_options: Dict[str, Any], conversations_path: str) -> Dict[str, Any]:
+    random.seed(seed)
+    conversations = load_conversations(conversations_path)
+    workdir = tempfile.mkdtemp()
+    rss_start = rss_mb()
+
+    start = time.perf_counter()
+    resources = build_resources(workdir, latency_ms, jitter_ms, seed)
+    startup = time.perf_counter() - start
+
+    levels = [run_level(resources, conversations, sessions, fast_path, agent_options, seed) for sessions in session_levels]
+    return {
+        'benchmark': 'replay',
+        'seed': seed,
+        'python': platform.python_version(),
+        'llm_latency_ms': latency_ms,
+        'llm_jitter_ms': jitter_ms,
+        'fast_path': fast_path,
+        **agent_options,
+        'conversations': len(conversations),
+        'resources_startup_s': round(startup, 3),
+        'rss_start_mb': round(rss_start, 1),
+        'levels': levels
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 8, 64])
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Simulated LLM round trip")
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--no-fast-path", action="store_true", help="Send every turn through the agent")
+    parser.add_argument("--menu-context", action="store_true",
+                        help="Inject retrieved menu items into the prompt instead of a menu_search round trip")
+    parser.add_argument("--parallel-tools", action="store_true",
+                        help="Tool-calling agent that runs several tool calls per step concurrently")
+    parser.add_argument("--conversations", default=CONVERSATIONS)
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args()
+
+    results = run(args.sessions, args.llm_latency_ms, args.jitter_ms, args.seed,
+                  not args.no_fast_path,
+                  {'menu_context': args.menu_context, 'parallel_tools': args.parallel_tools},
+                  args.conversations)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
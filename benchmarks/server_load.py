@@ -0,0 +1,149 @@
+"""Load-test the HTTP API (server.py) locally with the scripted stub LLM.
+
+Starts the server in-process on a free port with ScriptedChatModel and a
+fake embedder, then runs waves of virtual customers that each open a
+session and replay a conversation from benchmarks/data/conversations.json
+over HTTP. Reports request throughput, latency, 503 back-pressure
+rejections and the orders stored, per number of concurrent customers.
+
+    python -m benchmarks.server_load --users 8 32 128 --llm-latency-ms 300
+    python -m benchmarks.server_load --users 128 --workers 8 --max-pending 16   # force back-pressure
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List
+
+import httpx
+import uvicorn
+from langchain_community.embeddings import DeterministicFakeEmbedding
+
+from benchmarks.micro import EMBEDDING_SIZE, percentiles
+from benchmarks.replay import CONVERSATIONS, load_conversations
+from benchmarks.sessions import rss_mb
+from database import DEFAULT_TENANT
+from server import ChatService, create_app
+from stub_llm import ScriptedChatModel
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(service: ChatService, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(create_app(service), host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def customer(client: httpx.AsyncClient, conversation: Dict[str, Any], think_ms: float,
+                   rng: random.Random, samples: List[Dict[str, Any]]):
+    """One customer: open a session, replay the conversation turn by turn"""
+    response = await client.post("/sessions", json={'customer_name': conversation['customer']})
+    if response.status_code != 200:
+        samples.append({'kind': 'session', 'status': response.status_code, 'seconds': 0.0})
+        return
+    session_id = response.json()['session_id']
+    for message in conversation['turns']:
+        start = time.perf_counter()
+        response = await client.post("/chat", json={'session_id': session_id, 'message': message})
+        samples.append({'kind': 'chat', 'status': response.status_code, 'seconds': time.perf_counter() - start})
+        if think_ms:
+            await asyncio.sleep(rng.uniform(0.5, 1.5) * think_ms / 1000)
+
+
+async def run_wave(base_url: str, conversations: List[Dict[str, Any]], users: int, think_ms: float,
+                   seed: int) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    samples: List[Dict[str, Any]] = []
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120.0, limits=limits) as client:
+        orders_before = (await client.get("/analytics")).json()['total_orders']
+        start = time.perf_counter()
+        await asyncio.gather(*[
+            customer(client, rng.choice(conversations), think_ms, random.Random(seed + n), samples)
+            for n in range(users)
+        ])
+        wall = time.perf_counter() - start
+        orders_after = (await client.get("/analytics")).json()['total_orders']
+        stats = (await client.get("/stats")).json()
+
+    chats = [sample for sample in samples if sample['kind'] == 'chat']
+    ok = [sample['seconds'] for sample in chats if sample['status'] == 200]
+    statuses: Dict[str, int] = {}
+    for sample in samples:
+        statuses[str(sample['status'])] = statuses.get(str(sample['status']), 0) + 1
+    return {
+        'users': users,
+        'chat_requests': len(chats),
+        'wall_s': round(wall, 3),
+        'ok_per_sec': round(len(ok) / wall, 2) if wall else None,
+        'statuses': statuses,
+        'rejected_503': statuses.get('503', 0),
+        'chat_latency': percentiles(ok),
+        'orders_created': orders_after - orders_before,
+        'pool': stats['pool'],
+        'sessions': stats['sessions']
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, nargs="+", default=[8, 32, 128])
+    parser.add_argument("--workers", type=int, default=16, help="Agent worker threads")
+    parser.add_argument("--max-pending", type=int, default=64, help="Queued turns before 503")
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0)
+    parser.add_argument("--jitter-ms", type=float, default=50.0)
+    parser.add_argument("--think-ms", type=float, default=0.0, help="Pause between a customer's turns")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--conversations", default=CONVERSATIONS)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    conversations = load_conversations(args.conversations)
+    rss_start = rss_mb()
+    service = ChatService(
+        "load-test-key",
+        db_path=os.path.join(workdir, "orders.db"),
+        persist_directory=os.path.join(workdir, "menu_embeddings"),
+        session_db=os.path.join(workdir, "sessions.db"),
+        llm=ScriptedChatModel(latency_ms=args.llm_latency_ms, jitter_ms=args.jitter_ms, seed=args.seed),
+        embeddings=DeterministicFakeEmbedding(size=EMBEDDING_SIZE),
+        workers=args.workers,
+        max_pending=args.max_pending
+    )
+    # Fake vectors carry no meaning, so the router's centroid check would veto every rule match
+    service.resources(DEFAULT_TENANT).router.embeddings = None
+    service.warm_up()
+
+    port = free_port()
+    server = start_server(service, port)
+    waves = [
+        asyncio.run(run_wave(f"http://127.0.0.1:{port}", conversations, users, args.think_ms, args.seed))
+        for users in args.users
+    ]
+    server.should_exit = True
+    print(json.dumps({
+        'benchmark': 'server_load',
+        'seed': args.seed,
+        'llm_latency_ms': args.llm_latency_ms,
+        'workers': args.workers,
+        'max_pending': args.max_pending,
+        'rss_start_mb': round(rss_start, 1),
+        'rss_end_mb': round(rss_mb(), 1),
+        'waves': waves
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Start-up time and memory for N simultaneous chat sessions.
+
+Compares the shared mode (one AgentResources per process, as the app uses)
+with the old isolated mode (every session builds its own embedder, index,
+database layer and LLM client). Each mode runs in a fresh subprocess so RSS
+numbers are not polluted by the other.
+
+    python -m benchmarks.sessions --sessions 1 10 50
+    python -m benchmarks.sessions --sessions 50 --fake   # no model download / API key
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List
+
+
+def rss_mb() -> float:
+    """Current resident set size of this process in MB"""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(mode: str, sessions: int, fake: bool) -> Dict[str, Any]:
+    """Create `sessions` agents concurrently in this process and report timings"""
+    from agents import AgentResources, FoodOrderAgent
+    from resources import registry
+
+    workdir = tempfile.mkdtemp()
+    db_path = os.path.join(workdir, "orders.db")
+    index_dir = os.path.join(workdir, "menu_embeddings")
+
+    def build_resources() -> AgentResources:
+        if not fake:
+            return AgentResources("benchmark-key", db_path, index_dir)
+        from langchain_community.embeddings import DeterministicFakeEmbedding
+        from langchain_core.language_models.fake_chat_models import FakeListChatModel
+        return AgentResources("benchmark-key", db_path, index_dir,
+                              embeddings=DeterministicFakeEmbedding(size=768),
+                              llm=FakeListChatModel(responses=["ok"]))
+
+    baseline = rss_mb()
+    latencies: List[float] = []
+    agents = []
+    errors: List[str] = []
+    lock = threading.Lock()
+
+    def start_session():
+        start = time.perf_counter()
+        try:
+            if mode == "shared":
+                resources = registry.get_or_create(("benchmark", db_path), build_resources)
+            else:
+                resources = build_resources()
+            agent = FoodOrderAgent("benchmark-key", resources=resources)
+        except Exception as e:
+            # Concurrent per-session index builds can collide inside Chroma
+            with lock:
+                errors.append(f"{type(e).__name__}: {e}")
+            return
+        with lock:
+            latencies.append(time.perf_counter() - start)
+            agents.append(agent)
+
+    wall_start = time.perf_counter()
+    threads = [threading.Thread(target=start_session) for _ in range(sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - wall_start
+
+    latencies = sorted(latencies) or [float('nan')]
+    return {
+        'mode': mode,
+        'sessions': sessions,
+        'fake_models': fake,
+        'wall_seconds': round(wall, 3),
+        'session_start_p50_ms': round(statistics.median(latencies) * 1000, 1),
+        'session_start_max_ms': round(latencies[-1] * 1000, 1),
+        'rss_baseline_mb': round(baseline, 1),
+        'rss_after_mb': round(rss_mb(), 1),
+        'rss_per_session_mb': round((rss_mb() - baseline) / sessions, 2),
+        'distinct_embedders': len({id(agent.rag_system.embeddings) for agent in agents}),
+        'failed_sessions': len(errors),
+        'first_error': errors[0] if errors else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--modes", nargs="+", default=["shared", "isolated"], choices=["shared", "isolated"])
+    parser.add_argument("--fake", action="store_true", help="Use fake embeddings/LLM instead of real models")
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "SESSIONS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child[0], int(args.child[1]), args.fake)))
+        return
+
+    results = []
+    for sessions in args.sessions:
+        for mode in args.modes:
+            command = [sys.executable, "-m", "benchmarks.sessions", "--child", mode, str(sessions)]
+            if args.fake:
+                command.append("--fake")
+            output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
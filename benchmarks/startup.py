@@ -0,0 +1,144 @@
+"""Import-time profile, time-to-first-paint and time-to-first-answer for the app.
+
+Each measurement runs in a fresh interpreter:
+
+- first paint: the module-level imports of ``app.py`` (what Streamlit executes
+  before drawing anything), plus which heavy packages they drag in;
+- first answer: from the customer submitting their name to the first reply, with
+  and without the background warm-up having run while they typed;
+- the slowest top-level imports from ``python -X importtime``.
+
+    python -m benchmarks.startup --fake --typing-seconds 3
+"""
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_PACKAGES = ["langchain", "langchain_core", "langchain_community", "langchain_groq", "chromadb",
+                  "sentence_transformers", "torch", "transformers", "pandas", "plotly"]
+
+# Imports what Streamlit would execute before drawing anything; unavailable packages are skipped
+PRELUDE = """
+import importlib, json, os, sys, tempfile, threading, time
+sys.path.insert(0, %r)
+missing = []
+start = time.perf_counter()
+for module in %r:
+    try:
+        importlib.import_module(module)
+    except ImportError:
+        missing.append(module)
+paint = time.perf_counter() - start
+"""
+
+FIRST_PAINT = """
+print(json.dumps({'first_paint_s': paint, 'missing': missing,
+                  'loaded': [name for name in %r if name in sys.modules]}))
+"""
+
+FIRST_ANSWER = """
+fake, warm, typing_seconds = %r, %r, %r
+os.chdir(tempfile.mkdtemp())
+from stub_llm import ScriptedChatModel
+
+def build():
+    from agents import AgentResources
+    if not fake:
+        return AgentResources("startup-key", llm=ScriptedChatModel())
+    from langchain_community.embeddings import DeterministicFakeEmbedding
+    return AgentResources("startup-key", embeddings=DeterministicFakeEmbedding(size=384), llm=ScriptedChatModel())
+
+def shared():
+    from resources import registry
+    return registry.get_or_create("startup", build)
+
+if warm:
+    threading.Thread(target=lambda: shared().warm_up(), daemon=True).start()
+time.sleep(typing_seconds)  # The customer types their name
+
+submitted = time.perf_counter()
+from agents import FoodOrderAgent
+agent = FoodOrderAgent("startup-key", resources=shared())
+ready = time.perf_counter()
+agent.process_message("Customer: Sam. Request: do you have anything with chicken?")
+answered = time.perf_counter()
+print(json.dumps({
+    'agent_ready_after_submit_s': ready - submitted,
+    'first_answer_after_submit_s': answered - submitted
+}))
+"""
+
+
+def app_imports() -> List[str]:
+    """Modules app.py imports at module level (imports inside functions are lazy)"""
+    with open(os.path.join(ROOT, "app.py")) as handle:
+        tree = ast.parse(handle.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            modules.append(node.module)
+    return modules
+
+
+def child(code: str, *args: str) -> Dict[str, Any]:
+    output = subprocess.run([sys.executable, *args, "-c", code], capture_output=True, text=True, check=True,
+                            cwd=ROOT)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def import_profile(modules: List[str], top: int) -> List[Dict[str, Any]]:
+    """Slowest top-level imports reported by ``python -X importtime``"""
+    code = "".join(f"\ntry:\n    import {module}\nexcept ImportError:\n    pass" for module in modules)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            capture_output=True, text=True, cwd=ROOT)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith(" ") or name.startswith("  "):
+            continue  # Only top-level imports (nested ones are indented further)
+        rows.append({'module': name.strip(), 'cumulative_ms': round(int(cumulative) / 1000, 1)})
+    return sorted(rows, key=lambda row: row['cumulative_ms'], reverse=True)[:top]
+
+
+def run(fake: bool, typing_seconds: float, top: int) -> Dict[str, Any]:
+    prelude = PRELUDE % (ROOT, app_imports())
+    paint = child(prelude + FIRST_PAINT % HEAVY_PACKAGES)
+    return {
+        'benchmark': 'startup',
+        'fake_models': fake,
+        'typing_seconds': typing_seconds,
+        'first_paint': {
+            'app_imports_s': round(paint['first_paint_s'], 3),
+            'heavy_packages_loaded': paint['loaded'],
+            'unavailable': paint['missing']
+        },
+        'first_answer': {
+            mode: {key: round(value, 3) for key, value in
+                   child(prelude + FIRST_ANSWER % (fake, mode == 'warm', typing_seconds)).items()}
+            for mode in ('cold', 'warm')
+        },
+        'slowest_imports': import_profile(app_imports(), top)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fake", action="store_true", help="Use fake embeddings instead of downloading a model")
+    parser.add_argument("--typing-seconds", type=float, default=3.0,
+                        help="Time the customer spends on the name form")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+    print(json.dumps(run(args.fake, args.typing_seconds, args.top), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Many restaurants in one process: lazy per-tenant menu indexes under an LRU budget.
+
+Creates N tenants with synthetic menus in one database and one Chroma
+directory, indexes them once, then replays Zipf-distributed menu searches
+(a few busy restaurants, a long tail of quiet ones) against a
+TenantIndexManager per residency limit. Each limit runs in a fresh
+subprocess, so RSS reflects only the indexes it kept loaded.
+
+    python -m benchmarks.tenants --tenants 200 --max-resident 16 64 1000
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from langchain_community.embeddings import DeterministicFakeEmbedding
+
+from benchmarks.micro import EMBEDDING_SIZE, percentiles, search_queries, synthetic_menu
+from benchmarks.sessions import rss_mb
+from database import OrderDatabase
+from tenant_indexes import TenantIndexManager
+
+
+def tenant_ids(count: int) -> List[str]:
+    return [f"restaurant-{n:04d}" for n in range(count)]
+
+
+def prepare(workdir: str, tenants: int, menu_size: int, seed: int) -> Dict[str, Any]:
+    """Create every tenant's menu and build its collection once (the one-off embedding cost)"""
+    db = OrderDatabase(os.path.join(workdir, "orders.db"))
+    for n, tenant_id in enumerate(tenant_ids(tenants)):
+        db.for_tenant(tenant_id).add_menu_items([
+            {'name': name, 'category': category, 'price': price, 'description': description}
+            for name, category, price, description in synthetic_menu(menu_size, random.Random(seed + n))
+        ])
+
+    manager = TenantIndexManager(db, os.path.join(workdir, "menu_embeddings"),
+                                 embeddings=DeterministicFakeEmbedding(size=EMBEDDING_SIZE), max_resident=8)
+    start = time.perf_counter()
+    for tenant_id in tenant_ids(tenants):
+        manager.get(tenant_id)
+    return {'tenants': tenants, 'menu_size': menu_size, 'index_build_s': round(time.perf_counter() - start, 2)}
+
+
+def measure(workdir: str, tenants: int, max_resident: int, budget_mb: float, requests: int, zipf: float,
+            seed: int) -> Dict[str, Any]:
+    """Serve Zipf-distributed searches from an already indexed workdir"""
+    rss_start = rss_mb()
+    start = time.perf_counter()
+    manager = TenantIndexManager(OrderDatabase(os.path.join(workdir, "orders.db")),
+                                 os.path.join(workdir, "menu_embeddings"),
+                                 embeddings=DeterministicFakeEmbedding(size=EMBEDDING_SIZE),
+                                 max_resident=max_resident, memory_budget_mb=budget_mb)
+    startup = time.perf_counter() - start
+    rss_ready = rss_mb()
+
+    rng = random.Random(seed)
+    ids = tenant_ids(tenants)
+    weights = [1 / (rank + 1) ** zipf for rank in range(tenants)]
+    queries = search_queries(requests, seed)
+    hits: List[float] = []
+    loads: List[float] = []
+    for query in queries:
+        tenant_id = rng.choices(ids, weights)[0]
+        loads_before = manager.loads
+        request_start = time.perf_counter()
+        manager.index(tenant_id).search_menu(query)
+        elapsed = time.perf_counter() - request_start
+        (loads if manager.loads > loads_before else hits).append(elapsed)
+
+    return {
+        'max_resident': max_resident,
+        'memory_budget_mb': budget_mb,
+        'requests': requests,
+        'manager_startup_s': round(startup, 4),
+        'rss_start_mb': round(rss_start, 1),
+        'rss_ready_mb': round(rss_ready, 1),
+        'rss_after_mb': round(rss_mb(), 1),
+        'resident_hit_latency': percentiles(hits),
+        'load_latency': percentiles(loads),
+        'manager': manager.stats()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tenants", type=int, default=200)
+    parser.add_argument("--menu-size", type=int, default=40)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--max-resident", type=int, nargs="+", default=[16, 64, 1000])
+    parser.add_argument("--budget-mb", type=float, default=512.0)
+    parser.add_argument("--zipf", type=float, default=1.1, help="Skew of traffic across restaurants")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--child", nargs=2, metavar=("WORKDIR", "MAX_RESIDENT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child[0], args.tenants, int(args.child[1]), args.budget_mb,
+                                 args.requests, args.zipf, args.seed)))
+        return
+
+    workdir = tempfile.mkdtemp()
+    setup = prepare(workdir, args.tenants, args.menu_size, args.seed)
+    levels = []
+    for max_resident in args.max_resident:
+        command = [sys.executable, "-m", "benchmarks.tenants", "--child", workdir, str(max_resident),
+                   "--tenants", str(args.tenants), "--requests", str(args.requests),
+                   "--budget-mb", str(args.budget_mb), "--zipf", str(args.zipf), "--seed", str(args.seed)]
+        output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+        levels.append(json.loads(output.strip().splitlines()[-1]))
+    print(json.dumps({'benchmark': 'tenants', 'seed': args.seed, 'zipf': args.zipf, **setup, 'levels': levels},
+                     indent=2))
+
+
+if __name__ == "__main__":
+    main()
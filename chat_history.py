@@ -0,0 +1,159 @@
+from langchain.schema import HumanMessage, SystemMessage
+from typing import List, Dict, Any, Callable, Optional, Tuple
+import json
+import re
+
+
+# Sentence or line ends, where a summary can be cut without leaving half a sentence
+SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def count_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token for English chat text)"""
+    return max(1, len(text) // 4)
+
+
+def trim_to_tokens(text: str, max_tokens: int, token_counter: Callable[[str], int] = count_tokens) -> str:
+    """Drop the oldest whole sentences (or lines) until ``text`` fits in ``max_tokens``"""
+    sentences = [sentence for sentence in SENTENCE_BREAK.split(text) if sentence.strip()]
+    while len(sentences) > 1 and token_counter(" ".join(sentences)) > max_tokens:
+        sentences.pop(0)
+    text = " ".join(sentences)
+    if token_counter(text) <= max_tokens:
+        return text
+    # A single sentence that is still too long loses its oldest words instead
+    words = text.split()
+    while len(words) > 1 and token_counter(" ".join(words)) > max_tokens:
+        words.pop(0)
+    return " ".join(words)
+
+
+class LLMSummarizer:
+    """Folds evicted turns into the running summary with one LLM call"""
+
+    PROMPT = (
+        "You maintain a running summary of a restaurant ordering conversation. "
+        "Merge the new turns into the existing summary. Keep requests, preferences, "
+        "open questions and decisions; drop greetings and menu listings. "
+        "Answer with the updated summary only, at most {max_words} words."
+    )
+
+    def __init__(self, llm, max_words: int = 120):
+        self.llm = llm
+        self.max_words = max_words
+
+    def __call__(self, summary: str, turns: List[Tuple[str, str]]) -> str:
+        transcript = "\n".join(f"{role}: {content}" for role, content in turns)
+        response = self.llm.invoke([
+            SystemMessage(content=self.PROMPT.format(max_words=self.max_words)),
+            HumanMessage(content=f"Existing summary:\n{summary or '(none)'}\n\nNew turns:\n{transcript}")
+        ])
+        return response.content.strip()
+
+
+def extractive_summarizer(summary: str, turns: List[Tuple[str, str]], max_chars: int = 1200) -> str:
+    """LLM-free fallback: keep a clipped line per turn, newest last"""
+    lines = [summary] if summary else []
+    lines += [f"{role}: {' '.join(content.split())[:160]}" for role, content in turns]
+    return "\n".join(lines)[-max_chars:]
+
+
+class ChatHistoryManager:
+    """Token-budgeted chat history with an incrementally updated summary.
+
+    Recent turns are kept verbatim within ``recent_tokens``, always at least
+    the last ``min_recent_turns`` exchanges (user message plus reply). When
+    the window overflows, the oldest turns are folded into a running summary
+    in one batch, so the summarizer runs once per eviction rather than every
+    turn.
+    Confirmed order facts are pinned as structured state and always sent.
+    """
+
+    def __init__(self, max_tokens: int = 2000, summary_tokens: int = 400, min_recent_turns: int = 2,
+                 summarizer: Optional[Callable[[str, List[Tuple[str, str]]], str]] = None,
+                 token_counter: Callable[[str], int] = count_tokens):
+        self.recent_tokens = max_tokens - summary_tokens
+        self.summary_tokens = summary_tokens
+        self.min_recent_turns = min_recent_turns
+        self.summarizer = summarizer or extractive_summarizer
+        self.count_tokens = token_counter
+        self.clear()
+
+    def clear(self):
+        self.recent: List[Tuple[str, str, int]] = []
+        self.summary = ""
+        self.pinned: Dict[str, Any] = {}
+        self.summarized_turns = 0
+
+    def pin(self, key: str, value: Any):
+        """Record a confirmed fact (customer name, cart, placed orders)"""
+        if value is None:
+            self.pinned.pop(key, None)
+        else:
+            self.pinned[key] = value
+
+    def add(self, role: str, content: str):
+        self.recent.append((role, content, self.count_tokens(content)))
+        self._compact()
+
+    def add_turn(self, user_message: str, assistant_message: str):
+        self.add("human", user_message)
+        self.add("assistant", assistant_message)
+
+    def _compact(self):
+        used = sum(tokens for _, _, tokens in self.recent)
+        if used <= self.recent_tokens:
+            return
+
+        # Evict down to half the window so the summarizer runs in batches
+        evicted = []
+        # Each turn is a user message and a reply
+        while len(self.recent) > 2 * self.min_recent_turns and used > self.recent_tokens // 2:
+            role, content, tokens = self.recent.pop(0)
+            evicted.append((role, content))
+            used -= tokens
+        if not evicted:
+            return
+
+        self.summary = self.summarizer(self.summary, evicted)
+        self.summarized_turns += sum(1 for role, _ in evicted if role == "human")
+        # Never let the summary itself grow without bound
+        if self.summary and self.count_tokens(self.summary) > self.summary_tokens:
+            self.summary = trim_to_tokens(self.summary, self.summary_tokens, self.count_tokens)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-serializable state, e.g. to keep a session outside the process"""
+        return {
+            'recent': [[role, content] for role, content, _ in self.recent],
+            'summary': self.summary,
+            'pinned': self.pinned,
+            'summarized_turns': self.summarized_turns
+        }
+
+    def load(self, state: Dict[str, Any]):
+        """Replace the history with state saved by ``to_dict``"""
+        self.clear()
+        self.recent = [(role, content, self.count_tokens(content)) for role, content in state.get('recent', [])]
+        self.summary = state.get('summary', "")
+        self.pinned = dict(state.get('pinned', {}))
+        self.summarized_turns = state.get('summarized_turns', 0)
+
+    def state_message(self) -> Optional[str]:
+        parts = []
+        if self.pinned:
+            parts.append("Confirmed order state (authoritative):\n" + json.dumps(self.pinned, indent=1))
+        if self.summary:
+            parts.append(f"Summary of the earlier conversation:\n{self.summary}")
+        return "\n\n".join(parts) or None
+
+    def build(self) -> List[Tuple[str, str]]:
+        """Bounded chat_history for the agent prompt"""
+        history = []
+        state = self.state_message()
+        if state:
+            history.append(("system", state))
+        history.extend((role, content) for role, content, _ in self.recent)
+        return history
+
+    def prompt_tokens(self) -> int:
+        return sum(self.count_tokens(content) for _, content in self.build())
@@ -1,152 +1,837 @@
 import sqlite3
-import pandas as pd
-from datetime import datetime
-from typing import List, Dict, Any
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Callable, Iterator, Optional, Tuple, Union
+import argparse
 import json
+import os
+import threading
+import time
+from db_pool import ConnectionPool
+from menu_cache import MenuSnapshot
+from order_export import chunk_writer, export_format
+from telemetry import telemetry, traced
+from write_queue import OrderWriteQueue
+
+# Restaurant that owns rows written before tenancy existed, and the sample menu
+DEFAULT_TENANT = "default"
 
 class OrderDatabase:
-    def __init__(self, db_path: str = "orders.db"):
+    # Bumped whenever a migration is added to migrate()
+    SCHEMA_VERSION = 3
+    
+    # How long a cached menu snapshot is served before its version is checked in SQLite again;
+    # menu changes made through this instance are seen immediately
+    MENU_VERSION_TTL_S = 1.0
+    
+    # Rollup bucket formats, applied to order_time (UTC) with strftime
+    ROLLUP_GRANULARITIES = {
+        'hour': '%Y-%m-%d %H:00:00',
+        'day': '%Y-%m-%d'
+    }
+    
+    # PRAGMA synchronous per durability mode. In WAL mode 'normal' survives application
+    # crashes but may lose the last commits on power loss; 'full' fsyncs every commit
+    DURABILITY_MODES = {
+        'full': 'FULL',
+        'normal': 'NORMAL',
+        'off': 'OFF'
+    }
+    
+    def __init__(self, db_path: str = "orders.db", pool: Optional[ConnectionPool] = None, durability: str = "normal",
+                 group_commit_ms: Optional[float] = None, tenant_id: str = DEFAULT_TENANT,
+                 _parent: Optional["OrderDatabase"] = None):
+        if durability not in self.DURABILITY_MODES:
+            raise ValueError(f"Unknown durability mode: {durability}")
         self.db_path = db_path
+        self.durability = durability
+        # Connections are pooled per database file and shared by every instance
+        self.pool = pool or ConnectionPool.for_path(db_path)
+        # Every menu and order query is scoped to this restaurant
+        self.tenant_id = tenant_id
+        self._menu_snapshot: Optional[MenuSnapshot] = None
+        # time.monotonic() of the last version check (0 forces one)
+        self._menu_checked = 0.0
+        self._menu_lock = threading.Lock()
+        self._menu_listeners: List[Callable[[MenuSnapshot], None]] = []
+        if _parent is not None:
+            # A tenant view (for_tenant): the schema is in place and orders go through the parent's queue
+            self.write_queue = _parent.write_queue
+            return
         self.init_database()
+        # Optional write-behind queue that group-commits orders from concurrent sessions
+        self.write_queue = OrderWriteQueue(self, max_delay_ms=group_commit_ms) \
+            if group_commit_ms is not None else None
+    
+    def for_tenant(self, tenant_id: str) -> "OrderDatabase":
+        """Another restaurant's view of the same database file.
+        
+        The view shares this instance's connection pool and group-commit queue
+        and skips the schema checks, so it is cheap enough to create per tenant.
+        """
+        if tenant_id == self.tenant_id:
+            return self
+        return type(self)(self.db_path, pool=self.pool, durability=self.durability, tenant_id=tenant_id,
+                          _parent=self)
     
     def init_database(self):
         """Initialize the database with required tables"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Create orders table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS orders (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                customer_name TEXT NOT NULL,
-                items TEXT NOT NULL,  -- JSON string of ordered items
-                total_amount REAL NOT NULL,
-                order_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                status TEXT DEFAULT 'pending'
+        with self.pool.transaction() as conn:
+            cursor = conn.cursor()
+            
+            # Create orders table
+            cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS orders (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    customer_name TEXT NOT NULL,
+                    items TEXT NOT NULL,  -- JSON string of ordered items
+                    total_amount REAL NOT NULL,
+                    order_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    status TEXT DEFAULT 'pending',
+                    tenant_id TEXT NOT NULL DEFAULT '{DEFAULT_TENANT}'
+                )
+            ''')
+            
+            # Create menu table
+            cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS menu (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    price REAL NOT NULL,
+                    description TEXT,
+                    available BOOLEAN DEFAULT 1,
+                    tenant_id TEXT NOT NULL DEFAULT '{DEFAULT_TENANT}'
+                )
+            ''')
+            
+            # Create order line items table (orders.items is kept for compatibility)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS order_items (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    order_id INTEGER NOT NULL REFERENCES orders(id),
+                    menu_id INTEGER REFERENCES menu(id),
+                    name TEXT NOT NULL,
+                    quantity INTEGER NOT NULL,
+                    unit_price REAL NOT NULL
+                )
+            ''')
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items(order_id)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_order_items_menu ON order_items(menu_id)")
+            # Covering index for popularity and per-item revenue rollups
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_order_items_name ON order_items(name, quantity, unit_price)"
             )
+            
+            self.migrate(conn)
+            # Everything keyed by tenant_id comes after migrate(), which adds the column to old databases
+            self.create_tenant_schema(conn)
+        
+        # Populate menu if empty
+        self.populate_menu()
+    
+    def migrate(self, conn: sqlite3.Connection):
+        """Apply one-time data migrations tracked by PRAGMA user_version"""
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        
+        if version < 1:
+            # Backfill order_items from the JSON items column
+            menu_ids = self._menu_ids(conn)
+            cursor = conn.execute("SELECT id, items FROM orders ORDER BY id")
+            while True:
+                rows = cursor.fetchmany(1000)
+                if not rows:
+                    break
+                line_items = []
+                for order_id, items_json in rows:
+                    line_items.extend(self._order_item_rows(order_id, json.loads(items_json), menu_ids))
+                conn.executemany("""
+                    INSERT INTO order_items (order_id, menu_id, name, quantity, unit_price)
+                    VALUES (?, ?, ?, ?, ?)
+                """, line_items)
+        
+        if version < 3:
+            # Rollups (version 2) are rebuilt from existing history as part of this one
+            self.migrate_tenants(conn)
+        
+        if version < self.SCHEMA_VERSION:
+            conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+    
+    @staticmethod
+    def _columns(conn: sqlite3.Connection, table: str) -> List[str]:
+        return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+    
+    def migrate_tenants(self, conn: sqlite3.Connection):
+        """Add the tenant dimension: existing rows belong to DEFAULT_TENANT"""
+        for table in ("orders", "menu"):
+            if "tenant_id" not in self._columns(conn, table):
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN tenant_id TEXT NOT NULL DEFAULT '{DEFAULT_TENANT}'")
+        
+        # Single-restaurant indexes, menu version counter and rollups are replaced by tenant-keyed ones
+        for index in ("idx_orders_time", "idx_orders_status", "idx_orders_customer"):
+            conn.execute(f"DROP INDEX IF EXISTS {index}")
+        for event in ("insert", "update", "delete"):
+            conn.execute(f"DROP TRIGGER IF EXISTS trg_menu_version_{event}")
+        conn.execute("DROP TABLE IF EXISTS menu_version")
+        for granularity in self.ROLLUP_GRANULARITIES:
+            conn.execute(f"DROP TRIGGER IF EXISTS trg_order_rollups_{granularity}")
+            conn.execute(f"DROP TRIGGER IF EXISTS trg_item_rollups_{granularity}")
+        conn.execute("DROP TABLE IF EXISTS order_rollups")
+        conn.execute("DROP TABLE IF EXISTS item_rollups")
+        legacy_watermarks = "last_order_id" in self._columns(conn, "export_watermarks") \
+            and "tenant_id" not in self._columns(conn, "export_watermarks")
+        if legacy_watermarks:
+            conn.execute("ALTER TABLE export_watermarks RENAME TO export_watermarks_legacy")
+        
+        self.create_tenant_schema(conn)
+        if legacy_watermarks:
+            conn.execute(f"""
+                INSERT INTO export_watermarks (tenant_id, name, last_order_id, exported_at)
+                SELECT '{DEFAULT_TENANT}', name, last_order_id, exported_at FROM export_watermarks_legacy
+            """)
+            conn.execute("DROP TABLE export_watermarks_legacy")
+        # Existing menus are listed as tenants from the start
+        conn.execute("""
+            INSERT INTO menu_versions (tenant_id, version)
+            SELECT DISTINCT tenant_id, 1 FROM menu WHERE true
+            ON CONFLICT (tenant_id) DO NOTHING
+        """)
+        self.rebuild_rollups(conn)
+    
+    def create_tenant_schema(self, conn: sqlite3.Connection):
+        """Tenant-keyed indexes, menu version counters, export watermarks and rollups"""
+        # Order listings page by (order_time, id) within a tenant; indexes carry the rowid implicitly
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_orders_tenant_time ON orders(tenant_id, order_time)")
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_orders_tenant_status ON orders(tenant_id, status, order_time)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_orders_tenant_customer ON orders(tenant_id, customer_name, order_time)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_menu_tenant ON menu(tenant_id, available)")
+        
+        # Menu version per tenant, bumped by triggers on every change to that tenant's menu
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS menu_versions (
+                tenant_id TEXT PRIMARY KEY,
+                version INTEGER NOT NULL
+            ) WITHOUT ROWID
         ''')
+        for event, rows in (("INSERT", ["NEW"]), ("UPDATE", ["NEW", "OLD"]), ("DELETE", ["OLD"])):
+            bumps = "".join(f"""
+                    INSERT INTO menu_versions (tenant_id, version) VALUES ({row}.tenant_id, 1)
+                    ON CONFLICT (tenant_id) DO UPDATE SET version = version + 1;""" for row in rows)
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_menu_versions_{event.lower()}
+                AFTER {event} ON menu
+                BEGIN{bumps}
+                END
+            ''')
         
-        # Create menu table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS menu (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
+        # Highest order ID each named export has written, for incremental exports
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS export_watermarks (
+                tenant_id TEXT NOT NULL,
                 name TEXT NOT NULL,
-                category TEXT NOT NULL,
-                price REAL NOT NULL,
-                description TEXT,
-                available BOOLEAN DEFAULT 1
+                last_order_id INTEGER NOT NULL,
+                exported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (tenant_id, name)
             )
         ''')
         
-        conn.commit()
-        conn.close()
+        self.create_rollups(conn)
+    
+    def create_rollups(self, conn: sqlite3.Connection):
+        """Create the time-bucketed rollup tables and the triggers that maintain them.
+
+        Every insert into orders / order_items bumps its tenant's hourly and
+        daily buckets, so dashboard reads cost O(buckets) rather than O(orders).
+        """
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS order_rollups (
+                tenant_id TEXT NOT NULL,
+                granularity TEXT NOT NULL,
+                bucket TEXT NOT NULL,
+                order_count INTEGER NOT NULL DEFAULT 0,
+                revenue REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (tenant_id, granularity, bucket)
+            ) WITHOUT ROWID
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS item_rollups (
+                tenant_id TEXT NOT NULL,
+                granularity TEXT NOT NULL,
+                bucket TEXT NOT NULL,
+                name TEXT NOT NULL,
+                quantity INTEGER NOT NULL DEFAULT 0,
+                revenue REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (tenant_id, granularity, bucket, name)
+            ) WITHOUT ROWID
+        ''')
         
-        # Populate menu if empty
-        self.populate_menu()
+        for granularity, bucket_format in self.ROLLUP_GRANULARITIES.items():
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_order_rollups_{granularity}
+                AFTER INSERT ON orders
+                BEGIN
+                    INSERT INTO order_rollups (tenant_id, granularity, bucket, order_count, revenue)
+                    VALUES (NEW.tenant_id, '{granularity}', strftime('{bucket_format}', NEW.order_time), 1,
+                            NEW.total_amount)
+                    ON CONFLICT (tenant_id, granularity, bucket) DO UPDATE SET
+                        order_count = order_count + 1,
+                        revenue = revenue + excluded.revenue;
+                END
+            ''')
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_item_rollups_{granularity}
+                AFTER INSERT ON order_items
+                BEGIN
+                    INSERT INTO item_rollups (tenant_id, granularity, bucket, name, quantity, revenue)
+                    SELECT tenant_id, '{granularity}', strftime('{bucket_format}', order_time), NEW.name,
+                           NEW.quantity, NEW.quantity * NEW.unit_price
+                    FROM orders WHERE id = NEW.order_id
+                    ON CONFLICT (tenant_id, granularity, bucket, name) DO UPDATE SET
+                        quantity = quantity + excluded.quantity,
+                        revenue = revenue + excluded.revenue;
+                END
+            ''')
     
-    def populate_menu(self):
-        """Populate menu with sample data"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Check if menu is already populated
-        cursor.execute("SELECT COUNT(*) FROM menu")
-        if cursor.fetchone()[0] > 0:
-            conn.close()
+    def rebuild_rollups(self, conn: Optional[sqlite3.Connection] = None):
+        """Recompute every rollup bucket from orders and order_items"""
+        if conn is None:
+            with self.pool.transaction() as conn:
+                self.rebuild_rollups(conn)
             return
         
-        menu_items = [
-            ("Margherita Pizza", "Pizza", 12.99, "Classic pizza with tomato sauce, mozzarella, and basil"),
-            ("Pepperoni Pizza", "Pizza", 15.99, "Pizza topped with pepperoni and mozzarella cheese"),
-            ("Caesar Salad", "Salad", 8.99, "Romaine lettuce with Caesar dressing and croutons"),
-            ("Chicken Burger", "Burger", 13.99, "Grilled chicken breast with lettuce and tomato"),
-            ("Beef Burger", "Burger", 16.99, "Juicy beef patty with cheese, lettuce, and tomato"),
-            ("Pasta Carbonara", "Pasta", 14.99, "Creamy pasta with bacon and parmesan cheese"),
-            ("Coca Cola", "Beverage", 2.99, "Refreshing cola drink"),
-            ("Orange Juice", "Beverage", 3.99, "Fresh squeezed orange juice"),
-            ("Chocolate Cake", "Dessert", 6.99, "Rich chocolate cake with frosting"),
-            ("Ice Cream", "Dessert", 4.99, "Vanilla ice cream with chocolate chips")
-        ]
-        
-        cursor.executemany(
-            "INSERT INTO menu (name, category, price, description) VALUES (?, ?, ?, ?)",
-            menu_items
-        )
+        conn.execute("DELETE FROM order_rollups")
+        conn.execute("DELETE FROM item_rollups")
+        for granularity, bucket_format in self.ROLLUP_GRANULARITIES.items():
+            conn.execute('''
+                INSERT INTO order_rollups (tenant_id, granularity, bucket, order_count, revenue)
+                SELECT tenant_id, ?, strftime(?, order_time), COUNT(*), SUM(total_amount)
+                FROM orders
+                GROUP BY 1, 3
+            ''', (granularity, bucket_format))
+            conn.execute('''
+                INSERT INTO item_rollups (tenant_id, granularity, bucket, name, quantity, revenue)
+                SELECT o.tenant_id, ?, strftime(?, o.order_time), oi.name, SUM(oi.quantity),
+                       SUM(oi.quantity * oi.unit_price)
+                FROM order_items oi JOIN orders o ON o.id = oi.order_id
+                GROUP BY 1, 3, 4
+            ''', (granularity, bucket_format))
+    
+    @staticmethod
+    def _menu_ids(conn: sqlite3.Connection, tenant_id: Optional[str] = None) -> Dict[str, int]:
+        """Map lowercase menu item names to their ids, optionally within one tenant's menu"""
+        if tenant_id is None:
+            rows = conn.execute("SELECT id, name FROM menu")
+        else:
+            rows = conn.execute("SELECT id, name FROM menu WHERE tenant_id = ?", (tenant_id,))
+        return {name.lower(): item_id for item_id, name in rows}
+    
+    @staticmethod
+    def _order_item_rows(order_id: int, items: List[Dict], menu_ids: Dict[str, int]) -> List[tuple]:
+        """Expand an order's item dicts into order_items rows"""
+        rows = []
+        for item in items:
+            quantity = int(item.get('quantity', 1))
+            unit_price = item.get('price')
+            if unit_price is None:
+                unit_price = item.get('total', 0) / quantity if quantity else 0
+            rows.append((order_id, menu_ids.get(item['name'].lower()), item['name'], quantity, unit_price))
+        return rows
+    
+    def populate_menu(self):
+        """Populate the default restaurant's menu with sample data"""
+        if self.tenant_id != DEFAULT_TENANT:
+            return
         
-        conn.commit()
-        conn.close()
+        with self.pool.transaction() as conn:
+            cursor = conn.cursor()
+            
+            # Check if menu is already populated
+            cursor.execute("SELECT COUNT(*) FROM menu WHERE tenant_id = ?", (self.tenant_id,))
+            if cursor.fetchone()[0] > 0:
+                return
+            
+            menu_items = [
+                ("Margherita Pizza", "Pizza", 12.99, "Classic pizza with tomato sauce, mozzarella, and basil"),
+                ("Pepperoni Pizza", "Pizza", 15.99, "Pizza topped with pepperoni and mozzarella cheese"),
+                ("Caesar Salad", "Salad", 8.99, "Romaine lettuce with Caesar dressing and croutons"),
+                ("Chicken Burger", "Burger", 13.99, "Grilled chicken breast with lettuce and tomato"),
+                ("Beef Burger", "Burger", 16.99, "Juicy beef patty with cheese, lettuce, and tomato"),
+                ("Pasta Carbonara", "Pasta", 14.99, "Creamy pasta with bacon and parmesan cheese"),
+                ("Coca Cola", "Beverage", 2.99, "Refreshing cola drink"),
+                ("Orange Juice", "Beverage", 3.99, "Fresh squeezed orange juice"),
+                ("Chocolate Cake", "Dessert", 6.99, "Rich chocolate cake with frosting"),
+                ("Ice Cream", "Dessert", 4.99, "Vanilla ice cream with chocolate chips")
+            ]
+            
+            cursor.executemany(
+                "INSERT INTO menu (name, category, price, description, tenant_id) VALUES (?, ?, ?, ?, ?)",
+                [item + (self.tenant_id,) for item in menu_items]
+            )
+        self._menu_checked = 0.0
     
-    def get_menu(self) -> List[Dict[str, Any]]:
-        """Retrieve all menu items"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def add_menu_items(self, items: List[Dict[str, Any]]) -> List[int]:
+        """Add items to this tenant's menu; each needs name, category and price"""
+        with self.pool.transaction() as conn:
+            item_ids = [
+                conn.execute("""
+                    INSERT INTO menu (name, category, price, description, available, tenant_id)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (item['name'], item['category'], item['price'], item.get('description'),
+                      item.get('available', True), self.tenant_id)).lastrowid
+                for item in items
+            ]
+        self._menu_checked = 0.0
+        return item_ids
+    
+    def list_tenants(self) -> List[str]:
+        """Every tenant that has (or had) a menu"""
+        with self.pool.connection() as conn:
+            return [row[0] for row in conn.execute("SELECT tenant_id FROM menu_versions ORDER BY tenant_id")]
+    
+    def _menu_version(self, conn: sqlite3.Connection) -> int:
+        row = conn.execute("SELECT version FROM menu_versions WHERE tenant_id = ?", (self.tenant_id,)).fetchone()
+        return row[0] if row else 0
+    
+    def get_menu_version(self) -> int:
+        """Current version of this tenant's menu; changes whenever it is modified"""
+        with self.pool.connection() as conn:
+            return self._menu_version(conn)
+    
+    def get_menu_snapshot(self) -> MenuSnapshot:
+        """Cached menu snapshot, reloaded only when the menu version has changed.
         
-        cursor.execute("""
-            SELECT id, name, category, price, description, available 
-            FROM menu WHERE available = 1
-            ORDER BY category, name
-        """)
+        The version itself is read from SQLite at most every MENU_VERSION_TTL_S,
+        so changes made by other processes show up within that interval.
+        """
+        now = time.monotonic()
+        snapshot = self._menu_snapshot
+        if snapshot is not None and now - self._menu_checked < self.MENU_VERSION_TTL_S:
+            return snapshot
+        version = self.get_menu_version()
+        self._menu_checked = now
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
         
-        columns = ['id', 'name', 'category', 'price', 'description', 'available']
-        menu_items = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        with self._menu_lock:
+            snapshot = self._menu_snapshot
+            if snapshot is not None and snapshot.version == version:
+                return snapshot
+            
+            # Read the version and the items from the same snapshot of the database
+            with telemetry.span("db.menu_reload"), self.pool.transaction(immediate=False) as conn:
+                version = self._menu_version(conn)
+                cursor = conn.execute("""
+                    SELECT id, name, category, price, description, available 
+                    FROM menu WHERE tenant_id = ? AND available = 1
+                    ORDER BY category, name
+                """, (self.tenant_id,))
+                
+                columns = ['id', 'name', 'category', 'price', 'description', 'available']
+                menu_items = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            
+            previous = self._menu_snapshot
+            snapshot = self._menu_snapshot = MenuSnapshot(version, menu_items)
         
-        conn.close()
-        return menu_items
+        if previous is not None:
+            for listener in list(self._menu_listeners):
+                # A failing listener is recorded and must not keep the others from running
+                with telemetry.span("db.menu_listener", tenant=self.tenant_id) as span:
+                    try:
+                        listener(snapshot)
+                    except Exception as e:
+                        span['error'] = f"{type(e).__name__}: {e}"
+        
+        return snapshot
+    
+    def subscribe_menu_changes(self, listener: Callable[[MenuSnapshot], None]):
+        """Call ``listener(snapshot)`` whenever a new menu version is loaded"""
+        self._menu_listeners.append(listener)
+    
+    def unsubscribe_menu_changes(self, listener: Callable[[MenuSnapshot], None]):
+        """Stop calling a listener added with ``subscribe_menu_changes``"""
+        if listener in self._menu_listeners:
+            self._menu_listeners.remove(listener)
+    
+    def get_menu(self) -> List[Dict[str, Any]]:
+        """Retrieve all menu items"""
+        return [dict(item) for item in self.get_menu_snapshot().items]
+    
+    @contextmanager
+    def _write_transaction(self) -> Iterator[sqlite3.Connection]:
+        """Write transaction committed with this instance's durability mode.
+
+        The pooled connection is shared with every other user of the file, so
+        its default setting is restored once the transaction is over.
+        """
+        with self.pool.connection() as conn:
+            mode = self.DURABILITY_MODES[self.durability]
+            switch = not conn.in_transaction and mode != self.pool.synchronous
+            if switch:
+                conn.execute(f"PRAGMA synchronous={mode}")
+            try:
+                with self.pool.transaction() as conn:
+                    yield conn
+            finally:
+                if switch:
+                    conn.execute(f"PRAGMA synchronous={self.pool.synchronous}")
     
+    @traced("db.create_order")
     def create_order(self, customer_name: str, items: List[Dict], total_amount: float) -> int:
         """Create a new order"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        if self.write_queue is not None:
+            return self.write_queue.submit(customer_name, items, total_amount, self.tenant_id).result()
         
         items_json = json.dumps(items)
         
-        cursor.execute("""
-            INSERT INTO orders (customer_name, items, total_amount)
-            VALUES (?, ?, ?)
-        """, (customer_name, items_json, total_amount))
-        
-        order_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        with self._write_transaction() as conn:
+            cursor = conn.execute("""
+                INSERT INTO orders (customer_name, items, total_amount, tenant_id)
+                VALUES (?, ?, ?, ?)
+            """, (customer_name, items_json, total_amount, self.tenant_id))
+            
+            order_id = cursor.lastrowid
+            
+            conn.executemany("""
+                INSERT INTO order_items (order_id, menu_id, name, quantity, unit_price)
+                VALUES (?, ?, ?, ?, ?)
+            """, self._order_item_rows(order_id, items, self._menu_ids(conn, self.tenant_id)))
         
         return order_id
     
-    def get_order_analytics(self) -> Dict[str, Any]:
-        """Get analytics data for dashboard"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def submit_order(self, customer_name: str, items: List[Dict], total_amount: float) -> Future:
+        """Create an order without waiting for the commit when group commit is enabled"""
+        if self.write_queue is not None:
+            return self.write_queue.submit(customer_name, items, total_amount, self.tenant_id)
+        future = Future()
+        future.set_result(self.create_order(customer_name, items, total_amount))
+        return future
+    
+    @traced("db.create_orders_batch")
+    def create_orders_batch(self, orders: List[Dict[str, Any]]) -> List[int]:
+        """Create many orders in one transaction and return their IDs in input order.
         
-        # Total orders
-        cursor.execute("SELECT COUNT(*) FROM orders")
-        total_orders = cursor.fetchone()[0]
+        Each order is a dict with ``customer_name``, ``items`` and ``total_amount``, and
+        optionally ``tenant_id`` (this instance's tenant by default).
+        """
+        if not orders:
+            return []
         
-        # Total revenue
-        cursor.execute("SELECT SUM(total_amount) FROM orders")
-        total_revenue = cursor.fetchone()[0] or 0
+        with self._write_transaction() as conn:
+            # BEGIN IMMEDIATE holds the write lock, so this ID range cannot be taken concurrently
+            last_id = conn.execute("""
+                SELECT MAX(
+                    COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'orders'), 0),
+                    COALESCE((SELECT MAX(id) FROM orders), 0)
+                )
+            """).fetchone()[0]
+            order_ids = list(range(last_id + 1, last_id + 1 + len(orders)))
+            
+            tenants = [order.get('tenant_id', self.tenant_id) for order in orders]
+            conn.executemany("""
+                INSERT INTO orders (id, customer_name, items, total_amount, tenant_id)
+                VALUES (?, ?, ?, ?, ?)
+            """, [
+                (order_id, order['customer_name'], json.dumps(order['items']), order['total_amount'], tenant_id)
+                for order_id, order, tenant_id in zip(order_ids, orders, tenants)
+            ])
+            
+            menu_ids = {tenant_id: self._menu_ids(conn, tenant_id) for tenant_id in set(tenants)}
+            item_rows = []
+            for order_id, order, tenant_id in zip(order_ids, orders, tenants):
+                item_rows.extend(self._order_item_rows(order_id, order['items'], menu_ids[tenant_id]))
+            conn.executemany("""
+                INSERT INTO order_items (order_id, menu_id, name, quantity, unit_price)
+                VALUES (?, ?, ?, ?, ?)
+            """, item_rows)
         
-        # Most popular items
-        cursor.execute("""
-            SELECT items FROM orders
-        """)
+        return order_ids
+    
+    def close(self):
+        """Flush the group-commit queue, if any"""
+        if self.write_queue is not None:
+            self.write_queue.close()
+    
+    ORDER_COLUMNS = ['id', 'customer_name', 'items', 'total_amount', 'order_time', 'status']
+    
+    @staticmethod
+    def _timestamp(value: Optional[Union[str, datetime]]) -> Optional[str]:
+        """order_time format (UTC) for a datetime; strings pass through unchanged"""
+        if isinstance(value, datetime):
+            if value.tzinfo is not None:
+                value = value.astimezone(timezone.utc)
+            return value.strftime('%Y-%m-%d %H:%M:%S')
+        return value
+    
+    @traced("db.get_orders_page")
+    def get_orders_page(self, status: Optional[str] = None, since: Optional[Union[str, datetime]] = None,
+                        until: Optional[Union[str, datetime]] = None, customer: Optional[str] = None,
+                        after: Optional[Tuple[str, int]] = None, limit: int = 100,
+                        newest_first: bool = False) -> Tuple[List[Dict[str, Any]], Optional[Tuple[str, int]]]:
+        """One page of orders ordered by (order_time, id), and the key to pass as ``after`` for the next.
+        
+        Filters are combined with AND; ``since`` is inclusive and ``until`` exclusive. Pages
+        continue from the last key seen (keyset pagination), so every page costs the same
+        index range scan however deep into the table it is.
+        """
+        conditions, params = ["tenant_id = ?"], [self.tenant_id]
+        if status is not None:
+            conditions.append("status = ?")
+            params.append(status)
+        if customer is not None:
+            conditions.append("customer_name = ?")
+            params.append(customer)
+        if since is not None:
+            conditions.append("order_time >= ?")
+            params.append(self._timestamp(since))
+        if until is not None:
+            conditions.append("order_time < ?")
+            params.append(self._timestamp(until))
+        if after is not None:
+            conditions.append("(order_time, id) < (?, ?)" if newest_first else "(order_time, id) > (?, ?)")
+            params.extend(after)
         
-        all_items = {}
-        for row in cursor.fetchall():
-            items = json.loads(row[0])
-            for item in items:
-                item_name = item['name']
-                quantity = item['quantity']
-                if item_name in all_items:
-                    all_items[item_name] += quantity
-                else:
-                    all_items[item_name] = quantity
+        direction = "DESC" if newest_first else "ASC"
+        query = f"SELECT {', '.join(self.ORDER_COLUMNS)} FROM orders WHERE " + " AND ".join(conditions)
+        query += f" ORDER BY order_time {direction}, id {direction} LIMIT ?"
+        params.append(limit)
         
-        # Sort by popularity
-        popular_items = sorted(all_items.items(), key=lambda x: x[1], reverse=True)[:5]
+        with self.pool.connection() as conn:
+            rows = conn.execute(query, params).fetchall()
         
-        conn.close()
+        orders = []
+        for row in rows:
+            order = dict(zip(self.ORDER_COLUMNS, row))
+            order['items'] = json.loads(order['items'])
+            orders.append(order)
+        next_key = (rows[-1][4], rows[-1][0]) if len(rows) == limit else None
+        return orders, next_key
+    
+    def iter_orders(self, status: Optional[str] = None, since: Optional[Union[str, datetime]] = None,
+                    until: Optional[Union[str, datetime]] = None, customer: Optional[str] = None,
+                    batch_size: int = 500, newest_first: bool = False) -> Iterator[Dict[str, Any]]:
+        """Stream matching orders page by page.
+        
+        Only one page is held in memory, and no connection is held between pages,
+        so slow consumers never pin a pool connection or an old read snapshot.
+        """
+        after = None
+        while True:
+            orders, after = self.get_orders_page(status, since, until, customer, after, batch_size, newest_first)
+            yield from orders
+            if after is None:
+                return
+    
+    def get_export_watermark(self, name: str = "default") -> int:
+        """Last order ID written by this tenant's named export (0 if it never ran)"""
+        with self.pool.connection() as conn:
+            row = conn.execute("SELECT last_order_id FROM export_watermarks WHERE tenant_id = ? AND name = ?",
+                               (self.tenant_id, name)).fetchone()
+        return row[0] if row else 0
+    
+    def _export_chunk(self, after_id: int, high_water: int, chunk_size: int) -> Tuple[List[tuple], int]:
+        """Line-item rows for the next ``chunk_size`` orders after ``after_id``, and the last order ID"""
+        # Unary + keeps SQLite on the primary key range rather than sorting the tenant index per chunk
+        with self.pool.transaction(immediate=False) as conn:
+            last_id = conn.execute("""
+                SELECT MAX(id) FROM (
+                    SELECT id FROM orders WHERE +tenant_id = ? AND id > ? AND id <= ? ORDER BY id LIMIT ?
+                )
+            """, (self.tenant_id, after_id, high_water, chunk_size)).fetchone()[0]
+            if last_id is None:
+                return [], after_id
+            # Orders without line items still get one row, with empty item columns
+            rows = conn.execute("""
+                SELECT o.tenant_id, o.id, o.order_time, o.customer_name, o.status, o.total_amount,
+                       i.id, i.menu_id, i.name, i.quantity, i.unit_price, i.quantity * i.unit_price
+                FROM orders o
+                LEFT JOIN order_items i ON i.order_id = o.id
+                WHERE +o.tenant_id = ? AND o.id > ? AND o.id <= ?
+                ORDER BY o.id, i.id
+            """, (self.tenant_id, after_id, last_id)).fetchall()
+        return rows, last_id
+    
+    @traced("db.export_orders")
+    def export_orders(self, path: str, file_format: Optional[str] = None, chunk_size: int = 5000,
+                      incremental: bool = False, watermark: str = "default") -> Dict[str, Any]:
+        """Stream this tenant's order history, one row per line item, to a Parquet or CSV file.
+        
+        Orders are read ``chunk_size`` at a time by ID range and written as one
+        columnar batch (a Parquet row group), so memory stays flat however large
+        the table is. Only orders that existed when the export started are
+        included. With ``incremental`` the export starts after the ``watermark``'s
+        order ID; the watermark is advanced to the newest order ID (of any
+        tenant) seen at the start, once the file is complete.
+        Order IDs are allocated under the write lock, so a later order never
+        commits with a lower ID than one already exported.
+        """
+        file_format = export_format(path, file_format)
+        start_id = self.get_export_watermark(watermark) if incremental else 0
+        with self.pool.connection() as conn:
+            high_water = conn.execute("SELECT COALESCE(MAX(id), 0) FROM orders").fetchone()[0]
+        
+        # Write to a temporary file so a failed export never leaves a partial file behind
+        partial_path = f"{path}.partial"
+        writer = chunk_writer(partial_path, file_format)
+        stats = {'orders': 0, 'line_items': 0, 'chunks': 0, 'first_order_id': None, 'last_order_id': None,
+                 'watermark': max(start_id, high_water)}
+        try:
+            after_id = start_id
+            while after_id < high_water:
+                rows, last_id = self._export_chunk(after_id, high_water, chunk_size)
+                if not rows:
+                    break
+                writer.write(list(zip(*rows)))
+                stats['orders'] += len({row[1] for row in rows})
+                stats['line_items'] += sum(row[6] is not None for row in rows)
+                stats['chunks'] += 1
+                if stats['first_order_id'] is None:
+                    stats['first_order_id'] = rows[0][1]
+                stats['last_order_id'] = after_id = last_id
+            writer.close()
+        except BaseException:
+            writer.close()
+            os.remove(partial_path)
+            raise
+        os.replace(partial_path, path)
+        
+        with self.pool.transaction() as conn:
+            conn.execute("""
+                INSERT INTO export_watermarks (tenant_id, name, last_order_id, exported_at)
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(tenant_id, name) DO UPDATE SET
+                    last_order_id = MAX(last_order_id, excluded.last_order_id),
+                    exported_at = excluded.exported_at
+            """, (self.tenant_id, watermark, stats['watermark']))
+        return {'path': path, 'format': file_format, **stats}
+    
+    @traced("db.get_order_analytics")
+    def get_order_analytics(self) -> Dict[str, Any]:
+        """Get analytics data for dashboard"""
+        # A read transaction gives every query the same snapshot
+        with self.pool.transaction(immediate=False) as conn:
+            cursor = conn.cursor()
+            
+            # Totals come from the daily rollups, one row per day of history
+            cursor.execute("""
+                SELECT COALESCE(SUM(order_count), 0), COALESCE(SUM(revenue), 0)
+                FROM order_rollups WHERE tenant_id = ? AND granularity = 'day'
+            """, (self.tenant_id,))
+            total_orders, total_revenue = cursor.fetchone()
+            
+            # Most popular items
+            cursor.execute("""
+                SELECT name, SUM(quantity) AS quantity
+                FROM item_rollups
+                WHERE tenant_id = ? AND granularity = 'day'
+                GROUP BY name
+                ORDER BY quantity DESC
+                LIMIT 5
+            """, (self.tenant_id,))
+            popular_items = cursor.fetchall()
+            
+            # Highest grossing items
+            cursor.execute("""
+                SELECT name, SUM(revenue) AS revenue
+                FROM item_rollups
+                WHERE tenant_id = ? AND granularity = 'day'
+                GROUP BY name
+                ORDER BY revenue DESC
+                LIMIT 5
+            """, (self.tenant_id,))
+            top_revenue_items = cursor.fetchall()
         
         return {
             'total_orders': total_orders,
             'total_revenue': total_revenue,
-            'popular_items': popular_items
-        }
\ No newline at end of file
+            'popular_items': popular_items,
+            'top_revenue_items': top_revenue_items
+        }
+    
+    def _bucket_range(self, granularity: str, since: Optional[Union[str, datetime]],
+                      until: Optional[Union[str, datetime]]) -> tuple:
+        """Validate a granularity and turn since/until into comparable bucket keys"""
+        if granularity not in self.ROLLUP_GRANULARITIES:
+            raise ValueError(f"Unknown granularity: {granularity}")
+        bucket_format = self.ROLLUP_GRANULARITIES[granularity]
+        if isinstance(since, datetime):
+            since = since.strftime(bucket_format)
+        if isinstance(until, datetime):
+            until = until.strftime(bucket_format)
+        return since or '', until or '9999'
+    
+    @traced("db.get_order_series")
+    def get_order_series(self, granularity: str = 'day', since: Optional[Union[str, datetime]] = None,
+                         until: Optional[Union[str, datetime]] = None) -> List[Dict[str, Any]]:
+        """Order count and revenue per time bucket, read straight from the rollups"""
+        since, until = self._bucket_range(granularity, since, until)
+        with self.pool.connection() as conn:
+            cursor = conn.execute("""
+                SELECT bucket, order_count, revenue
+                FROM order_rollups
+                WHERE tenant_id = ? AND granularity = ? AND bucket >= ? AND bucket <= ?
+                ORDER BY bucket
+            """, (self.tenant_id, granularity, since, until))
+            columns = ['bucket', 'order_count', 'revenue']
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    
+    @traced("db.get_item_series")
+    def get_item_series(self, granularity: str = 'day', since: Optional[Union[str, datetime]] = None,
+                        until: Optional[Union[str, datetime]] = None,
+                        name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Per-item quantity and revenue per time bucket, optionally for one item"""
+        since, until = self._bucket_range(granularity, since, until)
+        query = """
+            SELECT bucket, name, quantity, revenue
+            FROM item_rollups
+            WHERE tenant_id = ? AND granularity = ? AND bucket >= ? AND bucket <= ?
+        """
+        params = [self.tenant_id, granularity, since, until]
+        if name is not None:
+            query += " AND name = ?"
+            params.append(name)
+        query += " ORDER BY bucket, name"
+        
+        with self.pool.connection() as conn:
+            cursor = conn.execute(query, params)
+            columns = ['bucket', 'name', 'quantity', 'revenue']
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def main():
+    """Maintenance commands:
+    
+        python database.py rebuild-rollups [--db orders.db]
+        python database.py export --out orders.parquet [--tenant ID] [--incremental --watermark NAME]
+    """
+    parser = argparse.ArgumentParser(description="Order database maintenance")
+    parser.add_argument("command", choices=["rebuild-rollups", "export"])
+    parser.add_argument("--db", default="orders.db", help="Path to the SQLite database")
+    parser.add_argument("--tenant", default=DEFAULT_TENANT, help="Restaurant (tenant) to export")
+    parser.add_argument("--out", help="Export file (.parquet or .csv)")
+    parser.add_argument("--format", choices=["parquet", "csv"], help="Export format (default: from --out)")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Orders per export chunk")
+    parser.add_argument("--incremental", action="store_true", help="Only orders after the last export")
+    parser.add_argument("--watermark", default="default", help="Name of the incremental export")
+    args = parser.parse_args()
+    
+    db = OrderDatabase(args.db, tenant_id=args.tenant)
+    if args.command == "rebuild-rollups":
+        db.rebuild_rollups()
+        print(f"Rebuilt rollups: {len(db.get_order_series('day'))} days, "
+              f"{len(db.get_order_series('hour'))} hours")
+    elif args.command == "export":
+        if not args.out:
+            parser.error("export needs --out")
+        result = db.export_orders(args.out, args.format, args.chunk_size, args.incremental, args.watermark)
+        print(f"Exported {result['orders']} orders ({result['line_items']} line items) in "
+              f"{result['chunks']} chunks to {result['path']}; watermark {args.watermark} = "
+              f"{result['watermark']}")
+
+
+if __name__ == "__main__":
+    main()
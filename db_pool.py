@@ -0,0 +1,134 @@
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterator
+import sqlite3
+import threading
+
+
+class ConnectionPool:
+    """Small bounded pool of persistent SQLite connections.
+
+    Connections run in WAL mode with a busy timeout so readers never block the
+    writer and concurrent writers wait instead of failing with
+    ``database is locked``. A thread that already holds a connection gets the
+    same one back, so nested ``connection()``/``transaction()`` calls are safe.
+    When every connection is busy, released connections are handed to waiting
+    threads in FIFO order so a stream of readers cannot starve the writers.
+    """
+
+    _shared: Dict[str, "ConnectionPool"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, db_path: str, max_connections: int = 8, busy_timeout_ms: int = 5000,
+                 cached_statements: int = 256, synchronous: str = "NORMAL"):
+        self.db_path = db_path
+        self.max_connections = max_connections
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cached_statements = cached_statements
+        self.synchronous = synchronous
+        self._idle = []
+        self._waiters = deque()
+        self._opened = 0
+        self._all = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @classmethod
+    def for_path(cls, db_path: str, **kwargs) -> "ConnectionPool":
+        """Process-wide pool for a database file, created on first use"""
+        with cls._shared_lock:
+            pool = cls._shared.get(db_path)
+            if pool is None:
+                pool = cls._shared[db_path] = cls(db_path, **kwargs)
+            return pool
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000,
+            isolation_level=None,  # transactions are managed explicitly
+            check_same_thread=False,
+            cached_statements=self.cached_statements
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        with self._lock:
+            self._all.append(conn)
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+            if self._opened < self.max_connections:
+                self._opened += 1
+                waiter = None
+            else:
+                waiter = [threading.Event(), None]
+                self._waiters.append(waiter)
+        if waiter is None:
+            try:
+                return self._connect()
+            except BaseException:
+                with self._lock:
+                    self._opened -= 1
+                raise
+        waiter[0].wait()
+        return waiter[1]
+
+    def _release(self, conn: sqlite3.Connection):
+        with self._lock:
+            if self._waiters:
+                waiter = self._waiters.popleft()
+                waiter[1] = conn
+                waiter[0].set()
+            else:
+                self._idle.append(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Check out a connection for the current thread"""
+        held = getattr(self._local, 'conn', None)
+        if held is not None:
+            yield held
+            return
+
+        conn = self._acquire()
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            if conn.in_transaction:
+                conn.rollback()
+            self._release(conn)
+
+    @contextmanager
+    def transaction(self, immediate: bool = True) -> Iterator[sqlite3.Connection]:
+        """Run a block in one transaction, committing on success.
+
+        Write transactions start with ``BEGIN IMMEDIATE`` so the write lock is
+        taken up front and waited for via the busy timeout. A transaction
+        opened inside another one simply joins it.
+        """
+        with self.connection() as conn:
+            if conn.in_transaction:
+                yield conn
+                return
+            conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def close(self):
+        """Close every connection this pool has opened"""
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+            self._all.clear()
+            self._idle.clear()
+            self._opened = 0
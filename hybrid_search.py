@@ -0,0 +1,74 @@
+from collections import Counter, defaultdict
+from typing import List, Dict, Any, Hashable, Iterable, Optional, Set, Tuple
+import math
+import re
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens with a light plural strip ("colas" -> "cola")"""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[Hashable]], k: int = 60) -> List[Hashable]:
+    """Fuse several best-first rankings into one using reciprocal rank fusion"""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, key in enumerate(ranking):
+            scores[key] += 1.0 / (k + rank + 1)
+    return sorted(scores, key=lambda key: scores[key], reverse=True)
+
+
+class BM25Index:
+    """Inverted BM25 index over menu item name, category and description"""
+
+    # The name is what customers type most often, so it counts twice
+    FIELD_WEIGHTS = {'name': 2, 'category': 1, 'description': 1}
+
+    def __init__(self, menu_items: List[Dict[str, Any]], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.ids = [item['id'] for item in menu_items]
+        self.postings = defaultdict(list)
+        self.doc_lengths = []
+        self.names = {}
+
+        for row, item in enumerate(menu_items):
+            counts = Counter()
+            for field, weight in self.FIELD_WEIGHTS.items():
+                for token in tokenize(item.get(field) or ""):
+                    counts[token] += weight
+            for token, tf in counts.items():
+                self.postings[token].append((row, tf))
+            self.doc_lengths.append(sum(counts.values()))
+            self.names[" ".join(tokenize(item['name']))] = item['id']
+
+        self.avg_length = sum(self.doc_lengths) / len(self.doc_lengths) if self.doc_lengths else 0.0
+        n = len(self.ids)
+        self.idf = {
+            token: math.log(1 + (n - len(rows) + 0.5) / (len(rows) + 0.5))
+            for token, rows in self.postings.items()
+        }
+
+    def exact_match(self, query: str) -> Optional[Any]:
+        """Menu id whose full name is exactly the query, ignoring case and plurals"""
+        return self.names.get(" ".join(tokenize(query)))
+
+    def search(self, query: str, k: int = 5, allowed_ids: Optional[Set[Any]] = None) -> List[Tuple[Any, float]]:
+        """Return (menu id, score) pairs, only ever scoring allowed items"""
+        scores = defaultdict(float)
+        for token in set(tokenize(query)):
+            for row, tf in self.postings.get(token, ()):
+                if allowed_ids is not None and self.ids[row] not in allowed_ids:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[row] / self.avg_length)
+                scores[row] += self.idf[token] * tf * (self.k1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda pair: pair[1], reverse=True)[:k]
+        return [(self.ids[row], score) for row, score in ranked]
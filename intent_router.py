@@ -0,0 +1,209 @@
+from typing import Dict, Any, Optional, Tuple
+import json
+import re
+import threading
+
+import numpy as np
+
+from telemetry import telemetry
+
+# Regex rules per intent; a message is routed only if exactly one intent matches
+INTENT_PATTERNS = {
+    'menu': [
+        r"\b(show|see|view|display|read|send|give)\b.*\bmenu\b",
+        r"\b(full|complete|whole|entire|your)\s+menu\b",
+        r"^\W*menu\W*$",
+        r"\bwhat('?s| is| do you have)\s+on\s+the\s+menu\b"
+    ],
+    'popular': [
+        r"\b(most\s+)?popular\b",
+        r"\bbest[\s-]?sell(ers?|ing)\b",
+        r"\bmost\s+ordered\b",
+        r"\bwhat('?s| is)\s+good\b",
+        r"\bwhat do (you|people) (usually )?(recommend|order)\b"
+    ],
+    'order': [
+        r"\bi('d| would)?\s+(like|want|take|have)\b",
+        r"\b(can|could|may)\s+i\s+(get|have|order)\b",
+        r"\b(get|give)\s+me\b",
+        r"\bi('ll| will)\s+(have|take)\b",
+        r"^\W*\d+\s*x?\s+\w+"
+    ]
+}
+
+# Words that signal the customer wants something a plain parse cannot express
+ORDER_MODIFIERS = re.compile(
+    r"\b(no|not|without|extra|instead|cancel|change|remove|replace|swap|allerg\w*|spicy|vegan|gluten)\b|\?"
+)
+
+# Example phrasings used for the optional nearest-centroid check
+INTENT_EXAMPLES = {
+    'menu': [
+        "show me the menu", "can I see the menu", "what do you have", "what's on the menu",
+        "list all your dishes"
+    ],
+    'popular': [
+        "what's popular", "what are your best sellers", "what do most people order",
+        "what do you recommend", "what's good here"
+    ],
+    'order': [
+        "I'd like two pepperoni pizzas", "can I get a coke and a burger", "one caesar salad please",
+        "I'll have the pasta carbonara", "give me 3 ice creams"
+    ],
+    'other': [
+        "is the pasta spicy", "do you have vegan options", "yes please confirm my order",
+        "how long will it take", "cancel my order", "what is in the caesar salad"
+    ]
+}
+
+# An agent turn that uses a tool costs a tool-selection call plus a final-answer call
+LLM_CALLS_PER_AGENT_TURN = 2
+
+# Messages from the UI arrive as "Customer: <name>. Request: <text>"
+REQUEST_PREFIX = re.compile(
+    r"^\s*Customer(?: name)?:\s*(?P<name>.*?)\.\s*(?:Request|User message):\s*(?P<request>.*)$",
+    re.IGNORECASE | re.DOTALL
+)
+
+
+class IntentRouter:
+    """Cheap local intent classifier that answers obvious requests without the LLM.
+
+    High-confidence menu, popular-item and simple-order messages are answered
+    directly from the database and order-parsing tools; everything else
+    returns ``None`` so the caller falls back to the agent.
+    """
+
+    def __init__(self, database_tool, order_parsing_tool, embeddings: Optional[Any] = None,
+                 centroid_threshold: float = 0.75, max_length: int = 200):
+        self.database_tool = database_tool
+        self.order_parsing_tool = order_parsing_tool
+        self.embeddings = embeddings
+        self.centroid_threshold = centroid_threshold
+        self.max_length = max_length
+        self.patterns = {
+            intent: [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+            for intent, patterns in INTENT_PATTERNS.items()
+        }
+        self.centroids: Optional[Dict[str, np.ndarray]] = None
+        self._counts: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def split_request(message: str) -> Tuple[Optional[str], str]:
+        """Split the UI's "Customer: ... Request: ..." envelope into (name, request)"""
+        match = REQUEST_PREFIX.match(message)
+        if match:
+            return match.group('name').strip() or None, match.group('request').strip()
+        return None, message.strip()
+
+    def _centroids(self) -> Dict[str, np.ndarray]:
+        if self.centroids is None:
+            centroids = {}
+            for intent, examples in INTENT_EXAMPLES.items():
+                vectors = np.asarray(self.embeddings.embed_documents(examples), dtype=np.float32)
+                vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+                centroid = vectors.mean(axis=0)
+                centroids[intent] = centroid / np.linalg.norm(centroid)
+            self.centroids = centroids
+        return self.centroids
+
+    def warm_up(self):
+        """Embed the intent examples now rather than on the first classified message"""
+        if self.embeddings is not None:
+            self._centroids()
+
+    def nearest_intent(self, text: str) -> Tuple[str, float]:
+        """Nearest example centroid and its cosine similarity"""
+        vector = np.asarray(self.embeddings.embed_query(text), dtype=np.float32)
+        vector /= np.linalg.norm(vector) or 1.0
+        scores = {intent: float(centroid @ vector) for intent, centroid in self._centroids().items()}
+        intent = max(scores, key=scores.get)
+        return intent, scores[intent]
+
+    def classify(self, request: str) -> Tuple[Optional[str], float]:
+        """Return (intent, confidence); intent is None when nothing is confident"""
+        if not request or len(request) > self.max_length:
+            return None, 0.0
+
+        matched = [
+            intent for intent, patterns in self.patterns.items()
+            if any(pattern.search(request) for pattern in patterns)
+        ]
+        if len(matched) > 1:
+            return None, 0.0
+
+        if self.embeddings is None:
+            return (matched[0], 0.9) if matched else (None, 0.0)
+
+        nearest, similarity = self.nearest_intent(request)
+        if matched:
+            # The embedding check confirms the rule, or vetoes it
+            return (matched[0], 0.95) if nearest == matched[0] else (matched[0], 0.6)
+        if nearest != 'other' and similarity >= self.centroid_threshold:
+            return nearest, similarity
+        return None, similarity
+
+    def _record(self, intent: str, outcome: str):
+        with self._lock:
+            counts = self._counts.setdefault(intent, {'routed': 0, 'fallback': 0})
+            counts[outcome] += 1
+
+    def route(self, message: str, min_confidence: float = 0.8) -> Optional[str]:
+        """Answer the message locally, or return None to fall back to the LLM"""
+        return self.route_detailed(message, min_confidence)['answer']
+
+    def route_detailed(self, message: str, min_confidence: float = 0.8) -> Dict[str, Any]:
+        """Like route, but also returns the intent and any structured data (e.g. a parsed order)"""
+        with telemetry.span("router.route") as span:
+            customer_name, request = self.split_request(message)
+            intent, confidence = self.classify(request)
+            span['intent'] = intent
+            if intent is None or confidence < min_confidence:
+                self._record(intent or 'unknown', 'fallback')
+                return {'intent': intent, 'confidence': confidence, 'answer': None, 'data': None}
+
+            answer, data = getattr(self, f"_answer_{intent}")(request, customer_name)
+            span['routed'] = answer is not None
+            self._record(intent, 'routed' if answer is not None else 'fallback')
+            return {'intent': intent, 'confidence': confidence, 'answer': answer, 'data': data}
+
+    def _answer_menu(self, request: str, customer_name: Optional[str]) -> Tuple[Optional[str], Any]:
+        return self.database_tool.run({"action": "get_menu"}), None
+
+    def _answer_popular(self, request: str, customer_name: Optional[str]) -> Tuple[Optional[str], Any]:
+        popular_items = self.database_tool.db.get_order_analytics()['popular_items']
+        if not popular_items:
+            return None, None
+        lines = [f"{rank}. {name} ({quantity} ordered)" for rank, (name, quantity) in enumerate(popular_items, 1)]
+        answer = "Our most popular items right now are:\n\n" + "\n".join(lines) + \
+            "\n\nWould you like to order any of these?"
+        return answer, popular_items
+
+    def _answer_order(self, request: str, customer_name: Optional[str]) -> Tuple[Optional[str], Any]:
+        if ORDER_MODIFIERS.search(request):
+            return None, None
+        parsed = json.loads(self.order_parsing_tool.run(request))
+        if not parsed.get('success') or parsed.get('ambiguous'):
+            return None, None
+
+        lines = [
+            f"- {item['quantity']} x {item['name']} (${item['price']:.2f} each) = ${item['total']:.2f}"
+            for item in parsed['items']
+        ]
+        who = f" for {customer_name}" if customer_name else ""
+        answer = "Here's what I have for your order:\n\n" + "\n".join(lines) + \
+            f"\n\nTotal: ${parsed['total_amount']:.2f}\n\nShall I place this order{who}?"
+        return answer, parsed
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-intent routed/fallback counts and the estimated LLM calls saved"""
+        with self._lock:
+            intents = {intent: dict(counts) for intent, counts in self._counts.items()}
+        routed = sum(counts['routed'] for counts in intents.values())
+        return {
+            'intents': intents,
+            'routed': routed,
+            'fallback': sum(counts['fallback'] for counts in intents.values()),
+            'llm_calls_saved': routed * LLM_CALLS_PER_AGENT_TURN
+        }
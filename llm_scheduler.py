@@ -0,0 +1,548 @@
+from concurrent.futures import Future
+from contextlib import contextmanager
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, TypeVar
+import asyncio
+import contextvars
+import copy
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from chat_history import count_tokens
+from resources import registry
+from telemetry import Histogram, telemetry
+
+T = TypeVar("T")
+
+# Lower runs first: turns placing an order, then browsing, then background work such as summaries
+PRIORITY_ORDER = 0
+PRIORITY_DEFAULT = 1
+PRIORITY_BACKGROUND = 2
+PRIORITY_NAMES = {PRIORITY_ORDER: 'order', PRIORITY_DEFAULT: 'default', PRIORITY_BACKGROUND: 'background'}
+
+# Provider responses worth retrying: throttling, conflicts, timeouts and server errors
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+_priority = contextvars.ContextVar("llm_priority", default=PRIORITY_DEFAULT)
+
+
+@contextmanager
+def llm_priority(priority: int):
+    """Schedule the LLM calls made inside this block at ``priority``"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def error_status(error: BaseException) -> Optional[int]:
+    """HTTP status of a provider SDK error, if it carries one"""
+    status = getattr(error, 'status_code', None) or getattr(getattr(error, 'response', None), 'status_code', None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable(error: BaseException) -> bool:
+    status = error_status(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    # Connection failures and timeouts carry no status (e.g. groq.APIConnectionError, APITimeoutError)
+    return isinstance(error, (TimeoutError, ConnectionError)) or \
+        any(word in type(error).__name__ for word in ("Timeout", "Connection"))
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds the provider asked us to wait (Retry-After header), if any"""
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Allows ``per_minute`` units per minute, with bursts of up to one minute's worth.
+
+    Not locked: the scheduler only touches it under its own lock.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float) -> float:
+        """Seconds until ``amount`` can be taken (0 when it can be taken now)"""
+        self._refill()
+        # A request larger than the whole bucket waits for a full bucket instead of forever
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        self._refill()
+        self.level -= min(amount, self.capacity)
+
+    def adjust(self, amount: float):
+        """Charge (or refund, if negative) the difference once the real cost is known"""
+        self._refill()
+        self.level = min(self.capacity, self.level - amount)
+
+
+class LLMScheduler:
+    """Process-wide gate in front of an LLM provider.
+
+    Every call waits in one priority queue (``llm_priority``; FIFO within a
+    priority) until a concurrency slot is free and both token buckets, one
+    for requests and one for tokens per minute, can pay for it. The token
+    estimate is corrected from the reported usage afterwards. Throttling and
+    transient errors are retried with exponential backoff and jitter; a 429
+    pauses the whole queue, since the provider limit is shared. Calls with
+    the same ``key`` that overlap in time share one provider call. Async
+    callers (``arun``, ``astream``) queue on their event loop without
+    holding a thread.
+    """
+
+    def __init__(self, max_concurrency: int = 8, requests_per_minute: Optional[float] = 30,
+                 tokens_per_minute: Optional[float] = 6000, max_retries: int = 4,
+                 backoff_base_s: float = 0.5, backoff_max_s: float = 30.0, seed: Optional[int] = None):
+        self.max_concurrency = max_concurrency
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base_s
+        self.backoff_max = backoff_max_s
+        self.active = 0
+        self.paused_until = 0.0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.max_queue_depth = 0
+        self._queue: List[list] = []
+        self._seq = itertools.count()
+        self._inflight: Dict[str, Future] = {}
+        self._waits: Dict[int, Histogram] = {}
+        self._rng = random.Random(seed)
+        self._timer: Optional[threading.Timer] = None
+        self._timer_due = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "LLMScheduler":
+        """Limits from LLM_MAX_CONCURRENCY, LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE (0 = unlimited)
+        and LLM_MAX_RETRIES"""
+        def limit(name: str, default: str) -> Optional[float]:
+            return float(os.getenv(name, default)) or None
+        return cls(
+            max_concurrency=int(os.getenv('LLM_MAX_CONCURRENCY', "8")),
+            requests_per_minute=limit('LLM_REQUESTS_PER_MINUTE', "30"),
+            tokens_per_minute=limit('LLM_TOKENS_PER_MINUTE', "6000"),
+            max_retries=int(os.getenv('LLM_MAX_RETRIES', "4"))
+        )
+
+    @classmethod
+    def shared(cls) -> "LLMScheduler":
+        """The process-wide scheduler, configured from the environment on first use"""
+        return registry.get_or_create((cls.__name__,), cls.from_env)
+
+    def _admission_delay(self, tokens: int) -> float:
+        delays = [self.paused_until - time.monotonic()]
+        if self.requests is not None:
+            delays.append(self.requests.delay(1))
+        if self.tokens is not None:
+            delays.append(self.tokens.delay(tokens))
+        return max(delays)
+
+    def _dispatch(self):
+        """Start queued calls from the head while there is room; call with the lock held.
+
+        Only the head of the queue may start, so priorities and arrival order
+        hold. When the head is waiting on a budget or a 429 pause, a timer
+        dispatches again once that delay has passed.
+        """
+        while self._queue and self.active < self.max_concurrency:
+            priority, _, tokens, grant = self._queue[0]
+            delay = self._admission_delay(tokens)
+            if delay > 0:
+                due = time.monotonic() + delay
+                if self._timer is None or due < self._timer_due:
+                    if self._timer is not None:
+                        self._timer.cancel()
+                    self._timer = threading.Timer(delay, self._wake)
+                    self._timer.daemon = True
+                    self._timer_due = due
+                    self._timer.start()
+                return
+            heapq.heappop(self._queue)
+            self.active += 1
+            if self.requests is not None:
+                self.requests.take(1)
+            if self.tokens is not None:
+                self.tokens.take(tokens)
+            grant()
+
+    def _wake(self):
+        with self._lock:
+            self._timer = None
+            self._dispatch()
+
+    def _enqueue(self, priority: int, tokens: int, grant: Callable[[], None]) -> list:
+        entry = [priority, next(self._seq), tokens, grant]
+        heapq.heappush(self._queue, entry)
+        self.max_queue_depth = max(self.max_queue_depth, len(self._queue))
+        self._dispatch()
+        return entry
+
+    def _admitted(self, priority: int, start: float):
+        waited = time.monotonic() - start
+        with self._lock:
+            self._waits.setdefault(priority, Histogram()).add(waited)
+        telemetry.record("llm.queue_wait", waited, priority=PRIORITY_NAMES.get(priority, priority))
+
+    def _acquire(self, priority: int, tokens: int):
+        admitted = threading.Event()
+        start = time.monotonic()
+        with self._lock:
+            self._enqueue(priority, tokens, admitted.set)
+        admitted.wait()
+        self._admitted(priority, start)
+
+    async def _aacquire(self, priority: int, tokens: int):
+        """Like ``_acquire``, but waits on the event loop instead of holding a thread"""
+        loop = asyncio.get_running_loop()
+        admitted = loop.create_future()
+
+        def admit():
+            if not admitted.done():
+                admitted.set_result(None)
+
+        def grant():
+            loop.call_soon_threadsafe(admit)
+
+        start = time.monotonic()
+        with self._lock:
+            entry = self._enqueue(priority, tokens, grant)
+        try:
+            await admitted
+        except asyncio.CancelledError:
+            with self._lock:
+                if entry in self._queue:
+                    self._queue.remove(entry)
+                    heapq.heapify(self._queue)
+                    self._dispatch()
+                    raise
+            # Admitted just as the caller gave up: hand the slot and its budget back
+            self._release(tokens, 0, refund=True)
+            raise
+        self._admitted(priority, start)
+
+    def _release(self, estimated: int, actual: Optional[int] = None, refund: bool = False):
+        with self._lock:
+            self.active -= 1
+            if refund and self.requests is not None:
+                self.requests.adjust(-1)
+            if actual is not None and self.tokens is not None:
+                self.tokens.adjust(actual - estimated)
+            self._dispatch()
+
+    def _retry_delay(self, attempt: int, error: Exception) -> float:
+        """Backoff before retry number ``attempt``; re-raises errors that should not be retried"""
+        if attempt > self.max_retries or not is_retryable(error):
+            with self._lock:
+                self.failed += 1
+            raise error
+        with self._lock:
+            ceiling = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+            delay = self._rng.uniform(ceiling / 2, ceiling)
+            hinted = retry_after(error)
+            if hinted is not None:
+                delay = max(delay, hinted)
+            self.retries += 1
+            if error_status(error) == 429:
+                # Everyone shares the provider's limit, so everyone waits for as long as it asked;
+                # the callers that were refused then come back spread out by their own jitter
+                self.rate_limited += 1
+                pause = hinted if hinted is not None else self.backoff_base
+                self.paused_until = max(self.paused_until, time.monotonic() + pause)
+        return delay
+
+    def _priority(self, priority: Optional[int]) -> int:
+        return _priority.get() if priority is None else priority
+
+    def _call(self, call: Callable[[], T], tokens: int, priority: int,
+              cost: Optional[Callable[[T], Optional[int]]]) -> T:
+        attempt = 0
+        while True:
+            self._acquire(priority, tokens)
+            try:
+                result = call()
+            except Exception as e:
+                self._release(tokens)
+                attempt += 1
+                time.sleep(self._retry_delay(attempt, e))
+                continue
+            self._release(tokens, cost(result) if cost else None)
+            with self._lock:
+                self.completed += 1
+            return result
+
+    def run(self, call: Callable[[], T], tokens: int = 0, priority: Optional[int] = None,
+            key: Optional[str] = None, cost: Optional[Callable[[T], Optional[int]]] = None) -> T:
+        """Run ``call`` once admitted and return its result.
+
+        ``tokens`` is the estimated cost charged up front; ``cost(result)``
+        may report the real one. Callers passing a ``key`` already in flight
+        wait for that call and get a copy of its result.
+        """
+        priority = self._priority(priority)
+        with self._lock:
+            self.submitted += 1
+            leader = self._inflight.get(key) if key is not None else None
+            if leader is not None:
+                self.coalesced += 1
+            elif key is not None:
+                future = self._inflight[key] = Future()
+        if leader is not None:
+            return copy.deepcopy(leader.result())
+        if key is None:
+            return self._call(call, tokens, priority, cost)
+
+        try:
+            result = self._call(call, tokens, priority, cost)
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._inflight.pop(key, None)
+        future.set_result(result)
+        return result
+
+    def stream(self, start: Callable[[], Iterator[T]], tokens: int = 0,
+               priority: Optional[int] = None) -> Iterator[T]:
+        """Like ``run`` for a streamed call: the slot is held until the stream ends,
+        and a failure is only retried before the first item has been passed on"""
+        priority = self._priority(priority)
+        with self._lock:
+            self.submitted += 1
+        attempt = 0
+        while True:
+            self._acquire(priority, tokens)
+            started = False
+            released = False
+            try:
+                for item in start():
+                    started = True
+                    yield item
+            except Exception as e:
+                self._release(tokens)
+                released = True
+                if started:
+                    with self._lock:
+                        self.failed += 1
+                    raise
+                attempt += 1
+                time.sleep(self._retry_delay(attempt, e))
+                continue
+            finally:
+                if not released:
+                    self._release(tokens)
+            with self._lock:
+                self.completed += 1
+            return
+
+    async def _acall(self, call: Callable[[], Awaitable[T]], tokens: int, priority: int,
+                     cost: Optional[Callable[[T], Optional[int]]]) -> T:
+        attempt = 0
+        while True:
+            await self._aacquire(priority, tokens)
+            try:
+                result = await call()
+            except Exception as e:
+                self._release(tokens)
+                attempt += 1
+                await asyncio.sleep(self._retry_delay(attempt, e))
+                continue
+            except BaseException:
+                # Cancelled mid-call: the slot is free again
+                self._release(tokens)
+                raise
+            self._release(tokens, cost(result) if cost else None)
+            with self._lock:
+                self.completed += 1
+            return result
+
+    async def arun(self, call: Callable[[], Awaitable[T]], tokens: int = 0, priority: Optional[int] = None,
+                   key: Optional[str] = None, cost: Optional[Callable[[T], Optional[int]]] = None) -> T:
+        """``run`` for a coroutine: waiting for admission, backoff and coalesced
+        results all happen on the event loop, without holding a thread"""
+        priority = self._priority(priority)
+        with self._lock:
+            self.submitted += 1
+            leader = self._inflight.get(key) if key is not None else None
+            if leader is not None:
+                self.coalesced += 1
+            elif key is not None:
+                future = self._inflight[key] = Future()
+        if leader is not None:
+            return copy.deepcopy(await asyncio.wrap_future(leader))
+        if key is None:
+            return await self._acall(call, tokens, priority, cost)
+
+        try:
+            result = await self._acall(call, tokens, priority, cost)
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._inflight.pop(key, None)
+        future.set_result(result)
+        return result
+
+    async def astream(self, start: Callable[[], AsyncIterator[T]], tokens: int = 0,
+                      priority: Optional[int] = None) -> AsyncIterator[T]:
+        """``stream`` for an async iterator"""
+        priority = self._priority(priority)
+        with self._lock:
+            self.submitted += 1
+        attempt = 0
+        while True:
+            await self._aacquire(priority, tokens)
+            started = False
+            released = False
+            try:
+                async for item in start():
+                    started = True
+                    yield item
+            except Exception as e:
+                self._release(tokens)
+                released = True
+                if started:
+                    with self._lock:
+                        self.failed += 1
+                    raise
+                attempt += 1
+                await asyncio.sleep(self._retry_delay(attempt, e))
+                continue
+            finally:
+                if not released:
+                    self._release(tokens)
+            with self._lock:
+                self.completed += 1
+            return
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'queue_depth': len(self._queue),
+                'max_queue_depth': self.max_queue_depth,
+                'active': self.active,
+                'max_concurrency': self.max_concurrency,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'coalesced': self.coalesced,
+                'retries': self.retries,
+                'rate_limited': self.rate_limited,
+                'paused_s': max(0.0, self.paused_until - time.monotonic()),
+                'wait': {PRIORITY_NAMES.get(priority, priority): histogram.summary()
+                         for priority, histogram in sorted(self._waits.items())}
+            }
+
+
+class ScheduledChatModel(BaseChatModel):
+    """Chat model wrapper that sends every call through an LLMScheduler.
+
+    Identical non-streaming requests that overlap in time are coalesced into
+    one provider call. ``completion_tokens`` is the completion size charged
+    up front, corrected from the reported usage when there is one. Async
+    calls use the wrapped model's own async methods.
+    """
+
+    llm: BaseChatModel
+    scheduler: Any = None
+    completion_tokens: int = 256
+    coalesce: bool = True
+
+    @property
+    def _llm_type(self) -> str:
+        return f"scheduled-{self.llm._llm_type}"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return self.llm._identifying_params
+
+    def _get_invocation_params(self, stop: Optional[List[str]] = None, **kwargs: Any) -> Dict[str, Any]:
+        # Telemetry and tracing report the wrapped model
+        return self.llm._get_invocation_params(stop=stop, **kwargs)
+
+    def _estimate(self, messages: List[BaseMessage]) -> int:
+        return sum(count_tokens(str(message.content)) for message in messages) + self.completion_tokens
+
+    @staticmethod
+    def _usage(result: ChatResult) -> Optional[int]:
+        return ((result.llm_output or {}).get('token_usage') or {}).get('total_tokens')
+
+    def _key(self, messages: List[BaseMessage], stop: Optional[List[str]], kwargs: Dict[str, Any]) -> Optional[str]:
+        if not self.coalesce:
+            return None
+        payload = json.dumps({
+            'model': [self.llm._llm_type, self.llm._identifying_params],
+            'messages': [[message.type, message.content, message.additional_kwargs] for message in messages],
+            'stop': stop,
+            'kwargs': kwargs
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        return self.scheduler.run(
+            lambda: self.llm._generate(messages, stop=stop, run_manager=run_manager, **kwargs),
+            tokens=self._estimate(messages),
+            key=self._key(messages, stop, kwargs),
+            cost=self._usage
+        )
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        yield from self.scheduler.stream(
+            lambda: self.llm._stream(messages, stop=stop, run_manager=run_manager, **kwargs),
+            tokens=self._estimate(messages)
+        )
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        return await self.scheduler.arun(
+            lambda: self.llm._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs),
+            tokens=self._estimate(messages),
+            key=self._key(messages, stop, kwargs),
+            cost=self._usage
+        )
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        async for chunk in self.scheduler.astream(
+            lambda: self.llm._astream(messages, stop=stop, run_manager=run_manager, **kwargs),
+            tokens=self._estimate(messages)
+        ):
+            yield chunk
@@ -0,0 +1,53 @@
+from typing import List, Dict, Any, Optional
+import threading
+from order_matcher import OrderMatcher
+
+
+class MenuSnapshot:
+    """Read-only view of the menu at one version, with the derived views callers need.
+
+    Snapshots are rebuilt only when the menu version changes, so the grouping,
+    the formatted menu text and the name lookup are computed once per version
+    instead of on every tool call.
+    """
+
+    def __init__(self, version: int, items: List[Dict[str, Any]]):
+        self.version = version
+        self.items = items
+        self._formatted_menu: Optional[str] = None
+        self._order_matcher: Optional[OrderMatcher] = None
+        # Tools may read one snapshot from several threads; each view is built once
+        self._lock = threading.Lock()
+
+        # Group items by category
+        self.by_category: Dict[str, List[Dict[str, Any]]] = {}
+        for item in items:
+            self.by_category.setdefault(item['category'], []).append(item)
+
+        # Lowercase name lookup used by the order parser
+        self.name_index = {item['name'].lower(): item for item in items}
+
+    @property
+    def formatted_menu(self) -> str:
+        """Customer-facing menu text, grouped by category"""
+        with self._lock:
+            if self._formatted_menu is None:
+                menu_str = "Here's our complete menu:\n\n"
+                for category, items in self.by_category.items():
+                    menu_str += f"=== {category.upper()} ===\n"
+                    for item in items:
+                        menu_str += f"- {item['name']}: ${item['price']:.2f}"
+                        if 'description' in item:
+                            menu_str += f" - {item['description']}"
+                        menu_str += "\n"
+                    menu_str += "\n"
+                self._formatted_menu = menu_str
+        return self._formatted_menu
+
+    @property
+    def order_matcher(self) -> OrderMatcher:
+        """Order matcher compiled for this menu version"""
+        with self._lock:
+            if self._order_matcher is None:
+                self._order_matcher = OrderMatcher(self.items)
+        return self._order_matcher
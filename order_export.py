@@ -0,0 +1,85 @@
+from typing import Any, List, Sequence
+import csv
+
+# Export columns: one row per order line item, order fields repeated on each line
+EXPORT_COLUMNS = [
+    ('tenant_id', 'string'),
+    ('order_id', 'int64'),
+    ('order_time', 'timestamp'),
+    ('customer_name', 'string'),
+    ('status', 'string'),
+    ('order_total', 'float64'),
+    ('line_id', 'int64'),
+    ('menu_id', 'int64'),
+    ('item_name', 'string'),
+    ('quantity', 'int64'),
+    ('unit_price', 'float64'),
+    ('line_total', 'float64')
+]
+
+EXPORT_FORMATS = ('parquet', 'csv')
+
+
+class CSVChunkWriter:
+    """Appends columnar chunks to a CSV file with a header row"""
+
+    def __init__(self, path: str):
+        self._file = open(path, "w", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow([name for name, _ in EXPORT_COLUMNS])
+
+    def write(self, columns: Sequence[Sequence[Any]]):
+        self._writer.writerows(zip(*columns))
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetChunkWriter:
+    """Writes each columnar chunk as one Parquet row group"""
+
+    def __init__(self, path: str, compression: str = "zstd"):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Parquet export needs pyarrow (pip install pyarrow), or export to CSV") from e
+        self._pa = pa
+        types = {
+            'int64': pa.int64(),
+            'float64': pa.float64(),
+            'string': pa.string(),
+            'timestamp': pa.timestamp('s')
+        }
+        self.schema = pa.schema([(name, types[kind]) for name, kind in EXPORT_COLUMNS])
+        self._writer = pq.ParquetWriter(path, self.schema, compression=compression)
+
+    def write(self, columns: Sequence[Sequence[Any]]):
+        pa = self._pa
+        arrays: List[Any] = []
+        for values, field in zip(columns, self.schema):
+            if pa.types.is_timestamp(field.type):
+                # order_time is stored as 'YYYY-MM-DD HH:MM:SS' text
+                arrays.append(pa.array(values, pa.string()).cast(field.type))
+            else:
+                arrays.append(pa.array(values, field.type))
+        self._writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self._writer.close()
+
+
+def chunk_writer(path: str, file_format: str):
+    if file_format == "parquet":
+        return ParquetChunkWriter(path)
+    if file_format == "csv":
+        return CSVChunkWriter(path)
+    raise ValueError(f"Unknown export format: {file_format} (expected one of {', '.join(EXPORT_FORMATS)})")
+
+
+def export_format(path: str, file_format: str = None) -> str:
+    """Explicit format, or the one implied by the file extension"""
+    if file_format:
+        return file_format.lower()
+    extension = path.rsplit(".", 1)[-1].lower() if "." in path else ""
+    return extension if extension in EXPORT_FORMATS else "parquet"
@@ -0,0 +1,141 @@
+from typing import List, Dict, Any, Optional, Tuple
+import re
+
+TOKEN_PATTERN = re.compile(r"\d+|[a-z]+")
+
+NUMBER_WORDS = {
+    'a': 1, 'an': 1, 'one': 1, 'single': 1, 'two': 2, 'couple': 2, 'pair': 2,
+    'three': 3, 'four': 4, 'five': 5, 'six': 6, 'seven': 7, 'eight': 8,
+    'nine': 9, 'ten': 10, 'eleven': 11, 'twelve': 12, 'dozen': 12
+}
+
+# Tokens that end a clause, so a dangling quantity does not leak onto the next item
+SEPARATOR_WORDS = {'and', 'plus', 'also', 'then', 'with', 'but', 'or'}
+
+# Words too generic to act as an alias for a single menu item
+STOP_WORDS = {'the', 'with', 'and', 'of', 'a', 'an', 'in', 'on', 'large', 'small', 'fresh'}
+
+# Common shorthand customers use, applied only if the target item is on the menu
+COMMON_ALIASES = {
+    'coke': 'Coca Cola',
+    'oj': 'Orange Juice'
+}
+
+_END = object()
+
+
+def singular(token: str) -> str:
+    """Cheap plural folding: "pizzas" -> "pizza", "sandwiches" -> "sandwich", "berries" -> "berry\""""
+    if len(token) > 4 and token.endswith('ies'):
+        return token[:-3] + 'y'
+    if token.endswith(('ches', 'shes', 'xes', 'sses')):
+        return token[:-2]
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+
+def normalize_tokens(text: str) -> List[str]:
+    """Lowercase, split digits from letters and fold plurals"""
+    return [singular(token) for token in TOKEN_PATTERN.findall(text.lower())]
+
+
+class OrderMatcher:
+    """Compiled token trie over normalized menu names and aliases.
+
+    Built once per menu version; ``parse`` then matches the longest
+    multi-word item name at each position in a single left-to-right pass.
+    """
+
+    def __init__(self, menu_items: List[Dict[str, Any]], aliases: Optional[Dict[str, str]] = None):
+        self.items = {item['name']: item for item in menu_items}
+        self.trie: Dict[Any, Any] = {}
+        self.ambiguous: Dict[str, List[str]] = {}
+
+        # Full names always win
+        for item in menu_items:
+            self._insert(normalize_tokens(item['name']), item)
+
+        # A name word that identifies exactly one item is a usable alias
+        owners: Dict[str, List[str]] = {}
+        for item in menu_items:
+            for token in dict.fromkeys(normalize_tokens(item['name'])):
+                owners.setdefault(token, []).append(item['name'])
+        for token, names in owners.items():
+            if token in STOP_WORDS or token in NUMBER_WORDS:
+                continue
+            if len(names) == 1:
+                self._insert([token], self.items[names[0]], overwrite=False)
+            else:
+                # e.g. "pizza" alone: remember the candidates so callers can ask
+                self.ambiguous[token] = names
+
+        for alias, name in {**COMMON_ALIASES, **(aliases or {})}.items():
+            if name in self.items:
+                self._insert(normalize_tokens(alias), self.items[name], overwrite=False)
+
+    def _insert(self, tokens: List[str], item: Dict[str, Any], overwrite: bool = True):
+        if not tokens:
+            return
+        node = self.trie
+        for token in tokens:
+            node = node.setdefault(token, {})
+        if overwrite or _END not in node:
+            node[_END] = item
+
+    def _longest_match(self, tokens: List[str], start: int) -> Tuple[Optional[Dict[str, Any]], int]:
+        node = self.trie
+        best, best_length = None, 0
+        for i in range(start, len(tokens)):
+            node = node.get(tokens[i])
+            if node is None:
+                break
+            if _END in node:
+                best, best_length = node[_END], i - start + 1
+        return best, best_length
+
+    @staticmethod
+    def _quantity(token: str) -> Optional[int]:
+        if token.isdigit():
+            return int(token)
+        return NUMBER_WORDS.get(token)
+
+    def parse(self, message: str) -> Dict[str, Any]:
+        """Extract ordered items and quantities from a free-text message.
+
+        Returns ``{'items': [(menu_item, quantity), ...], 'ambiguous': [...]}``
+        where repeated mentions of the same item are summed and ``ambiguous``
+        lists words like "pizza" that match several menu items.
+        """
+        tokens = normalize_tokens(message)
+        quantities: Dict[str, int] = {}
+        ambiguous: Dict[str, List[str]] = {}
+        pending: Optional[int] = None
+
+        i = 0
+        while i < len(tokens):
+            item, length = self._longest_match(tokens, i)
+            if item is not None:
+                quantities[item['name']] = quantities.get(item['name'], 0) + (1 if pending is None else pending)
+                pending = None
+                i += length
+                continue
+
+            # Anything else ("x", "of", "large", ...) keeps a pending quantity alive
+            token = tokens[i]
+            quantity = self._quantity(token)
+            if quantity is not None:
+                pending = quantity
+            elif token in self.ambiguous:
+                ambiguous[token] = self.ambiguous[token]
+                pending = None
+            elif token in SEPARATOR_WORDS:
+                pending = None
+            i += 1
+
+        return {
+            'items': [(self.items[name], quantity) for name, quantity in quantities.items() if quantity > 0],
+            'ambiguous': [
+                {'word': word, 'options': names} for word, names in ambiguous.items()
+            ]
+        }
@@ -0,0 +1,163 @@
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from langchain.agents import AgentExecutor
+from langchain.agents.agent import ExceptionTool
+from langchain.callbacks.manager import AsyncCallbackManagerForChainRun, CallbackManagerForChainRun
+from langchain_core.agents import AgentAction, AgentFinish, AgentStep
+from langchain_core.exceptions import OutputParserException
+from langchain_core.tools import BaseTool
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+import asyncio
+import contextvars
+import threading
+import time
+from resources import registry
+from response_cache import is_transactional_action
+from telemetry import telemetry
+
+
+def tool_pool(max_workers: int) -> ThreadPoolExecutor:
+    """Process-wide pool for agent tool calls, shared by every session"""
+    return registry.get_or_create(
+        ("agent-tool-pool", max_workers),
+        lambda: ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agent-tool")
+    )
+
+
+class ParallelAgentExecutor(AgentExecutor):
+    """AgentExecutor that runs all tool calls of one agent step concurrently.
+
+    A tool-calling agent can request several tools in one step; the model
+    issued them without seeing each other's results, so they are independent
+    and run side by side on a process-wide pool of ``max_workers`` threads
+    (``asyncio.gather`` in the async path). Each call gets ``tool_timeout``
+    seconds from the moment a worker starts it, so time spent queued behind
+    other sessions' calls does not count; after that its observation reports
+    the timeout, and results are returned in the order the model asked for
+    them. Calls that parse or create an order are never timed out: a late
+    order still commits, and telling the model it failed would invite a
+    duplicate.
+    """
+
+    max_workers: int = 16
+    tool_timeout: Optional[float] = 30.0
+
+    def _iter_next_step(
+        self,
+        name_to_tool_map: Dict[str, BaseTool],
+        color_mapping: Dict[str, str],
+        inputs: Dict[str, str],
+        intermediate_steps: List[Tuple[AgentAction, str]],
+        run_manager: Optional[CallbackManagerForChainRun] = None,
+    ) -> Iterator[Union[AgentFinish, AgentAction, AgentStep]]:
+        try:
+            output = self.agent.plan(
+                self._prepare_intermediate_steps(intermediate_steps),
+                callbacks=run_manager.get_child() if run_manager else None,
+                **inputs,
+            )
+        except OutputParserException as e:
+            yield self._parsing_error_step(e, run_manager)
+            return
+
+        if isinstance(output, AgentFinish):
+            yield output
+            return
+
+        actions = [output] if isinstance(output, AgentAction) else list(output)
+        for agent_action in actions:
+            yield agent_action
+        yield from self._perform_parallel(name_to_tool_map, color_mapping, actions, run_manager)
+
+    def _perform_parallel(
+        self,
+        name_to_tool_map: Dict[str, BaseTool],
+        color_mapping: Dict[str, str],
+        actions: List[AgentAction],
+        run_manager: Optional[CallbackManagerForChainRun] = None,
+    ) -> Iterator[AgentStep]:
+        if len(actions) == 1 and (self.tool_timeout is None or is_transactional_action(actions[0])):
+            yield self._perform_agent_action(name_to_tool_map, color_mapping, actions[0], run_manager)
+            return
+
+        started = [threading.Event() for _ in actions]
+        start_times: Dict[int, float] = {}
+
+        def perform(index: int, agent_action: AgentAction) -> AgentStep:
+            start_times[index] = time.monotonic()
+            started[index].set()
+            return self._perform_agent_action(name_to_tool_map, color_mapping, agent_action, run_manager)
+
+        pool = tool_pool(self.max_workers)
+        with telemetry.span("agent.tool_batch", tools=len(actions)) as span:
+            # Each call runs in a copy of this context so callbacks and tracing see the current run
+            futures = [
+                pool.submit(contextvars.copy_context().run, perform, index, agent_action)
+                for index, agent_action in enumerate(actions)
+            ]
+            timed_out = 0
+            for index, (agent_action, future) in enumerate(zip(actions, futures)):
+                if self.tool_timeout is None or is_transactional_action(agent_action):
+                    yield future.result()
+                    continue
+                # The timeout measures the tool, not the wait for a free worker
+                started[index].wait()
+                try:
+                    remaining = max(0.0, start_times[index] + self.tool_timeout - time.monotonic())
+                    yield future.result(timeout=remaining)
+                except FutureTimeoutError:
+                    # A running tool cannot be interrupted; it keeps its worker and its late result is discarded
+                    timed_out += 1
+                    yield AgentStep(action=agent_action, observation=self._timeout_observation(agent_action))
+            span['timed_out'] = timed_out
+
+    async def _aperform_agent_action(
+        self,
+        name_to_tool_map: Dict[str, BaseTool],
+        color_mapping: Dict[str, str],
+        agent_action: AgentAction,
+        run_manager: Optional[AsyncCallbackManagerForChainRun] = None,
+    ) -> AgentStep:
+        # The base class already gathers the step's tool calls; this adds the timeout
+        coroutine = super()._aperform_agent_action(name_to_tool_map, color_mapping, agent_action, run_manager)
+        if self.tool_timeout is None or is_transactional_action(agent_action):
+            return await coroutine
+        try:
+            return await asyncio.wait_for(coroutine, self.tool_timeout)
+        except asyncio.TimeoutError:
+            return AgentStep(action=agent_action, observation=self._timeout_observation(agent_action))
+
+    def _parsing_error_step(self, error: OutputParserException,
+                            run_manager: Optional[CallbackManagerForChainRun] = None) -> AgentStep:
+        """Apply ``handle_parsing_errors`` to a failed plan, as AgentExecutor does, without planning again"""
+        if self.handle_parsing_errors is False:
+            raise ValueError(
+                "An output parsing error occurred. In order to pass this error back to the agent and have it "
+                f"try again, pass `handle_parsing_errors=True` to the AgentExecutor. This is the error: {error}"
+            )
+        text = str(error)
+        if isinstance(self.handle_parsing_errors, bool):
+            if error.send_to_llm:
+                observation = str(error.observation)
+                text = str(error.llm_output)
+            else:
+                observation = "Invalid or incomplete response"
+        elif isinstance(self.handle_parsing_errors, str):
+            observation = self.handle_parsing_errors
+        elif callable(self.handle_parsing_errors):
+            observation = self.handle_parsing_errors(error)
+        else:
+            raise ValueError("Got unexpected type of `handle_parsing_errors`")
+        action = AgentAction("_Exception", observation, text)
+        if run_manager:
+            run_manager.on_agent_action(action, color="green")
+        observation = ExceptionTool().run(
+            action.tool_input,
+            verbose=self.verbose,
+            color=None,
+            callbacks=run_manager.get_child() if run_manager else None,
+            **self.agent.tool_run_logging_kwargs(),
+        )
+        return AgentStep(action=action, observation=observation)
+
+    def _timeout_observation(self, agent_action: AgentAction) -> str:
+        return f"Error: {agent_action.tool} did not finish within {self.tool_timeout:g}s. Please try again."
@@ -0,0 +1,169 @@
+from collections import OrderedDict
+from array import array
+from langchain_core.embeddings import Embeddings
+from typing import Any, Dict, Hashable, List, Optional
+import sqlite3
+import threading
+
+
+def normalize_query(query: str) -> str:
+    """Normalize query text so trivially different spellings share cache entries"""
+    return " ".join(query.lower().split())
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache with hit/miss counters"""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+
+class EmbeddingStore:
+    """On-disk SQLite store mapping normalized query text to its embedding vector"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS query_embeddings (
+                model TEXT NOT NULL,
+                query TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (model, query)
+            )
+        ''')
+        self._conn.commit()
+
+    def get(self, model: str, query: str) -> Optional[List[float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT vector FROM query_embeddings WHERE model = ? AND query = ?",
+                (model, query)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return array('d', row[0]).tolist()
+
+    def put(self, model: str, query: str, vector: List[float]):
+        blob = array('d', vector).tobytes()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO query_embeddings (model, query, vector) VALUES (?, ?, ?)",
+                (model, query, blob)
+            )
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                'size': size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """Embeddings wrapper that caches query vectors in memory and on disk"""
+
+    def __init__(self, embeddings: Embeddings, store: Optional[EmbeddingStore] = None, maxsize: int = 1024):
+        self.embeddings = embeddings
+        self.store = store
+        self.memory = LRUCache(maxsize)
+        # Vectors from different models must never be mixed in the disk store
+        self.model = getattr(embeddings, 'model_name', None) or type(embeddings).__name__
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = normalize_query(text)
+        vector = self.memory.get(key)
+        if vector is not None:
+            return vector
+
+        if self.store is not None:
+            vector = self.store.get(self.model, key)
+        if vector is None:
+            vector = self.embeddings.embed_query(key)
+            if self.store is not None:
+                self.store.put(self.model, key, vector)
+
+        self.memory.put(key, vector)
+        return vector
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed many queries, looking each up in the caches first"""
+        keys = [normalize_query(text) for text in texts]
+        vectors = {}
+        missing = []
+        for key in dict.fromkeys(keys):
+            vector = self.memory.get(key)
+            if vector is None and self.store is not None:
+                vector = self.store.get(self.model, key)
+                if vector is not None:
+                    self.memory.put(key, vector)
+            if vector is None:
+                missing.append(key)
+            else:
+                vectors[key] = vector
+
+        # Misses go through embed_query: models that encode queries and documents
+        # differently would otherwise put document vectors in the query cache
+        for key in missing:
+            vector = self.embeddings.embed_query(key)
+            vectors[key] = vector
+            self.memory.put(key, vector)
+            if self.store is not None:
+                self.store.put(self.model, key, vector)
+
+        return [vectors[key] for key in keys]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'memory': self.memory.stats(),
+            'disk': self.store.stats() if self.store is not None else None
+        }
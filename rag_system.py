@@ -1,76 +1,365 @@
-import chromadb
 from langchain_community.embeddings.huggingface import HuggingFaceEmbeddings
-from langchain.vectorstores import Chroma
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_community.vectorstores import Chroma
 from langchain.docstore.document import Document
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Set
+import hashlib
+import json
 import os
+import threading
+from query_cache import CachedQueryEmbeddings, EmbeddingStore, LRUCache, normalize_query
+from vector_index import NumpyMenuIndex
+from hybrid_search import BM25Index, reciprocal_rank_fusion
+from telemetry import telemetry
+from chat_history import count_tokens
+
+# Chroma's own default, so the single-restaurant index persisted before tenancy keeps being used
+DEFAULT_COLLECTION = "langchain"
+
+# Resident-size model for one loaded collection, calibrated against RSS with chromadb 0.4:
+# the HNSW graph preallocates max(1.2 x items, 1000) slots of vector + level-0 links, plus
+# a fixed cost per collection and per-item documents, metadata and BM25 postings
+HNSW_MIN_CAPACITY = 1000
+HNSW_SLOT_OVERHEAD_BYTES = 140
+COLLECTION_OVERHEAD_BYTES = 2 * 1024 * 1024
+ITEM_OVERHEAD_BYTES = 3500
+
+# First line of the menu block injected into the agent prompt (the stub LLM looks for it too)
+MENU_CONTEXT_HEADER = "Menu items relevant to this request (name, price, category: description):"
+CONTEXT_DESCRIPTION_CHARS = 90
+
+# chromadb 0.4 builds its per-directory client system without locking, so two
+# indexes opened at once (e.g. two tenants loading in parallel) can race
+_CHROMA_CLIENT_LOCK = threading.Lock()
 
 class MenuRAG:
-    def __init__(self, menu_items: List[Dict[str, Any]], persist_directory: str = "./data/menu_embeddings"):
+    def __init__(self, menu_items: List[Dict[str, Any]], persist_directory: str = "./data/menu_embeddings",
+                 embeddings: Optional[Any] = None, cache_size: int = 1024, backend: str = "chroma",
+                 collection_name: str = DEFAULT_COLLECTION):
+        if backend not in ("chroma", "numpy"):
+            raise ValueError(f"Unknown search backend: {backend}")
         self.persist_directory = persist_directory
-        self.embeddings = HuggingFaceEmbeddings()
+        self.backend = backend
+        self.collection_name = collection_name
+        os.makedirs(self.persist_directory, exist_ok=True)
+        if isinstance(embeddings, CachedQueryEmbeddings):
+            # Already cached (e.g. one embedder shared by every tenant's index)
+            self.embeddings = embeddings
+        else:
+            # Query vectors are cached in memory and in a SQLite file next to the index
+            self.embeddings = CachedQueryEmbeddings(
+                embeddings or HuggingFaceEmbeddings(),
+                store=EmbeddingStore(os.path.join(self.persist_directory, "query_cache.sqlite3")),
+                maxsize=cache_size
+            )
+        self.result_cache = LRUCache(cache_size)
         self.menu_items = menu_items
+        self.menu_version = None
+        self.dimension = 0
         self.vectorstore = None
+        # Optional in-memory copy of the index; Chroma remains the persistence layer
+        self.index = None
+        self.lexical = None
+        self.documents = {}
+        self.items_by_id = {}
+        self.last_sync = {}
+        self._refresh_lock = threading.Lock()
+        # Searches in flight, so close() never tears the index down under one
+        self._users = 0
+        self._closed = False
+        self._users_lock = threading.Lock()
         self.setup_rag()
     
-    def setup_rag(self):
-        """Setup RAG system with menu data"""
-        # Create documents from menu items
-        documents = []
-        for item in self.menu_items:
-            content = f"""
+    @staticmethod
+    def document_id(item: Dict[str, Any]) -> str:
+        """Stable vector store ID for a menu item"""
+        return f"menu-{item['id']}"
+    
+    @staticmethod
+    def content_hash(content: str, metadata: Dict[str, Any]) -> str:
+        """Hash of everything that ends up in the index for one item"""
+        payload = json.dumps({'content': content, 'metadata': metadata}, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def build_document(self, item: Dict[str, Any]) -> Document:
+        """Create the indexed document for a menu item"""
+        content = f"""
             Name: {item['name']}
             Category: {item['category']}
             Price: ${item['price']:.2f}
             Description: {item['description']}
             Available: {'Yes' if item['available'] else 'No'}
             """
-            doc = Document(
-                page_content=content,
-                metadata={
-                    'name': item['name'],
-                    'category': item['category'],
-                    'price': item['price'],
-                    'id': item['id']
-                }
+        metadata = {
+            'name': item['name'],
+            'category': item['category'],
+            'price': item['price'],
+            'available': bool(item['available']),
+            'id': item['id']
+        }
+        metadata['content_hash'] = self.content_hash(content, metadata)
+        return Document(page_content=content, metadata=metadata)
+    
+    def setup_rag(self):
+        """Sync the persisted vector store with the menu, embedding only new or changed items"""
+        documents = {self.document_id(item): self.build_document(item) for item in self.menu_items}
+        
+        if self.vectorstore is None:
+            with _CHROMA_CLIENT_LOCK:
+                self.vectorstore = Chroma(
+                    collection_name=self.collection_name,
+                    embedding_function=self.embeddings,
+                    persist_directory=self.persist_directory
+                )
+        
+        # Diff the menu against what is already persisted
+        existing = self.vectorstore.get(include=['metadatas'])
+        indexed_hashes = {
+            doc_id: (metadata or {}).get('content_hash')
+            for doc_id, metadata in zip(existing['ids'], existing['metadatas'])
+        }
+        # Anything not keyed by a current menu id is stale, including the
+        # random-ID duplicates left behind by earlier full rebuilds
+        stale_ids = [doc_id for doc_id in indexed_hashes if doc_id not in documents]
+        changed_ids = [
+            doc_id for doc_id, doc in documents.items()
+            if indexed_hashes.get(doc_id) != doc.metadata['content_hash']
+        ]
+        
+        if stale_ids:
+            self.vectorstore.delete(ids=stale_ids)
+        if changed_ids:
+            # Chroma upserts by ID, so updated items replace their old vectors
+            self.vectorstore.add_documents(
+                [documents[doc_id] for doc_id in changed_ids],
+                ids=changed_ids
             )
-            documents.append(doc)
         
-        # Create vector store
-        os.makedirs(self.persist_directory, exist_ok=True)
-        self.vectorstore = Chroma.from_documents(
-            documents=documents,
-            embedding=self.embeddings,
-            persist_directory=self.persist_directory
-        )
-    
-    def search_menu(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
-        """Search menu items using RAG"""
+        added = sum(1 for doc_id in changed_ids if doc_id not in indexed_hashes)
+        self.last_sync = {
+            'added': added,
+            'updated': len(changed_ids) - added,
+            'deleted': len(stale_ids),
+            'unchanged': len(documents) - len(changed_ids)
+        }
+        
+        # Cached results are only valid for the menu they were computed against
+        menu_version = hashlib.sha256(
+            "".join(sorted(doc.metadata['content_hash'] for doc in documents.values())).encode('utf-8')
+        ).hexdigest()
+        if menu_version != self.menu_version:
+            self.menu_version = menu_version
+            self.result_cache.clear()
+            if self.backend == "numpy":
+                self.index = NumpyMenuIndex.from_vectorstore(self.vectorstore)
+        
+        # The lexical index and document lookup are rebuilt alongside the vectors
+        self.documents = {doc.metadata['id']: doc for doc in documents.values()}
+        self.items_by_id = {item['id']: item for item in self.menu_items}
+        self.lexical = BM25Index(self.menu_items)
+        if not self.dimension and documents:
+            sample = self.vectorstore.get(limit=1, include=['embeddings'])['embeddings']
+            self.dimension = len(sample[0]) if sample else 0
+    
+    def memory_bytes(self) -> int:
+        """Estimated resident size: HNSW graph, documents and the lexical index"""
+        items = len(self.documents)
+        slots = max(int(items * 1.2), HNSW_MIN_CAPACITY)
+        size = COLLECTION_OVERHEAD_BYTES + slots * (self.dimension * 4 + HNSW_SLOT_OVERHEAD_BYTES) \
+            + items * ITEM_OVERHEAD_BYTES
+        if self.index is not None:
+            # The numpy backend keeps its own copy of the vectors
+            size += self.index.matrix.nbytes
+        return size
+    
+    def retain(self) -> bool:
+        """Count one more search using this index; False once it has been closed"""
+        with self._users_lock:
+            if self._closed:
+                return False
+            self._users += 1
+            return True
+    
+    def release(self):
+        """End a search started with ``retain()``; the last one out finishes a pending close"""
+        with self._users_lock:
+            self._users -= 1
+            idle = self._closed and self._users == 0
+        if idle:
+            self._drop()
+    
+    def close(self):
+        """Drop this index's in-memory state once no retained search is using it.
+        
+        Searches still running keep the index intact until they release it.
+        Chroma's shared client stays resident and keeps the collection's
+        segments; the next MenuRAG for the collection reopens it through that client.
+        """
+        with self._users_lock:
+            self._closed = True
+            idle = self._users == 0
+        if idle:
+            self._drop()
+    
+    def _drop(self):
+        self.index = None
+        self.vectorstore = None
+        self.lexical = None
+        self.documents = {}
+        self.items_by_id = {}
+        self.result_cache.clear()
+    
+    def refresh(self, menu_items: List[Dict[str, Any]]):
+        """Re-sync the index with a new version of the menu"""
+        with self._refresh_lock:
+            self.menu_items = [dict(item) for item in menu_items]
+            self.setup_rag()
+    
+    @staticmethod
+    def _to_result(doc: Document) -> Dict[str, Any]:
+        return {
+            'name': doc.metadata['name'],
+            'category': doc.metadata['category'],
+            'price': doc.metadata['price'],
+            'content': doc.page_content,
+            'id': doc.metadata['id']
+        }
+    
+    def _resolve_filters(self, category: Optional[str], max_price: Optional[float],
+                         available: Optional[bool]) -> Dict[str, Any]:
+        """Canonicalize filter values so they match the stored metadata exactly"""
+        if category is not None:
+            categories = {item['category'].lower(): item['category'] for item in self.menu_items}
+            category = categories.get(category.lower(), category)
+        return {'category': category, 'max_price': max_price, 'available': available}
+    
+    def _allowed_ids(self, filters: Dict[str, Any]) -> Optional[Set[Any]]:
+        """Menu ids passing the structured filters, or None when nothing is filtered"""
+        if all(value is None for value in filters.values()):
+            return None
+        return {
+            item['id'] for item in self.menu_items
+            if (filters['category'] is None or item['category'] == filters['category'])
+            and (filters['max_price'] is None or item['price'] <= filters['max_price'])
+            and (filters['available'] is None or bool(item['available']) == filters['available'])
+        }
+    
+    @staticmethod
+    def _chroma_filter(filters: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Translate structured filters into a Chroma ``where`` clause"""
+        conditions = []
+        if filters['category'] is not None:
+            conditions.append({'category': {'$eq': filters['category']}})
+        if filters['max_price'] is not None:
+            conditions.append({'price': {'$lte': filters['max_price']}})
+        if filters['available'] is not None:
+            conditions.append({'available': {'$eq': filters['available']}})
+        if not conditions:
+            return None
+        return conditions[0] if len(conditions) == 1 else {'$and': conditions}
+    
+    def _vector_rankings(self, query_vectors: List[List[float]], k: int,
+                         filters: Dict[str, Any]) -> List[List[Any]]:
+        """Best-first menu ids per query from the in-memory index or from Chroma"""
+        if self.index is not None:
+            return [
+                [self.index.metadatas[row]['id'] for row, _ in hits]
+                for hits in self.index.search_batch(query_vectors, k, self._allowed_ids(filters))
+            ]
+        where = self._chroma_filter(filters)
+        return [
+            [doc.metadata['id'] for doc in self.vectorstore.similarity_search_by_vector(vector, k=k, filter=where)]
+            for vector in query_vectors
+        ]
+    
+    def _hybrid_search(self, queries: List[str], k: int, filters: Dict[str, Any]) -> List[List[Dict[str, Any]]]:
+        """Fuse BM25 and vector rankings; filters restrict both candidate sets"""
+        allowed = self._allowed_ids(filters)
+        depth = max(2 * k, 10)
+        # Searches run concurrently with refresh(); use one lexical index throughout
+        lexical_index = self.lexical
+        rankings = {}
+        semantic = []
+        for query in queries:
+            exact = lexical_index.exact_match(query)
+            if exact is not None and (allowed is None or exact in allowed):
+                # Exact item names resolve lexically, without touching the embedder
+                lexical = [item_id for item_id, _ in lexical_index.search(query, depth, allowed)]
+                rankings[query] = [exact] + [item_id for item_id in lexical if item_id != exact]
+            else:
+                semantic.append(query)
+        
+        if semantic:
+            vectors = self.embeddings.embed_queries(semantic)
+            for query, vector_ranking in zip(semantic, self._vector_rankings(vectors, depth, filters)):
+                lexical = [item_id for item_id, _ in lexical_index.search(query, depth, allowed)]
+                rankings[query] = reciprocal_rank_fusion([lexical, vector_ranking])
+        
+        # A concurrent refresh may have swapped the documents; skip ids it dropped
+        documents = self.documents
+        return [
+            [self._to_result(documents[item_id]) for item_id in rankings[query] if item_id in documents][:k]
+            for query in queries
+        ]
+    
+    def search_menu(self, query: str, k: int = 5, category: Optional[str] = None,
+                    max_price: Optional[float] = None, available: Optional[bool] = True) -> List[Dict[str, Any]]:
+        """Search menu items with hybrid lexical + vector retrieval"""
+        return self.search_menu_batch([query], k, category, max_price, available)[0]
+    
+    def search_menu_batch(self, queries: List[str], k: int = 5, category: Optional[str] = None,
+                          max_price: Optional[float] = None,
+                          available: Optional[bool] = True) -> List[List[Dict[str, Any]]]:
+        """Search many queries at once, embedding and scoring all cache misses together"""
         if not self.vectorstore:
-            return []
+            return [[] for _ in queries]
         
-        # Perform similarity search
-        docs = self.vectorstore.similarity_search(query, k=k)
+        filters = self._resolve_filters(category, max_price, available)
+        filter_key = tuple(sorted(filters.items()))
+        keys = [normalize_query(query) for query in queries]
+        results = {}
+        for key in dict.fromkeys(keys):
+            cached = self.result_cache.get((key, k, filter_key, self.menu_version))
+            if cached is not None:
+                results[key] = cached
         
-        results = []
-        for doc in docs:
-            results.append({
-                'name': doc.metadata['name'],
-                'category': doc.metadata['category'],
-                'price': doc.metadata['price'],
-                'content': doc.page_content,
-                'id': doc.metadata['id']
-            })
+        missing = [key for key in dict.fromkeys(keys) if key not in results]
+        if missing:
+            with telemetry.span("rag.search", queries=len(missing), backend=self.backend):
+                rankings = self._hybrid_search(missing, k, filters)
+            for key, items in zip(missing, rankings):
+                results[key] = items
+                self.result_cache.put((key, k, filter_key, self.menu_version), items)
         
-        return results
+        return [[dict(item) for item in results[key]] for key in keys]
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for the query embedding and result caches"""
+        return {
+            'embeddings': self.embeddings.stats(),
+            'results': self.result_cache.stats()
+        }
     
-    def get_menu_context(self, query: str) -> str:
-        """Get relevant menu context for the query"""
-        search_results = self.search_menu(query)
-        context = "Available menu items related to your query:\n\n"
+    def get_menu_context(self, query: str, max_tokens: int = 300, k: int = 8) -> str:
+        """Compact block of the menu items most relevant to the query, within ``max_tokens``.
         
-        for item in search_results:
-            context += f"- {item['name']} (${item['price']:.2f}) - {item['category']}\n"
+        One line per item, best match first; lower-ranked items are dropped
+        once the budget is spent. Empty when nothing matches.
+        """
+        lines = []
+        used = count_tokens(MENU_CONTEXT_HEADER)
+        for item in self.search_menu(query, k=k):
+            line = f"- {item['name']} (${item['price']:.2f}, {item['category']})"
+            description = " ".join(str(self.items_by_id.get(item['id'], {}).get('description') or "").split())
+            if description:
+                if len(description) > CONTEXT_DESCRIPTION_CHARS:
+                    description = description[:CONTEXT_DESCRIPTION_CHARS].rsplit(" ", 1)[0] + "..."
+                line += f": {description}"
+            tokens = count_tokens(line)
+            if used + tokens > max_tokens:
+                break
+            lines.append(line)
+            used += tokens
         
-        return context
+        if not lines:
+            return ""
+        return "\n".join([MENU_CONTEXT_HEADER] + lines)
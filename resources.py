@@ -0,0 +1,50 @@
+from typing import Any, Callable, Dict, Hashable, Optional
+import threading
+
+
+class ResourceRegistry:
+    """Thread-safe, process-wide registry of lazily built shared resources.
+
+    Each key is built exactly once, even when many sessions ask for it at the
+    same time; builds for different keys do not block each other.
+    """
+
+    def __init__(self):
+        self._resources: Dict[Hashable, Any] = {}
+        self._building: Dict[Hashable, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def get_or_create(self, key: Hashable, factory: Callable[[], Any],
+                      valid: Optional[Callable[[Any], bool]] = None) -> Any:
+        """The resource for ``key``, built on first use.
+
+        When ``valid`` rejects the resident resource it is rebuilt, and the one
+        it replaces is closed (if it has a ``close()``).
+        """
+        resource = self._resources.get(key)
+        if resource is not None and (valid is None or valid(resource)):
+            return resource
+
+        replaced = None
+        with self._lock:
+            build_lock = self._building.setdefault(key, threading.Lock())
+        with build_lock:
+            resource = self._resources.get(key)
+            if resource is None or (valid is not None and not valid(resource)):
+                replaced = resource
+                resource = factory()
+                self._resources[key] = resource
+        if replaced is not None and hasattr(replaced, 'close'):
+            replaced.close()
+        return resource
+
+    def get(self, key: Hashable) -> Any:
+        return self._resources.get(key)
+
+    def clear(self):
+        with self._lock:
+            self._resources.clear()
+            self._building.clear()
+
+
+registry = ResourceRegistry()
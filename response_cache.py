@@ -0,0 +1,146 @@
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import re
+import threading
+import time
+
+import numpy as np
+
+from query_cache import normalize_query
+
+# Requests whose answer depends on the conversation or changes state are never cached
+TRANSACTIONAL = re.compile(
+    r"\b(order|buy|place|confirm|cancel|checkout|pay|add|remove|change|yes|yeah|yep|sure|ok(ay)?|no|"
+    r"i('d| would)?\s+(like|want|take|have)|(can|could|may)\s+i\s+(get|have)|(get|give)\s+me|"
+    r"i('ll| will)\s+(have|take)|my|that|those|it)\b|^\W*\d+\s*x?\s+\w+",
+    re.IGNORECASE
+)
+
+# Tools whose use marks a turn as part of an order
+TRANSACTIONAL_TOOLS = {'order_parser'}
+
+
+def is_transactional_action(action) -> bool:
+    """Whether an agent tool call belongs to an order (parsing it or creating it)"""
+    return action.tool in TRANSACTIONAL_TOOLS or "create_order" in str(action.tool_input)
+
+
+class SemanticResponseCache:
+    """Answers for near-duplicate questions, matched by query embedding.
+
+    Entries are (embedding, normalized query, answer) for one menu version;
+    a lookup returns the closest stored answer when its cosine similarity is
+    at least ``threshold``. Entries expire after ``ttl_seconds`` and the
+    least recently used ones are evicted beyond ``max_entries``.
+    """
+
+    def __init__(self, embeddings, threshold: float = 0.92, max_entries: int = 512,
+                 ttl_seconds: float = 3600.0):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self._entries: "OrderedDict[str, Tuple[np.ndarray, str, int, float]]" = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None
+        self._keys: List[str] = []
+        self._versions: np.ndarray = np.empty(0, dtype=object)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def cacheable(request: str) -> bool:
+        """Only standalone informational questions are safe to share"""
+        return bool(request.strip()) and not TRANSACTIONAL.search(request)
+
+    def _embed(self, query: str) -> np.ndarray:
+        vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def _expire(self, now: float):
+        expired = [key for key, (_, _, _, created) in self._entries.items()
+                   if now - created > self.ttl_seconds]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    def _index(self) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        if self._matrix is None:
+            self._keys = list(self._entries)
+            self._matrix = np.stack([self._entries[key][0] for key in self._keys]) if self._keys \
+                else np.empty((0, 0), dtype=np.float32)
+            self._versions = np.array([self._entries[key][2] for key in self._keys], dtype=object)
+        return self._keys, self._matrix, self._versions
+
+    def lookup(self, request: str, menu_version: int) -> Optional[str]:
+        """Cached answer for a similar request under the same menu, or None"""
+        if not self.cacheable(request):
+            with self._lock:
+                self.skipped += 1
+            return None
+
+        query = normalize_query(request)
+        with self._lock:
+            self._expire(time.monotonic())
+            entry = self._entries.get(query)
+            if entry is not None and entry[2] == menu_version:
+                self._entries.move_to_end(query)
+                self.hits += 1
+                return entry[1]
+            if not self._entries:
+                self.misses += 1
+                return None
+
+        vector = self._embed(query)
+        with self._lock:
+            keys, matrix, versions = self._index()
+            current = versions == menu_version
+            if not current.any():
+                self.misses += 1
+                return None
+            # Entries for other menu versions must not outrank a current match
+            scores = np.where(current, matrix @ vector, -np.inf)
+            best = int(np.argmax(scores))
+            entry = self._entries.get(keys[best])
+            if entry is None or scores[best] < self.threshold:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(keys[best])
+            self.hits += 1
+            return entry[1]
+
+    def store(self, request: str, answer: str, menu_version: int):
+        if not answer or not self.cacheable(request):
+            return
+        query = normalize_query(request)
+        vector = self._embed(query)
+        with self._lock:
+            self._entries[query] = (vector, answer, menu_version, time.monotonic())
+            self._entries.move_to_end(query)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def invalidate(self, menu_version: Optional[int] = None):
+        """Drop entries for other menu versions (or everything when None)"""
+        with self._lock:
+            if menu_version is None:
+                self._entries.clear()
+            else:
+                for key in [key for key, entry in self._entries.items() if entry[2] != menu_version]:
+                    del self._entries[key]
+            self._matrix = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'skipped': self.skipped,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
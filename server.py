@@ -0,0 +1,481 @@
+"""Headless HTTP API for the restaurant agent (chat, menu, orders, analytics).
+
+Sessions live in SQLite (session_store.py), so several server processes
+sharing the database files can sit behind one load balancer without sticky
+sessions. Blocking agent turns run on a bounded worker pool; when it is full,
+requests get 503 with Retry-After instead of piling up.
+
+    python server.py --port 8000 --processes 4
+    uvicorn server:app --port 8000
+"""
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field
+from typing import Any, Callable, Dict, List, Optional
+import argparse
+import asyncio
+import os
+import threading
+import uuid
+from dotenv import load_dotenv
+from database import OrderDatabase, DEFAULT_TENANT
+from intent_router import IntentRouter
+from llm_scheduler import LLMScheduler
+from resources import ResourceRegistry
+from session_store import SessionStore
+from telemetry import telemetry
+
+
+class Overloaded(Exception):
+    """Every worker is busy and the wait queue is full"""
+
+
+class TurnTimeout(Exception):
+    """A blocking call did not finish within the pool's timeout"""
+
+
+class SessionNotFound(Exception):
+    pass
+
+
+class SessionBusy(Exception):
+    """Another request holds the session's lease; nothing has run yet, so it is safe to retry"""
+
+
+class AgentWorkerPool:
+    """Bounded thread pool for blocking agent work, with load shedding.
+
+    At most ``workers`` calls run at once and up to ``max_pending`` more wait
+    for a thread; anything beyond that is rejected immediately so clients
+    can retry another replica instead of timing out in a queue.
+    """
+
+    def __init__(self, workers: int = 8, max_pending: int = 32, timeout_s: float = 60.0):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout_s
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="agent-worker")
+        self._lock = threading.Lock()
+
+    async def run(self, func: Callable, *args: Any) -> Any:
+        with self._lock:
+            if self.in_flight >= self.workers + self.max_pending:
+                self.rejected += 1
+                raise Overloaded()
+            self.in_flight += 1
+        # The slot is released when the call really ends, even after a timeout
+        future = self._executor.submit(func, *args)
+        future.add_done_callback(self._release)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.timed_out += 1
+            raise TurnTimeout()
+
+    def _release(self, future):
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'in_flight': self.in_flight,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+class CachedAgent:
+    """A session's agent kept in memory, with the stored version its history reflects.
+
+    ``users`` counts requests holding the entry; it changes under the
+    service lock, and only entries nobody holds are evicted.
+    """
+
+    def __init__(self, agent):
+        self.agent = agent
+        self.version = -1
+        self.users = 0
+        self.lock = threading.Lock()
+
+
+class ChatService:
+    """FoodOrderAgent sessions, menu, orders and analytics behind one object; the HTTP layer is a thin shell.
+
+    Agents are cached per session (up to ``max_cached_sessions``), but each
+    turn checks the session's stored version first, so a session last served
+    by another process is reloaded from the store instead of answered from
+    stale history.
+    """
+
+    def __init__(self, groq_api_key: Optional[str] = None, db_path: str = "orders.db",
+                 persist_directory: str = "./data/menu_embeddings", session_db: str = "sessions.db",
+                 default_tenant: str = DEFAULT_TENANT, llm: Optional[Any] = None, embeddings: Optional[Any] = None,
+                 workers: int = 8, max_pending: int = 32, turn_timeout_s: float = 60.0,
+                 session_ttl_s: float = 1800.0, max_cached_sessions: int = 1000,
+                 agent_options: Optional[Dict[str, Any]] = None):
+        # Imported here so the module (and uvicorn's import of it) stays light until the service starts
+        from tenant_indexes import TenantIndexManager
+        self.groq_api_key = groq_api_key
+        self.default_tenant = default_tenant
+        self.llm = llm
+        self.agent_options = agent_options or {}
+        self.max_cached_sessions = max_cached_sessions
+        # Orders placed through the API from many requests at once share commits
+        self.db = OrderDatabase(db_path, group_commit_ms=0.0)
+        self.indexes = TenantIndexManager(self.db, persist_directory, embeddings=embeddings)
+        self.sessions = SessionStore(session_db, session_ttl_s)
+        self.pool = AgentWorkerPool(workers, max_pending, turn_timeout_s)
+        # A turn keeps running after its request times out, so its session lease outlasts the timeout
+        self.lease_s = 2 * turn_timeout_s
+        self._resources = ResourceRegistry()
+        self._agents: "OrderedDict[str, CachedAgent]" = OrderedDict()
+        self._tenants = set(self.db.list_tenants())
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "ChatService":
+        load_dotenv()
+        groq_api_key = os.getenv('GROQ_API_KEY')
+        if not groq_api_key:
+            raise RuntimeError("GROQ_API_KEY is not set")
+        return cls(
+            groq_api_key,
+            db_path=os.getenv('DB_PATH', "orders.db"),
+            persist_directory=os.getenv('MENU_EMBEDDINGS', "./data/menu_embeddings"),
+            session_db=os.getenv('SESSION_DB', "sessions.db"),
+            default_tenant=os.getenv('TENANT_ID', DEFAULT_TENANT),
+            workers=int(os.getenv('AGENT_WORKERS', "8")),
+            max_pending=int(os.getenv('MAX_PENDING', "32")),
+            turn_timeout_s=float(os.getenv('TURN_TIMEOUT_S', "60")),
+            session_ttl_s=float(os.getenv('SESSION_TTL_S', "1800")),
+            agent_options={
+                'semantic_cache': os.getenv('SEMANTIC_CACHE') == '1',
+                'menu_context': os.getenv('MENU_CONTEXT') == '1',
+                'parallel_tools': os.getenv('PARALLEL_TOOLS') == '1',
+                'tool_workers': int(os.getenv('TOOL_WORKERS', "16"))
+            }
+        )
+
+    def has_tenant(self, tenant_id: str) -> bool:
+        if tenant_id not in self._tenants:
+            # Tenants added since start-up (by another process, say)
+            self._tenants = set(self.db.list_tenants())
+        return tenant_id in self._tenants
+
+    def resources(self, tenant_id: str):
+        """The tenant's shared AgentResources, built on first use"""
+        from agents import AgentResources
+        return self._resources.get_or_create(
+            tenant_id,
+            lambda: AgentResources(self.groq_api_key, llm=self.llm, tenant_id=tenant_id, indexes=self.indexes)
+        )
+
+    def warm_up(self, tenant_id: Optional[str] = None):
+        self.resources(tenant_id or self.default_tenant).warm_up()
+
+    def _cached_agent(self, session: Dict[str, Any]) -> CachedAgent:
+        session_id = session['session_id']
+        with self._lock:
+            entry = self._agents.get(session_id)
+            if entry is not None:
+                self._agents.move_to_end(session_id)
+                entry.users += 1
+                return entry
+
+        from agents import FoodOrderAgent
+        agent = FoodOrderAgent(self.groq_api_key or "", resources=self.resources(session['tenant_id']),
+                               **self.agent_options)
+        with self._lock:
+            entry = self._agents.setdefault(session_id, CachedAgent(agent))
+            self._agents.move_to_end(session_id)
+            entry.users += 1
+            # Evicted sessions reload from the store on their next turn; agents in use are kept
+            idle = [key for key, cached in self._agents.items() if cached.users == 0]
+            for key in idle[:max(len(self._agents) - self.max_cached_sessions, 0)]:
+                del self._agents[key]
+        return entry
+
+    def create_session(self, tenant_id: str, customer_name: Optional[str] = None) -> Dict[str, Any]:
+        session = self.sessions.create(tenant_id, customer_name)
+        return {'session_id': session['session_id'], 'tenant_id': tenant_id, 'customer_name': customer_name}
+
+    def get_session(self, session_id: str, tenant_id: str) -> Dict[str, Any]:
+        session = self.sessions.get(session_id)
+        if session is None or session['tenant_id'] != tenant_id:
+            raise SessionNotFound(session_id)
+        return session
+
+    def end_session(self, session_id: str, tenant_id: str):
+        self.get_session(session_id, tenant_id)
+        self.sessions.delete(session_id)
+        with self._lock:
+            self._agents.pop(session_id, None)
+
+    def chat(self, session_id: str, tenant_id: str, message: str) -> Dict[str, Any]:
+        """Run one agent turn for the session (blocking; called on the worker pool)"""
+        entry = self._cached_agent(self.get_session(session_id, tenant_id))
+        try:
+            with entry.lock, telemetry.span("api.chat_turn", tenant=tenant_id):
+                return self._turn(entry, session_id, tenant_id, message)
+        finally:
+            with self._lock:
+                entry.users -= 1
+
+    def _turn(self, entry: CachedAgent, session_id: str, tenant_id: str, message: str) -> Dict[str, Any]:
+        # The lease keeps other processes from running a turn for this session at the same time;
+        # refusing here is safe to retry because the turn has not run
+        owner = uuid.uuid4().hex
+        if not self.sessions.acquire(session_id, owner, self.lease_s):
+            raise SessionBusy(session_id)
+        try:
+            # Re-read under the lease: another process may have served it since
+            session = self.get_session(session_id, tenant_id)
+            if session['version'] != entry.version:
+                entry.agent.history.load(session['state'])
+
+            customer_name = session['customer_name']
+            if customer_name and IntentRouter.split_request(message)[0] is None:
+                message = f"Customer: {customer_name}. Request: {message}"
+            answer = entry.agent.process_message(message)
+            version = self.sessions.save(session_id, entry.agent.history.to_dict(), session['version'])
+            if version is None:
+                # The lease ran out and another request saved first. The turn may have placed an order,
+                # so the answer still goes back, flagged; the next turn reloads the stored history
+                entry.version = -1
+                return {'session_id': session_id, 'answer': answer, 'conflict': True}
+            entry.version = version
+        finally:
+            self.sessions.release(session_id, owner)
+        return {'session_id': session_id, 'answer': answer, 'conflict': False}
+
+    def search_menu(self, tenant_id: str, query: str, k: int = 5, category: Optional[str] = None,
+                    max_price: Optional[float] = None) -> List[Dict[str, Any]]:
+        results = self.indexes.index(tenant_id).search_menu(query, k, category=category, max_price=max_price)
+        return [{key: item[key] for key in ('id', 'name', 'category', 'price')} for item in results]
+
+    def place_order(self, tenant_id: str, customer_name: str, items: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Price the items from the current menu (never from the client) and store the order"""
+        db = self.indexes.database(tenant_id)
+        snapshot = db.get_menu_snapshot()
+        priced = []
+        for item in items:
+            menu_item = snapshot.name_index.get(item['name'].strip().lower())
+            if menu_item is None:
+                raise ValueError(f"Not on the menu: {item['name']}")
+            priced.append({
+                'name': menu_item['name'],
+                'quantity': item['quantity'],
+                'price': menu_item['price'],
+                'total': item['quantity'] * menu_item['price']
+            })
+        total_amount = round(sum(item['total'] for item in priced), 2)
+        order_id = db.submit_order(customer_name, priced, total_amount).result()
+        return {'order_id': order_id, 'items': priced, 'total_amount': total_amount}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            cached = len(self._agents)
+        return {
+            'pool': self.pool.stats(),
+            'sessions': {**self.sessions.stats(), 'cached_agents': cached},
+            'indexes': self.indexes.stats(),
+            'llm': self.llm_stats(),
+            'telemetry': telemetry.snapshot()
+        }
+
+    def llm_stats(self) -> Optional[Dict[str, Any]]:
+        """The shared LLM scheduler's queue and throttling counters, if the LLM goes through one"""
+        scheduler = getattr(self.llm, 'scheduler', None)
+        if scheduler is None and self.llm is None:
+            scheduler = LLMScheduler.shared()
+        return scheduler.stats() if scheduler is not None else None
+
+    def close(self):
+        self.pool.shutdown()
+        self.db.close()
+        self.sessions.close()
+
+
+class SessionCreate(BaseModel):
+    customer_name: Optional[str] = Field(None, max_length=100)
+
+
+class ChatRequest(BaseModel):
+    message: str = Field(..., min_length=1, max_length=4000)
+    session_id: Optional[str] = None
+    customer_name: Optional[str] = Field(None, max_length=100)
+
+
+class OrderLine(BaseModel):
+    name: str = Field(..., min_length=1)
+    quantity: int = Field(1, ge=1, le=100)
+
+
+class OrderRequest(BaseModel):
+    customer_name: str = Field(..., min_length=1, max_length=100)
+    items: List[OrderLine] = Field(..., min_length=1)
+
+
+def create_app(service: Optional[ChatService] = None) -> FastAPI:
+    """The HTTP app; without a service, one is built from the environment at start-up"""
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        app.state.service = service or ChatService.from_env()
+        # Load the default tenant's index and parsers before the first customer arrives
+        threading.Thread(target=app.state.service.warm_up, daemon=True).start()
+        yield
+        app.state.service.close()
+
+    app = FastAPI(title="Restaurant Order Bot API", lifespan=lifespan)
+
+    def get_service(request: Request) -> ChatService:
+        return request.app.state.service
+
+    def get_tenant(request: Request, x_tenant_id: Optional[str] = Header(None)) -> str:
+        tenant_id = x_tenant_id or request.app.state.service.default_tenant
+        if not request.app.state.service.has_tenant(tenant_id):
+            raise HTTPException(404, f"Unknown tenant: {tenant_id}")
+        return tenant_id
+
+    @app.exception_handler(Overloaded)
+    async def overloaded(request: Request, exc: Overloaded):
+        return JSONResponse({'detail': "Server busy, please retry"}, status_code=503, headers={'Retry-After': "1"})
+
+    @app.exception_handler(TurnTimeout)
+    async def turn_timeout(request: Request, exc: TurnTimeout):
+        return JSONResponse({'detail': "The request took too long"}, status_code=504)
+
+    @app.exception_handler(SessionNotFound)
+    async def session_not_found(request: Request, exc: SessionNotFound):
+        return JSONResponse({'detail': "Unknown or expired session"}, status_code=404)
+
+    @app.exception_handler(SessionBusy)
+    async def session_busy(request: Request, exc: SessionBusy):
+        return JSONResponse({'detail': "Another request is answering this session, please retry"},
+                            status_code=409, headers={'Retry-After': "1"})
+
+    @app.get("/health")
+    def health():
+        return {'status': "ok"}
+
+    @app.get("/stats")
+    def stats(service: ChatService = Depends(get_service)):
+        return service.stats()
+
+    @app.post("/sessions")
+    def create_session(body: SessionCreate, tenant_id: str = Depends(get_tenant),
+                       service: ChatService = Depends(get_service)):
+        return service.create_session(tenant_id, body.customer_name)
+
+    @app.get("/sessions/{session_id}")
+    def get_session(session_id: str, tenant_id: str = Depends(get_tenant),
+                    service: ChatService = Depends(get_service)):
+        session = service.get_session(session_id, tenant_id)
+        return {'session_id': session_id, 'tenant_id': tenant_id, 'customer_name': session['customer_name'],
+                'history': session['state']}
+
+    @app.delete("/sessions/{session_id}")
+    def end_session(session_id: str, tenant_id: str = Depends(get_tenant),
+                    service: ChatService = Depends(get_service)):
+        service.end_session(session_id, tenant_id)
+        return {'deleted': True}
+
+    @app.post("/chat")
+    async def chat(body: ChatRequest, tenant_id: str = Depends(get_tenant),
+                   service: ChatService = Depends(get_service)):
+        session_id = body.session_id
+        if session_id is None:
+            session = await asyncio.to_thread(service.create_session, tenant_id, body.customer_name)
+            session_id = session['session_id']
+        return await service.pool.run(service.chat, session_id, tenant_id, body.message)
+
+    @app.get("/menu")
+    def menu(tenant_id: str = Depends(get_tenant), service: ChatService = Depends(get_service)):
+        snapshot = service.indexes.database(tenant_id).get_menu_snapshot()
+        return {'version': snapshot.version, 'items': snapshot.items}
+
+    @app.get("/menu/search")
+    async def search_menu(q: str = Query(..., min_length=1), k: int = Query(5, ge=1, le=50),
+                          category: Optional[str] = None, max_price: Optional[float] = None,
+                          tenant_id: str = Depends(get_tenant), service: ChatService = Depends(get_service)):
+        # Embedding the query is CPU work, so it shares the agent pool and its back-pressure
+        items = await service.pool.run(service.search_menu, tenant_id, q, k, category, max_price)
+        return {'items': items}
+
+    @app.post("/orders")
+    async def place_order(body: OrderRequest, tenant_id: str = Depends(get_tenant),
+                          service: ChatService = Depends(get_service)):
+        # Waiting for the group commit blocks, so it takes a worker slot like any other blocking call
+        try:
+            return await service.pool.run(service.place_order, tenant_id, body.customer_name,
+                                          [line.model_dump() for line in body.items])
+        except ValueError as e:
+            raise HTTPException(422, str(e))
+
+    @app.get("/orders")
+    def list_orders(status: Optional[str] = None, customer: Optional[str] = None, since: Optional[str] = None,
+                    until: Optional[str] = None, limit: int = Query(50, ge=1, le=500), cursor: Optional[str] = None,
+                    newest_first: bool = False, tenant_id: str = Depends(get_tenant),
+                    service: ChatService = Depends(get_service)):
+        after = None
+        if cursor:
+            # Cursor is the last row's "order_time,id" from the previous page
+            order_time, _, order_id = cursor.rpartition(",")
+            if not order_time or not order_id.isdigit():
+                raise HTTPException(400, "Invalid cursor")
+            after = (order_time, int(order_id))
+        orders, next_key = service.indexes.database(tenant_id).get_orders_page(
+            status=status, since=since, until=until, customer=customer, after=after, limit=limit,
+            newest_first=newest_first
+        )
+        return {'orders': orders, 'next_cursor': f"{next_key[0]},{next_key[1]}" if next_key else None}
+
+    @app.get("/analytics")
+    def analytics(tenant_id: str = Depends(get_tenant), service: ChatService = Depends(get_service)):
+        return service.indexes.database(tenant_id).get_order_analytics()
+
+    return app
+
+
+# For `uvicorn server:app`; the service is built from the environment when the server starts
+app = create_app()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--processes", type=int, default=1, help="Server processes (uvicorn workers)")
+    parser.add_argument("--workers", type=int, help="Agent worker threads per process (AGENT_WORKERS)")
+    parser.add_argument("--max-pending", type=int, help="Queued turns before returning 503 (MAX_PENDING)")
+    args = parser.parse_args()
+
+    # Settings reach every server process through the environment
+    if args.workers is not None:
+        os.environ['AGENT_WORKERS'] = str(args.workers)
+    if args.max_pending is not None:
+        os.environ['MAX_PENDING'] = str(args.max_pending)
+
+    import uvicorn
+    uvicorn.run("server:app", host=args.host, port=args.port, workers=args.processes)
+
+
+if __name__ == "__main__":
+    main()
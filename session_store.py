@@ -0,0 +1,138 @@
+from typing import Any, Dict, Optional
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+
+class SessionStore:
+    """Chat sessions in SQLite, so any server process sharing the file can serve any session.
+
+    A row holds the session's tenant, customer name and serialized chat
+    history (``ChatHistoryManager.to_dict``), plus a version bumped on every
+    save so a process can tell whether its in-memory copy is current, and a
+    lease that lets one request at a time run a turn for the session.
+    Sessions idle for longer than ``ttl_s`` expire.
+    """
+
+    def __init__(self, db_path: str = "sessions.db", ttl_s: float = 1800.0):
+        self.db_path = db_path
+        self.ttl = ttl_s
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS chat_sessions (
+                session_id TEXT PRIMARY KEY,
+                tenant_id TEXT NOT NULL,
+                customer_name TEXT,
+                state TEXT NOT NULL DEFAULT '{}',
+                version INTEGER NOT NULL DEFAULT 0,
+                lease_owner TEXT,
+                lease_until REAL NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(chat_sessions)")]
+        if "lease_owner" not in columns:
+            self._conn.execute("ALTER TABLE chat_sessions ADD COLUMN lease_owner TEXT")
+            self._conn.execute("ALTER TABLE chat_sessions ADD COLUMN lease_until REAL NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chat_sessions_updated ON chat_sessions(updated_at)")
+        self._conn.commit()
+
+    def create(self, tenant_id: str, customer_name: Optional[str] = None) -> Dict[str, Any]:
+        now = time.time()
+        session = {
+            'session_id': uuid.uuid4().hex,
+            'tenant_id': tenant_id,
+            'customer_name': customer_name,
+            'state': {},
+            'version': 0
+        }
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO chat_sessions (session_id, tenant_id, customer_name, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (session['session_id'], tenant_id, customer_name, now, now)
+            )
+            self._conn.commit()
+        return session
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """The session, or None if it does not exist or has expired"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT tenant_id, customer_name, state, version FROM chat_sessions "
+                "WHERE session_id = ? AND updated_at >= ?",
+                (session_id, time.time() - self.ttl)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            'session_id': session_id,
+            'tenant_id': row[0],
+            'customer_name': row[1],
+            'state': json.loads(row[2]),
+            'version': row[3]
+        }
+
+    def save(self, session_id: str, state: Dict[str, Any], expected_version: int) -> Optional[int]:
+        """Store the session's history if it is still at ``expected_version``.
+
+        Returns the new version, or None when another writer saved (or the
+        session was deleted) since ``expected_version`` was read.
+        """
+        with self._lock:
+            updated = self._conn.execute(
+                "UPDATE chat_sessions SET state = ?, version = version + 1, updated_at = ? "
+                "WHERE session_id = ? AND version = ?",
+                (json.dumps(state), time.time(), session_id, expected_version)
+            ).rowcount
+            self._conn.commit()
+        return expected_version + 1 if updated else None
+
+    def acquire(self, session_id: str, owner: str, lease_s: float) -> bool:
+        """Take the session's lease for ``lease_s`` seconds; False while another owner holds it"""
+        now = time.time()
+        with self._lock:
+            taken = self._conn.execute(
+                "UPDATE chat_sessions SET lease_owner = ?, lease_until = ? "
+                "WHERE session_id = ? AND (lease_owner IS NULL OR lease_owner = ? OR lease_until < ?)",
+                (owner, now + lease_s, session_id, owner, now)
+            ).rowcount
+            self._conn.commit()
+        return taken > 0
+
+    def release(self, session_id: str, owner: str):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE chat_sessions SET lease_owner = NULL, lease_until = 0 WHERE session_id = ? AND lease_owner = ?",
+                (session_id, owner)
+            )
+            self._conn.commit()
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM chat_sessions WHERE session_id = ?", (session_id,)).rowcount
+            self._conn.commit()
+        return deleted > 0
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM chat_sessions WHERE updated_at < ?",
+                                         (time.time() - self.ttl,)).rowcount
+            self._conn.commit()
+        return deleted
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            active = self._conn.execute("SELECT COUNT(*) FROM chat_sessions WHERE updated_at >= ?",
+                                        (time.time() - self.ttl,)).fetchone()[0]
+        return {'active': active, 'ttl_s': self.ttl}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
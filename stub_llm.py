@@ -0,0 +1,176 @@
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, FunctionMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.pydantic_v1 import PrivateAttr
+from typing import Any, Dict, List, Optional, Tuple
+import json
+import random
+import re
+import threading
+import time
+
+from chat_history import count_tokens
+from intent_router import IntentRouter
+from rag_system import MENU_CONTEXT_HEADER
+
+CONFIRM = re.compile(r"\b(yes|yeah|yep|confirm|place (it|the order)|go ahead|sounds good)\b", re.IGNORECASE)
+MENU = re.compile(r"\bmenu\b", re.IGNORECASE)
+POPULAR = re.compile(r"\b(popular|best[\s-]?sell\w*|recommend\w*|what'?s good)\b", re.IGNORECASE)
+ORDER = re.compile(
+    r"\b(i('d| would)?\s+(like|want|take|have)|(can|could|may)\s+i\s+(get|have|order)|(get|give)\s+me|"
+    r"i('ll| will)\s+(have|take)|add)\b|^\W*\d+\s*x?\s+\w+",
+    re.IGNORECASE
+)
+
+
+def tool_name(steps: List[BaseMessage], result: BaseMessage) -> Optional[str]:
+    """Name of the tool that produced a FunctionMessage or ToolMessage"""
+    if isinstance(result, FunctionMessage):
+        return result.name
+    for message in steps:
+        for call in message.additional_kwargs.get('tool_calls', []):
+            if call['id'] == result.tool_call_id:
+                return call['function']['name']
+    return None
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Deterministic stand-in for ChatGroq that scripts the agent's tool calls.
+
+    Menu, popularity and order requests call the matching tools (all in one
+    step for a tool-calling agent, one per step for a function-calling one),
+    other questions go to menu_search (or are answered from a pre-retrieved
+    menu block in the prompt, if there is one), and a confirmation re-parses
+    the last order and creates it.
+    ``latency_ms`` (with seeded ``jitter_ms``) simulates the remote round trip.
+    """
+
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    seed: int = 0
+    _rng: random.Random = PrivateAttr()
+    _lock: threading.Lock = PrivateAttr()
+    _calls: int = PrivateAttr(default=0)
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._rng = random.Random(self.seed)
+        self._lock = threading.Lock()
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-stub"
+
+    @property
+    def calls(self) -> int:
+        return self._calls
+
+    def _sleep(self):
+        with self._lock:
+            self._calls += 1
+            jitter = self._rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        delay = max(0.0, self.latency_ms + jitter) / 1000
+        if delay:
+            time.sleep(delay)
+
+    @staticmethod
+    def _split(messages: List[BaseMessage]) -> Tuple[List[BaseMessage], int, List[BaseMessage]]:
+        """(history, index of the current human message, tool call/result messages after it)"""
+        current = max(i for i, message in enumerate(messages) if isinstance(message, HumanMessage))
+        return messages[:current], current, messages[current + 1:]
+
+    @staticmethod
+    def _menu_context(history: List[BaseMessage]) -> Optional[str]:
+        """The item lines of a menu block injected into the prompt, if any"""
+        for message in history:
+            if isinstance(message, SystemMessage) and message.content.startswith(MENU_CONTEXT_HEADER):
+                lines = message.content.splitlines()[1:]
+                return "\n".join(lines) if lines else None
+        return None
+
+    @staticmethod
+    def _previous_request(history: List[BaseMessage]) -> Optional[str]:
+        for message in reversed(history):
+            if isinstance(message, HumanMessage):
+                _, request = IntentRouter.split_request(message.content)
+                if ORDER.search(request):
+                    return request
+        return None
+
+    def _plan(self, messages: List[BaseMessage]) -> Tuple[List[Tuple[str, Dict[str, Any]]], str]:
+        """Next (tool, arguments) calls to make, or none with the final answer text"""
+        history, current, steps = self._split(messages)
+        customer_name, request = IntentRouter.split_request(messages[current].content)
+        results = [message for message in steps if isinstance(message, (FunctionMessage, ToolMessage))]
+
+        if CONFIRM.search(request):
+            previous = self._previous_request(history)
+            if not previous:
+                return [], "What would you like to order?"
+            if not results:
+                return [('order_parser', {'user_message': previous})], ""
+            last = results[-1]
+            if tool_name(steps, last) == 'order_parser':
+                parsed = json.loads(last.content)
+                if parsed.get('success'):
+                    return [('database_tool', {
+                        'action': 'create_order',
+                        'customer_name': customer_name or 'Guest',
+                        'items': parsed['items'],
+                        'total_amount': parsed['total_amount']
+                    })], ""
+            return [], f"Here is what I found:\n\n{last.content[:600]}"
+
+        # Every intent in the request gets its own call; they do not depend on each other
+        calls = []
+        if MENU.search(request):
+            calls.append(('database_tool', {'action': 'get_menu'}))
+        if POPULAR.search(request):
+            calls.append(('database_tool', {'action': 'get_analytics'}))
+        if ORDER.search(request):
+            calls.append(('order_parser', {'user_message': request}))
+        if not calls:
+            context = self._menu_context(history)
+            if context:
+                return [], f"Here is what I found:\n\n{context[:600]}"
+            calls.append(('menu_search', {'query': request}))
+
+        # Calls are made in this order, so the ones without a result are still to do
+        pending = calls[len(results):]
+        if pending:
+            return pending, ""
+        return [], "Here is what I found:\n\n" + "\n\n".join(result.content[:600] for result in results)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        self._sleep()
+        calls, text = self._plan(messages)
+
+        if not calls:
+            message = AIMessage(content=text)
+        elif 'tools' in kwargs:
+            # Tool calling: everything pending goes out in one step
+            with self._lock:
+                base = self._calls
+            message = AIMessage(content="", additional_kwargs={'tool_calls': [{
+                'id': f"call_{base}_{n}",
+                'type': 'function',
+                'function': {'name': name, 'arguments': json.dumps(arguments)}
+            } for n, (name, arguments) in enumerate(calls)]})
+        else:
+            # Function calling allows one call per step; the rest follow in later steps
+            message = AIMessage(content="", additional_kwargs={
+                'function_call': {'name': calls[0][0], 'arguments': json.dumps(calls[0][1])}
+            })
+
+        prompt_tokens = sum(count_tokens(str(m.content)) for m in messages)
+        completion_tokens = count_tokens(text or json.dumps(calls))
+        return ChatResult(
+            generations=[ChatGeneration(message=message)],
+            llm_output={'token_usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens
+            }}
+        )
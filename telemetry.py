@@ -0,0 +1,136 @@
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+import functools
+import json
+import os
+import threading
+import time
+
+
+class Histogram:
+    """Latency samples for one span name: lifetime counts plus a window of recent samples"""
+
+    def __init__(self, window: int = 5000):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.samples = deque(maxlen=window)
+
+    def add(self, seconds: float, error: bool = False):
+        self.count += 1
+        self.errors += bool(error)
+        self.total += seconds
+        self.samples.append(seconds)
+
+    def percentile(self, q: float) -> float:
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'error_rate': self.errors / self.count if self.count else 0.0,
+            'mean_ms': self.total / self.count * 1000 if self.count else 0.0,
+            'p50_ms': self.percentile(0.50) * 1000,
+            'p95_ms': self.percentile(0.95) * 1000,
+            'p99_ms': self.percentile(0.99) * 1000
+        }
+
+
+class JSONLinesExporter:
+    """Appends one JSON object per finished span to a file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", buffering=1)
+
+    def export(self, event: Dict[str, Any]):
+        line = json.dumps(event, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class Telemetry:
+    """In-process spans, latency histograms, token counts and error rates"""
+
+    def __init__(self, exporter: Optional[JSONLinesExporter] = None, window: int = 5000):
+        self.exporter = exporter
+        self.window = window
+        self.histograms: Dict[str, Histogram] = {}
+        self.tokens: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float, error: Optional[str] = None, **attributes: Any):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram(self.window)
+            histogram.add(seconds, error is not None)
+        if self.exporter is not None:
+            self.exporter.export({
+                'ts': time.time(),
+                'span': name,
+                'duration_ms': round(seconds * 1000, 3),
+                'error': error,
+                **attributes
+            })
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Dict[str, Any]]:
+        """Time a block; set ``span['error']`` to flag a handled failure"""
+        span = {'error': None, **attributes}
+        start = time.perf_counter()
+        try:
+            yield span
+        except Exception as e:
+            span['error'] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            error = span.pop('error')
+            self.record(name, time.perf_counter() - start, error, **span)
+
+    def add_tokens(self, model: str, prompt_tokens: int, completion_tokens: int):
+        with self._lock:
+            counts = self.tokens.setdefault(model, {'prompt_tokens': 0, 'completion_tokens': 0, 'calls': 0})
+            counts['prompt_tokens'] += prompt_tokens
+            counts['completion_tokens'] += completion_tokens
+            counts['calls'] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'spans': {name: histogram.summary() for name, histogram in sorted(self.histograms.items())},
+                'tokens': {model: dict(counts) for model, counts in self.tokens.items()}
+            }
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.tokens.clear()
+
+
+def from_environment() -> Telemetry:
+    """Process-wide telemetry; set TELEMETRY_JSONL to a file path to export spans"""
+    path = os.getenv('TELEMETRY_JSONL')
+    return Telemetry(JSONLinesExporter(path) if path else None)
+
+
+telemetry = from_environment()
+
+
+def traced(name: str) -> Callable:
+    """Decorator that records every call of the function as a span"""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with telemetry.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
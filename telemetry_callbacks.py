@@ -0,0 +1,70 @@
+from langchain_core.callbacks import BaseCallbackHandler
+from typing import Any, Dict, Optional
+from uuid import UUID
+import threading
+import time
+
+from chat_history import count_tokens
+from telemetry import Telemetry
+
+
+def model_name(serialized: Dict[str, Any], invocation_params: Optional[Dict[str, Any]]) -> str:
+    params = invocation_params or {}
+    return params.get('model') or params.get('model_name') or (serialized.get('id') or ['llm'])[-1]
+
+
+class TelemetryCallbackHandler(BaseCallbackHandler):
+    """Records LLM calls (with token usage) and tool runs as spans"""
+
+    def __init__(self, telemetry: Telemetry):
+        self.telemetry = telemetry
+        self._runs: Dict[UUID, tuple] = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id: UUID, name: str, **extra: Any):
+        with self._lock:
+            self._runs[run_id] = (name, time.perf_counter(), extra)
+
+    def _end(self, run_id: UUID, error: Optional[BaseException] = None) -> Optional[tuple]:
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is not None:
+            name, start, extra = run
+            self.telemetry.record(name, time.perf_counter() - start,
+                                  f"{type(error).__name__}: {error}" if error else None)
+        return run
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs: Any):
+        model = model_name(serialized, kwargs.get('invocation_params'))
+        prompt = sum(count_tokens(str(message.content)) for batch in messages for message in batch)
+        self._start(run_id, 'llm', model=model, prompt_tokens=prompt)
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, **kwargs: Any):
+        model = model_name(serialized, kwargs.get('invocation_params'))
+        self._start(run_id, 'llm', model=model, prompt_tokens=sum(count_tokens(p) for p in prompts))
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any):
+        run = self._end(run_id)
+        if run is None:
+            return
+        extra = run[2]
+        usage = (response.llm_output or {}).get('token_usage') or {}
+        if usage:
+            prompt, completion = usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0)
+        else:
+            # Streaming responses carry no usage block; fall back to an estimate
+            text = "".join(generation.text for generations in response.generations for generation in generations)
+            prompt, completion = extra['prompt_tokens'], count_tokens(text)
+        self.telemetry.add_tokens(extra['model'], prompt, completion)
+
+    def on_llm_error(self, error, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id, error)
+
+    def on_tool_start(self, serialized, input_str, *, run_id: UUID, **kwargs: Any):
+        self._start(run_id, f"tool.{serialized.get('name', 'unknown')}")
+
+    def on_tool_end(self, output, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id, error)
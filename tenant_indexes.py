@@ -0,0 +1,227 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from langchain_community.embeddings.huggingface import HuggingFaceEmbeddings
+from typing import List, Dict, Any, Iterator, Optional
+import hashlib
+import os
+import re
+import threading
+from database import OrderDatabase, DEFAULT_TENANT
+from query_cache import CachedQueryEmbeddings, EmbeddingStore
+from rag_system import MenuRAG, DEFAULT_COLLECTION
+from resources import registry
+from telemetry import telemetry
+
+
+def collection_name(tenant_id: str) -> str:
+    """Chroma collection holding a tenant's menu vectors.
+
+    The default tenant keeps the collection written before tenancy existed;
+    other names are slugged to Chroma's rules and suffixed with a hash so
+    distinct tenant IDs never share a collection.
+    """
+    if tenant_id == DEFAULT_TENANT:
+        return DEFAULT_COLLECTION
+    slug = re.sub(r"[^A-Za-z0-9_-]+", "-", tenant_id).strip("-_")[:40]
+    digest = hashlib.sha1(tenant_id.encode("utf-8")).hexdigest()[:8]
+    return f"menu-{slug}-{digest}" if slug else f"menu-{digest}"
+
+
+class TenantMenuIndex:
+    """One tenant's menu search, resolved through the manager on every call.
+
+    Tools and agents hold this instead of a MenuRAG, so they never pin an
+    evicted index in memory; the index is (re)loaded on the next search.
+    """
+
+    def __init__(self, manager: "TenantIndexManager", tenant_id: str):
+        self.manager = manager
+        self.tenant_id = tenant_id
+
+    @property
+    def embeddings(self) -> CachedQueryEmbeddings:
+        # Shared by every tenant, so this never loads the index
+        return self.manager.embeddings
+
+    @property
+    def menu_version(self) -> Optional[str]:
+        return self.manager.get(self.tenant_id).menu_version
+
+    def search_menu(self, query: str, k: int = 5, category: Optional[str] = None,
+                    max_price: Optional[float] = None, available: Optional[bool] = True) -> List[Dict[str, Any]]:
+        with self.manager.using(self.tenant_id) as rag:
+            return rag.search_menu(query, k, category, max_price, available)
+
+    def search_menu_batch(self, queries: List[str], k: int = 5, category: Optional[str] = None,
+                          max_price: Optional[float] = None,
+                          available: Optional[bool] = True) -> List[List[Dict[str, Any]]]:
+        with self.manager.using(self.tenant_id) as rag:
+            return rag.search_menu_batch(queries, k, category, max_price, available)
+
+    def get_menu_context(self, query: str, max_tokens: int = 300, k: int = 8) -> str:
+        with self.manager.using(self.tenant_id) as rag:
+            return rag.get_menu_context(query, max_tokens, k)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return self.manager.get(self.tenant_id).cache_stats()
+
+
+class TenantIndexManager:
+    """Per-tenant menu indexes in one Chroma directory, with only the hottest ones resident.
+
+    A tenant's index is loaded the first time it is searched. Once more than
+    ``max_resident`` indexes are loaded, or their estimated size exceeds
+    ``memory_budget_mb``, the least recently used ones are closed; they reload
+    from disk (without re-embedding) the next time that tenant is served. All
+    tenants share one database pool and one cached embedder.
+    """
+
+    def __init__(self, db: OrderDatabase, persist_directory: str = "./data/menu_embeddings",
+                 embeddings: Optional[Any] = None, backend: str = "chroma", max_resident: int = 64,
+                 memory_budget_mb: float = 512.0, cache_size: int = 1024):
+        self.db = db
+        self.persist_directory = persist_directory
+        self.backend = backend
+        self.max_resident = max_resident
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        os.makedirs(persist_directory, exist_ok=True)
+        if isinstance(embeddings, CachedQueryEmbeddings):
+            self.embeddings = embeddings
+        else:
+            # One embedding model and query-vector cache for every tenant
+            self.embeddings = CachedQueryEmbeddings(
+                embeddings or HuggingFaceEmbeddings(),
+                store=EmbeddingStore(os.path.join(persist_directory, "query_cache.sqlite3")),
+                maxsize=cache_size
+            )
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+        self.resident_bytes = 0
+        self._databases: Dict[str, OrderDatabase] = {}
+        self._resident: "OrderedDict[str, MenuRAG]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._loading: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, db_path: str = "orders.db",
+               persist_directory: str = "./data/menu_embeddings") -> "TenantIndexManager":
+        """Process-wide manager for this database and index directory, built on first use"""
+        return registry.get_or_create(
+            (cls.__name__, db_path, persist_directory),
+            lambda: cls(OrderDatabase(db_path), persist_directory)
+        )
+
+    def database(self, tenant_id: str) -> OrderDatabase:
+        """The tenant's view of the database; its menu changes refresh the index if resident"""
+        with self._lock:
+            tenant_db = self._databases.get(tenant_id)
+            if tenant_db is None:
+                tenant_db = self._databases[tenant_id] = self.db.for_tenant(tenant_id)
+                tenant_db.subscribe_menu_changes(lambda snapshot: self._menu_changed(tenant_id, snapshot))
+        return tenant_db
+
+    def index(self, tenant_id: str) -> TenantMenuIndex:
+        """Lazy handle on the tenant's index; nothing is loaded until it is searched"""
+        return TenantMenuIndex(self, tenant_id)
+
+    def get(self, tenant_id: str) -> MenuRAG:
+        """The tenant's index, loading it (and evicting colder ones) if it is not resident"""
+        with self._lock:
+            rag = self._resident.get(tenant_id)
+            if rag is not None:
+                self._resident.move_to_end(tenant_id)
+                self.hits += 1
+                return rag
+            load_lock = self._loading.setdefault(tenant_id, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                rag = self._resident.get(tenant_id)
+            if rag is not None:
+                return rag
+
+            menu_items = self.database(tenant_id).get_menu()
+            with telemetry.span("rag.tenant_load", tenant=tenant_id):
+                rag = MenuRAG(menu_items, self.persist_directory, embeddings=self.embeddings,
+                              backend=self.backend, collection_name=collection_name(tenant_id))
+            with self._lock:
+                self._resident[tenant_id] = rag
+                self._sizes[tenant_id] = rag.memory_bytes()
+                self.resident_bytes += self._sizes[tenant_id]
+                self.loads += 1
+                evicted = self._evict_over_budget()
+
+        for old in evicted:
+            old.close()
+        return rag
+
+    @contextmanager
+    def using(self, tenant_id: str) -> Iterator[MenuRAG]:
+        """The tenant's index, kept open until the block exits even if it is evicted meanwhile"""
+        rag = self.get(tenant_id)
+        while not rag.retain():
+            # Evicted between lookup and use; load it again
+            rag = self.get(tenant_id)
+        try:
+            yield rag
+        finally:
+            rag.release()
+
+    def _evict_over_budget(self) -> List[MenuRAG]:
+        """Pop least recently used indexes until within both limits; the caller holds the lock"""
+        evicted = []
+        # The most recently used index always stays, even if it alone exceeds the budget
+        while len(self._resident) > 1 and (len(self._resident) > self.max_resident
+                                           or self.resident_bytes > self.memory_budget):
+            tenant_id, rag = self._resident.popitem(last=False)
+            self.resident_bytes -= self._sizes.pop(tenant_id)
+            self.evictions += 1
+            evicted.append(rag)
+        return evicted
+
+    def evict(self, tenant_id: str):
+        """Unload one tenant's index now"""
+        with self._lock:
+            rag = self._resident.pop(tenant_id, None)
+            if rag is not None:
+                self.resident_bytes -= self._sizes.pop(tenant_id)
+                self.evictions += 1
+        if rag is not None:
+            rag.close()
+
+    def _menu_changed(self, tenant_id: str, snapshot):
+        with self._lock:
+            rag = self._resident.get(tenant_id)
+        if rag is None or not rag.retain():
+            # Synced against the menu when it is next loaded
+            return
+        try:
+            rag.refresh(snapshot.items)
+        finally:
+            rag.release()
+        with self._lock:
+            if self._resident.get(tenant_id) is rag:
+                size = rag.memory_bytes()
+                self.resident_bytes += size - self._sizes[tenant_id]
+                self._sizes[tenant_id] = size
+
+    def resident(self) -> List[str]:
+        """Loaded tenants, least recently used first"""
+        with self._lock:
+            return list(self._resident)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.loads
+            return {
+                'resident': len(self._resident),
+                'max_resident': self.max_resident,
+                'resident_mb': self.resident_bytes / (1024 * 1024),
+                'memory_budget_mb': self.memory_budget / (1024 * 1024),
+                'hits': self.hits,
+                'loads': self.loads,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
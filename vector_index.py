@@ -0,0 +1,83 @@
+import numpy as np
+from typing import List, Dict, Any, Optional, Sequence, Set, Tuple
+
+
+class NumpyMenuIndex:
+    """In-memory cosine similarity index over menu item embeddings.
+
+    Item vectors are L2-normalized into one contiguous float32 matrix, so a
+    query is scored with a single matrix-vector product and many queries with
+    a single matrix-matrix product.
+    """
+
+    def __init__(self, ids: List[str], vectors: Sequence[Sequence[float]],
+                 documents: List[str], metadatas: List[Dict[str, Any]]):
+        self.ids = list(ids)
+        self.documents = list(documents)
+        self.metadatas = list(metadatas)
+        if self.ids:
+            self.matrix = self.normalize(np.asarray(vectors, dtype=np.float32))
+        else:
+            self.matrix = np.zeros((0, 0), dtype=np.float32)
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore) -> "NumpyMenuIndex":
+        """Load every persisted vector from a Chroma vector store"""
+        data = vectorstore.get(include=['embeddings', 'documents', 'metadatas'])
+        return cls(data['ids'], data['embeddings'], data['documents'], data['metadatas'])
+
+    @staticmethod
+    def normalize(vectors: np.ndarray) -> np.ndarray:
+        """L2-normalize row vectors, leaving all-zero rows untouched"""
+        vectors = np.atleast_2d(vectors).astype(np.float32, copy=False)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return np.ascontiguousarray(vectors / norms)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @staticmethod
+    def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+        """Indices of the k highest scores along the last axis, best first"""
+        n = scores.shape[-1]
+        if k < n:
+            candidates = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+        else:
+            candidates = np.broadcast_to(np.arange(n), scores.shape[:-1] + (n,))
+        order = np.argsort(-np.take_along_axis(scores, candidates, axis=-1), axis=-1, kind='stable')
+        return np.take_along_axis(candidates, order, axis=-1)
+
+    def search(self, query_vector: Sequence[float], k: int = 5,
+               allowed_ids: Optional[Set[Any]] = None) -> List[Tuple[int, float]]:
+        """Return (row, cosine score) pairs for the k nearest items"""
+        return self.search_batch([query_vector], k, allowed_ids)[0]
+
+    def search_batch(self, query_vectors: Sequence[Sequence[float]], k: int = 5,
+                     allowed_ids: Optional[Set[Any]] = None) -> List[List[Tuple[int, float]]]:
+        """Score many queries with one matmul and return their top-k rows.
+
+        When ``allowed_ids`` is given, only rows whose metadata ``id`` is in it
+        are candidates, so filtered searches still return up to k hits.
+        """
+        if not len(self) or k <= 0:
+            return [[] for _ in query_vectors]
+
+        matrix = self.matrix
+        rows = None
+        if allowed_ids is not None:
+            rows = np.array(
+                [i for i, metadata in enumerate(self.metadatas) if metadata.get('id') in allowed_ids],
+                dtype=np.intp
+            )
+            if not len(rows):
+                return [[] for _ in query_vectors]
+            matrix = matrix[rows]
+
+        queries = self.normalize(np.asarray(query_vectors, dtype=np.float32))
+        scores = queries @ matrix.T
+        top = self._top_k(scores, min(k, len(matrix)))
+        return [
+            [(int(row if rows is None else rows[row]), float(scores[i, row])) for row in top[i]]
+            for i in range(len(top))
+        ]
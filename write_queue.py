@@ -0,0 +1,118 @@
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional
+import queue
+import threading
+import time
+
+_STOP = object()
+
+
+class OrderWriteQueue:
+    """Write-behind queue that group-commits orders submitted from many threads.
+
+    A single writer thread takes every order that queued up while the
+    previous commit ran (optionally lingering ``max_delay_ms`` for more, up to
+    ``max_batch``) and stores them with one ``create_orders_batch``
+    transaction, so concurrent sessions (of any tenant) share a commit instead
+    of each paying for their own. Callers get a Future that resolves to the real order ID.
+    """
+
+    def __init__(self, db, max_delay_ms: float = 0.0, max_batch: int = 256):
+        self.db = db
+        self.max_delay = max_delay_ms / 1000
+        self.max_batch = max_batch
+        self.batches = 0
+        self.orders = 0
+        self._queue = queue.Queue()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="order-write-queue", daemon=True)
+        self._thread.start()
+
+    def submit(self, customer_name: str, items: List[Dict], total_amount: float,
+               tenant_id: Optional[str] = None) -> Future:
+        order = {
+            'customer_name': customer_name,
+            'items': items,
+            'total_amount': total_amount
+        }
+        if tenant_id is not None:
+            order['tenant_id'] = tenant_id
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Order write queue is closed")
+            self._queue.put((order, future))
+        return future
+
+    def _collect(self) -> tuple:
+        """Block for the first order, then gather the rest until the delay or size limit"""
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            # Take whatever queued up during the previous commit, then linger for stragglers
+            remaining = deadline - time.monotonic()
+            try:
+                entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is _STOP:
+                return batch, True
+            batch.append(entry)
+        return batch, False
+
+    def _write(self, batch: List[tuple]):
+        try:
+            order_ids = self.db.create_orders_batch([order for order, _ in batch])
+        except Exception:
+            # One bad order must not fail everyone else's: retry them one by one
+            for order, future in batch:
+                try:
+                    future.set_result(self.db.create_orders_batch([order])[0])
+                except Exception as e:
+                    future.set_exception(e)
+        else:
+            for (_, future), order_id in zip(batch, order_ids):
+                future.set_result(order_id)
+        with self._lock:
+            self.batches += 1
+            self.orders += len(batch)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = self._collect()
+            if batch:
+                self._write(batch)
+        # Anything queued before close() still gets written
+        leftover = []
+        while True:
+            try:
+                entry = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is not _STOP:
+                leftover.append(entry)
+        for start in range(0, len(leftover), self.max_batch):
+            self._write(leftover[start:start + self.max_batch])
+
+    def close(self, timeout: float = None):
+        """Flush pending orders and stop the writer thread"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'batches': self.batches,
+                'orders': self.orders,
+                'avg_batch_size': self.orders / self.batches if self.batches else 0.0,
+                'pending': self._queue.qsize()
+            }